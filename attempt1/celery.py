@@ -17,13 +17,16 @@ app.autodiscover_tasks()
 
 # Celery Beat schedule for periodic tasks
 app.conf.beat_schedule = {
-    'scheduled-data-collection': {
-        'task': 'data_ingestion.tasks.scheduled_data_collection',
-        'schedule': crontab(minute=0, hour='*/6'),  # Every 6 hours
+    # Each query is collected on its own adaptive interval; the tick only
+    # starts the ones that are due, and new items are processed right away
+    'collection-scheduler': {
+        'task': 'data_ingestion.tasks.run_due_collections',
+        'schedule': 60.0,  # Every minute
     },
+    # Catch-up for anything the per-collection processing missed
     'scheduled-text-processing': {
         'task': 'text_processing.tasks.scheduled_text_processing',
-        'schedule': crontab(minute=30, hour='*/2'),  # Every 2 hours at 30 min
+        'schedule': crontab(minute=30, hour='*/6'),  # Every 6 hours at 30 min
     },
 }
 
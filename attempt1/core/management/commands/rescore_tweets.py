@@ -0,0 +1,187 @@
+# core/management/commands/rescore_tweets.py
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from django.utils import timezone
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from collections import defaultdict, deque
+from datetime import datetime, timezone as dt_timezone
+import os
+import sys
+import time
+import pymongo
+from pymongo import UpdateOne
+
+# The fact checker lives in the bot package at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))))
+try:
+    from bot.fact_checker import FactChecker
+    from bot.scoring_rules import ScoringRules
+    FACT_CHECKER_AVAILABLE = True
+except ImportError:
+    FACT_CHECKER_AVAILABLE = False
+
+# Per-process state of the pool workers, set up once by _init_worker
+_fact_checker = None
+_tweets = None
+
+
+def _init_worker(host, database, rules_file, threshold):
+    """Give each worker its own fact checker and MongoDB connection"""
+    global _fact_checker, _tweets
+    rules = ScoringRules.load(rules_file, verified=threshold) if rules_file else None
+    _fact_checker = FactChecker(confidence_threshold=threshold, rules=rules)
+    # MongoClient is not fork-safe, so every process opens its own
+    _tweets = pymongo.MongoClient(host)[database]['tweets']
+
+
+def _rescore_range(first_id, last_id):
+    """
+    Re-verdict the tweets with first_id <= _id <= last_id
+    Returns (last_id, tweets rescored, seconds spent, worker pid)
+    """
+    start = time.perf_counter()
+    docs = list(_tweets.find(
+        {'_id': {'$gte': first_id, '$lte': last_id}},
+        {'text': 1}
+    ))
+    results = _fact_checker.analyze_batch([doc.get('text') or '' for doc in docs])
+
+    # Workers may be spawned without Django set up, so no django.utils.timezone here
+    rescored_at = datetime.now(dt_timezone.utc)
+    updates = [
+        UpdateOne({'_id': doc['_id']}, {'$set': {'verdict': {
+            'confidence': float(results.confidence[i]),
+            'status': str(results.status[i]),
+            'flags': results.flags(i),
+            'rescored_at': rescored_at,
+        }}})
+        for i, doc in enumerate(docs)
+    ]
+    if updates:
+        _tweets.bulk_write(updates, ordered=False)
+    return last_id, len(docs), time.perf_counter() - start, os.getpid()
+
+
+class Command(BaseCommand):
+    help = 'Re-verdict every stored tweet with the current fact-checking rules'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                          help='Number of worker processes')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                          help='Tweets per batch handed to a worker')
+        parser.add_argument('--rules', type=str, default=None,
+                          help='Scoring rules file (defaults to the built-in rules)')
+        parser.add_argument('--threshold', type=float, default=0.7,
+                          help='Confidence threshold for a verified verdict')
+        parser.add_argument('--job', type=str, default='rescore',
+                          help='Checkpoint name, to run independent rescoring jobs')
+        parser.add_argument('--restart', action='store_true',
+                          help='Ignore the checkpoint and rescore from the beginning')
+
+    def handle(self, *args, **options):
+        if not FACT_CHECKER_AVAILABLE:
+            raise CommandError("❌ The bot package is not importable from this checkout")
+
+        host = settings.DATABASES['default']['CLIENT'].get('host', 'mongodb://localhost:27017')
+        database = settings.DATABASES['default']['NAME']
+        db = pymongo.MongoClient(host)[database]
+        tweets = db['tweets']
+        checkpoints = db['rescore_checkpoints']
+
+        job = options['job']
+        checkpoint = None if options['restart'] else checkpoints.find_one({'_id': job})
+        query = {}
+        rescored = 0
+        if checkpoint:
+            query = {'_id': {'$gt': checkpoint['last_id']}}
+            rescored = checkpoint.get('rescored', 0)
+            self.stdout.write(f"↩️ Resuming '{job}' after {rescored} rescored tweets")
+
+        workers = max(1, options['workers'])
+        self.stdout.write(
+            self.style.SUCCESS(f'🚀 Rescoring tweets with {workers} worker(s)...')
+        )
+
+        start = time.perf_counter()
+        worker_tweets = defaultdict(int)
+        worker_seconds = defaultdict(float)
+        pending = {}
+        # Batches finish out of order; the checkpoint only moves past a
+        # batch once every batch before it has been written
+        submitted = deque()
+        finished = {}
+
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(host, database, options['rules'], options['threshold'])
+        ) as pool:
+            # Only _ids are read here, from the index; workers fetch the text
+            # of their own range so this process never becomes the bottleneck
+            for first_id, last_id in self._batches(tweets, query, options['batch_size']):
+                future = pool.submit(_rescore_range, first_id, last_id)
+                pending[future] = last_id
+                submitted.append(last_id)
+                # Keep a couple of batches queued per worker, no more
+                while len(pending) >= workers * 2:
+                    rescored = self._collect(pending, finished, submitted, checkpoints, job,
+                                             rescored, worker_tweets, worker_seconds)
+            while pending:
+                rescored = self._collect(pending, finished, submitted, checkpoints, job,
+                                         rescored, worker_tweets, worker_seconds)
+
+        elapsed = time.perf_counter() - start
+        total = sum(worker_tweets.values())
+        self.stdout.write(
+            self.style.SUCCESS(f'\n✅ Rescored {total} tweets in {elapsed:.1f} seconds '
+                               f'({total / elapsed if elapsed else 0:.0f} tweets/s)')
+        )
+        for pid in sorted(worker_tweets):
+            seconds = worker_seconds[pid]
+            self.stdout.write(
+                f"   Worker {pid}: {worker_tweets[pid]} tweets, "
+                f"{worker_tweets[pid] / seconds if seconds else 0:.0f} tweets/s"
+            )
+
+    def _batches(self, tweets, query, batch_size):
+        """Yield (first _id, last _id) of consecutive batches in _id order"""
+        first_id = None
+        count = 0
+        last_id = None
+        for doc in tweets.find(query, {'_id': 1}).sort('_id', pymongo.ASCENDING).batch_size(10000):
+            if first_id is None:
+                first_id = doc['_id']
+            last_id = doc['_id']
+            count += 1
+            if count == batch_size:
+                yield first_id, last_id
+                first_id = None
+                count = 0
+        if first_id is not None:
+            yield first_id, last_id
+
+    def _collect(self, pending, finished, submitted, checkpoints, job,
+                 rescored, worker_tweets, worker_seconds):
+        """Wait for at least one batch, then advance the checkpoint"""
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            del pending[future]
+            last_id, count, seconds, pid = future.result()
+            finished[last_id] = count
+            worker_tweets[pid] += count
+            worker_seconds[pid] += seconds
+
+        advanced = False
+        while submitted and submitted[0] in finished:
+            last_id = submitted.popleft()
+            rescored += finished.pop(last_id)
+            advanced = True
+        if advanced:
+            checkpoints.replace_one(
+                {'_id': job},
+                {'_id': job, 'last_id': last_id, 'rescored': rescored, 'updated_at': timezone.now()},
+                upsert=True
+            )
+            self.stdout.write(f"   {rescored} tweets rescored")
+        return rescored
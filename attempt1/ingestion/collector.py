@@ -0,0 +1,176 @@
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+
+import tweepy
+from newsapi.newsapi_exception import NewsAPIException
+
+logger = logging.getLogger(__name__)
+
+TWEET_FIELDS = ["created_at", "text", "author_id", "lang"]
+
+# Recent search returns at most 100 tweets per page, NewsAPI 100 articles
+MAX_TWEETS_PER_PAGE = 100
+MAX_ARTICLES_PER_PAGE = 100
+
+# Recent search covers the last 7 days and rejects an older since_id; the
+# margin keeps a request in flight from crossing the limit
+RECENT_SEARCH_WINDOW = timedelta(days=7) - timedelta(minutes=5)
+# Milliseconds since the Unix epoch at which tweet ids start counting
+TWITTER_EPOCH_MS = 1288834974657
+
+
+def tweet_time(tweet_id):
+    """When a tweet was posted, from the timestamp in its snowflake id"""
+    return datetime.fromtimestamp(((int(tweet_id) >> 22) + TWITTER_EPOCH_MS) / 1000, tz=timezone.utc)
+
+
+def searchable_since_id(since_id, now=None):
+    """since_id, or None once it is older than recent search reaches back"""
+    now = now or datetime.now(timezone.utc)
+    if since_id and tweet_time(since_id) < now - RECENT_SEARCH_WINDOW:
+        return None
+    return since_id
+
+
+def tweet_pages(client, query, max_results=MAX_TWEETS_PER_PAGE, next_token=None, **params):
+    """
+    Pages of recent search results as (tweets, next_token), following
+    next_token until the results run out
+
+    Only one page is held at a time. next_token is the cursor to resume
+    after that page; it is None on the last one. Rate limited requests
+    wait for the window to reset and are retried.
+    """
+    while True:
+        try:
+            response = client.search_recent_tweets(
+                query=query,
+                max_results=max_results,
+                next_token=next_token,
+                tweet_fields=TWEET_FIELDS,
+                **params
+            )
+        except tweepy.TooManyRequests as e:
+            reset = int(e.response.headers.get('x-rate-limit-reset', 0))
+            wait = max(reset - time.time(), 1)
+            logger.warning(f"⏳ Search rate limited, waiting {wait:.0f}s")
+            time.sleep(wait)
+            continue
+
+        next_token = (response.meta or {}).get('next_token')
+        yield response.data or [], next_token
+        if not next_token:
+            return
+
+
+def article_pages(client, query, page_size=MAX_ARTICLES_PER_PAGE, page=1, **params):
+    """
+    Pages of NewsAPI /everything results as (articles, next_page), up to
+    totalResults or the plan's result cap; next_page is None on the last
+    """
+    while True:
+        try:
+            response = client.get_everything(
+                q=query,
+                language="en",
+                sort_by="publishedAt",
+                page_size=page_size,
+                page=page,
+                **params
+            )
+        except NewsAPIException as e:
+            if e.get_code() == 'maximumResultsReached':
+                # Developer plans stop at 100 results per query; nothing more to fetch
+                logger.info(f"NewsAPI result cap reached at page {page}")
+                yield [], None
+                return
+            raise
+
+        articles = response.get("articles") or []
+        more = articles and page * page_size < response.get("totalResults", 0)
+        yield articles, page + 1 if more else None
+        if not more:
+            return
+        page += 1
+
+
+class Checkpoints:
+    """
+    Pagination cursors of interrupted collection jobs, one document per
+    job in a MongoDB collection
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def load(self, job):
+        return self.collection.find_one({'_id': job})
+
+    def save(self, job, cursor, counts, state=None):
+        """Store the cursor, the counts so far and whatever state the job needs to resume"""
+        fields = {'cursor': cursor, 'counts': counts, 'updated_at': datetime.now(timezone.utc)}
+        if state is not None:
+            fields['state'] = state
+        self.collection.update_one({'_id': job}, {'$set': fields}, upsert=True)
+
+    def clear(self, job):
+        self.collection.delete_one({'_id': job})
+
+
+class Watermarks:
+    """
+    Newest item collected per source and query, so a run only asks for
+    what is newer: the tweet id (for since_id) on Twitter, the publishedAt
+    time (for from) on NewsAPI
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def get(self, source, query):
+        doc = self.collection.find_one({'_id': f"{source}:{query}"})
+        return doc['value'] if doc else None
+
+    def advance(self, source, query, value):
+        """Move the watermark up to value; $max never moves it back, whatever the run order"""
+        self.collection.update_one(
+            {'_id': f"{source}:{query}"},
+            {'$max': {'value': value}, '$set': {'updated_at': datetime.now(timezone.utc)}},
+            upsert=True
+        )
+
+
+def collect(pages, write, checkpoints=None, job=None, limit=None, counts=None, state=None):
+    """
+    Write each page with write(items) -> counts, checkpointing the cursor
+    of the next page once the write is committed
+
+    pages is one of the generators above, already positioned at the
+    resumed cursor. The checkpoint is cleared when the results run out,
+    and kept when this run stopped at limit items, so a later run carries
+    on. state, a dict write may update, is checkpointed along with the
+    cursor.
+    Returns the summed counts plus the items read and pages fetched.
+    """
+    counts = dict(counts or {})
+    counts.setdefault('read', 0)
+    counts.setdefault('pages', 0)
+    # limit applies to this run; counts carry on from the checkpoint
+    start = counts['read']
+    cursor = None
+    for items, cursor in pages:
+        result = write(items) if items else {}
+        for key, value in result.items():
+            counts[key] = counts.get(key, 0) + value
+        counts['read'] += len(items)
+        counts['pages'] += 1 if items else 0
+        if checkpoints is not None and cursor is not None:
+            checkpoints.save(job, cursor, counts, state)
+        if limit is not None and counts['read'] - start >= limit:
+            break
+
+    if checkpoints is not None and cursor is None:
+        checkpoints.clear(job)
+    counts['finished'] = cursor is None
+    return counts
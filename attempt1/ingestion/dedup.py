@@ -0,0 +1,139 @@
+import logging
+
+from pymongo.errors import BulkWriteError, OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# MongoDB's duplicate key error
+DUPLICATE_KEY = 11000
+
+# Whether each collection checked by this process has its unique index
+_indexed = {}
+
+
+def unique_docs(docs, key):
+    """docs without a key or repeating one, keeping the first; (docs, dropped)"""
+    seen = set()
+    unique = []
+    for doc in docs:
+        value = doc.get(key)
+        if value is None or value in seen:
+            continue
+        seen.add(value)
+        unique.append(doc)
+    return unique, len(docs) - len(unique)
+
+
+def _has_unique_index(collection, key):
+    """Whether a unique index on key alone exists, whatever its name"""
+    return any(
+        info.get('unique') and [field for field, _ in info['key']] == [key]
+        for info in collection.index_information().values()
+    )
+
+
+def ensure_unique_index(collection, key):
+    """
+    Create the unique index dedup relies on, once per collection and
+    process; returns whether the collection has it
+    """
+    name = (collection.full_name, key)
+    if name not in _indexed:
+        try:
+            # Djongo creates its own under another name, and a second one on
+            # the same key would be refused
+            if not _has_unique_index(collection, key):
+                collection.create_index(key, unique=True)
+            _indexed[name] = True
+        except OperationFailure as e:
+            # Existing duplicates block the index; insert_new then looks up
+            # every key before inserting
+            logger.warning(f"No unique index on {collection.full_name}.{key}: {e}")
+            _indexed[name] = False
+    return _indexed[name]
+
+
+def insert_new(collection, docs, key):
+    """
+    Insert the docs whose key is not stored yet, in one unordered insert_many
+
+    The unique index on key rejects duplicates inside the database, so
+    stored keys cost no extra round trip; without the index every key is
+    looked up first with one $in query. Returns the number of documents
+    inserted, duplicates (repeats within docs, stored keys and keys rejected
+    by the index) and the stored keys skipped by that lookup.
+    """
+    indexed = ensure_unique_index(collection, key)
+    docs, repeats = unique_docs(docs, key)
+    result = {'inserted': 0, 'duplicates': repeats, 'filtered': 0}
+    if not docs:
+        return result
+
+    if not indexed:
+        stored = {
+            doc[key]
+            for doc in collection.find({key: {'$in': [doc[key] for doc in docs]}}, {key: 1, '_id': 0})
+        }
+        docs = [doc for doc in docs if doc[key] not in stored]
+        result['filtered'] = len(stored)
+        result['duplicates'] += len(stored)
+
+    if docs:
+        try:
+            result['inserted'] = len(collection.insert_many(docs, ordered=False).inserted_ids)
+        except BulkWriteError as e:
+            errors = e.details.get('writeErrors', [])
+            other = [error for error in errors if error.get('code') != DUPLICATE_KEY]
+            if other:
+                raise
+            result['inserted'] = e.details.get('nInserted', 0)
+            result['duplicates'] += len(errors)
+    return result
+
+
+def bulk_create_new(model, objs, key, batch_size=1000):
+    """
+    Django counterpart of insert_new for model instances
+
+    One __in query finds the keys already stored and bulk_create writes
+    the rest, batch_size at a time. A batch that hits a key another writer
+    stored in between fails (djongo has no ignore_conflicts), possibly
+    after writing part of it; its keys are looked up again and the ones
+    still missing are saved one by one. Its keys found stored are counted
+    as duplicates, so inserted never counts a row this call did not
+    write. Returns the same counts as insert_new.
+    """
+    from django.db import IntegrityError
+
+    unique = {}
+    for obj in objs:
+        unique.setdefault(getattr(obj, key), obj)
+    result = {'inserted': 0, 'duplicates': len(objs) - len(unique), 'filtered': 0}
+    if not unique:
+        return result
+
+    def stored_keys(values):
+        return set(model.objects.filter(**{f'{key}__in': list(values)}).values_list(key, flat=True))
+
+    stored = stored_keys(unique)
+    result['duplicates'] += len(stored)
+    new = [obj for value, obj in unique.items() if value not in stored]
+    for start in range(0, len(new), batch_size):
+        batch = new[start:start + batch_size]
+        try:
+            model.objects.bulk_create(batch)
+            result['inserted'] += len(batch)
+            continue
+        except IntegrityError:
+            logger.info(f"Another writer stored some of {len(batch)} {model.__name__} rows; saving them one by one")
+        stored = stored_keys(getattr(obj, key) for obj in batch)
+        result['duplicates'] += len(stored)
+        for obj in batch:
+            if getattr(obj, key) in stored:
+                continue
+            try:
+                obj.save(force_insert=True)
+                result['inserted'] += 1
+            except IntegrityError:
+                result['duplicates'] += 1
+    return result
@@ -1,5 +1,7 @@
 from django.core.management.base import BaseCommand
-from data_ingestion.services import TwitterService, NewsService
+from data_ingestion.services import TwitterService, NewsService, state_collection
+from data_ingestion.collector import Checkpoints
+from data_ingestion.sweep import sweep
 
 class Command(BaseCommand):
     help = 'Collect data from Twitter and News APIs'
@@ -15,6 +17,40 @@ class Command(BaseCommand):
                           help='Skip Twitter data collection')
         parser.add_argument('--skip-news', action='store_true',
                           help='Skip news data collection')
+        parser.add_argument('--all-pages', action='store_true',
+                          help='Follow pagination through every result, resuming interrupted runs')
+        parser.add_argument('--limit', type=int, default=None,
+                          help='With --all-pages, stop after this many items per source')
+        parser.add_argument('--restart', action='store_true',
+                          help='With --all-pages, ignore saved cursors and start from the first page')
+        parser.add_argument('--registered', action='store_true',
+                          help='Collect what is new for every registered query, concurrently')
+
+    def _collect_all(self, query, options):
+        checkpoints = Checkpoints(state_collection('collect_checkpoints'))
+        if options['restart']:
+            checkpoints.clear(f"twitter:{query}")
+            checkpoints.clear(f"newsapi:{query}")
+
+        results = {}
+        if not options['skip_twitter']:
+            self.stdout.write('📊 Collecting all tweets...')
+            results['tweets'] = TwitterService().collect_all_tweets(
+                query=query, limit=options['limit'], checkpoints=checkpoints)
+        if not options['skip_news']:
+            self.stdout.write('📰 Collecting all news articles...')
+            results['articles'] = NewsService().collect_all_news(
+                query=query, limit=options['limit'], checkpoints=checkpoints)
+
+        for name, result in results.items():
+            if 'error' in result:
+                self.stdout.write(self.style.ERROR(f"❌ Collecting {name} failed: {result['error']}"))
+                continue
+            state = 'done' if result['finished'] else 'more to fetch, rerun to resume'
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ {result['read']} {name} read over {result['pages']} pages, "
+                f"{result.get('inserted', 0)} new, {result.get('duplicates', 0)} duplicates ({state})"
+            ))
 
     def handle(self, *args, **options):
         query = options['query']
@@ -23,6 +59,22 @@ class Command(BaseCommand):
             self.style.SUCCESS('🚀 Starting data collection pipeline...')
         )
 
+        if options['registered']:
+            results = sweep()
+            for source, by_query in results.items():
+                for name, result in by_query.items():
+                    if 'error' in result:
+                        self.stdout.write(self.style.ERROR(f"❌ {source} '{name}': {result['error']}"))
+                    else:
+                        self.stdout.write(f"{source} '{name}': {result.get('inserted', 0)} new in {result['seconds']}s")
+            self.stdout.write(self.style.SUCCESS('✅ Data collection completed!'))
+            return
+
+        if options['all_pages']:
+            self._collect_all(query, options)
+            self.stdout.write(self.style.SUCCESS('✅ Data collection completed!'))
+            return
+
         if not options['skip_twitter']:
             self.stdout.write('📊 Collecting tweets...')
             twitter_service = TwitterService()
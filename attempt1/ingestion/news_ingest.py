@@ -6,6 +6,7 @@ import sys
 # Add parent directory to path to import storage.db
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from storage.db import db, config, db_connected
+from ingestion.dedup import insert_new
 
 def collect_news(query="misinformation OR fake news", page_size=5):
     """
@@ -39,13 +40,8 @@ def collect_news(query="misinformation OR fake news", page_size=5):
             print("⚠️ No news articles found.")
             return
 
-        inserted_count = 0
+        docs = []
         for article in articles["articles"]:
-            # Skip if article already exists
-            existing = db.news.find_one({"url": article.get("url")})
-            if existing:
-                continue
-                
             doc = {
                 "platform": "newsapi",
                 "source": article.get("source", {}).get("name", "Unknown") if article.get("source") else "Unknown",
@@ -56,10 +52,13 @@ def collect_news(query="misinformation OR fake news", page_size=5):
                 "publishedAt": article.get("publishedAt"),
                 "content": article.get("content")
             }
-            db.news.insert_one(doc)
-            inserted_count += 1
+            docs.append(doc)
 
-        print(f"✅ Inserted {inserted_count} new news articles into MongoDB")
+        # One unordered insert; the unique index rejects stored articles
+        result = insert_new(db.news, docs, "url")
+
+        print(f"✅ Inserted {result['inserted']} new news articles into MongoDB ({result['duplicates']} duplicates)")
+        return result
         
     except Exception as e:
         print(f"❌ Error collecting news: {e}")
\ No newline at end of file
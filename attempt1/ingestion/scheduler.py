@@ -0,0 +1,161 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Requests per hour each API may spend on collection. Twitter's app-auth
+# search allows 450 per 15 minutes (1800/h); NewsAPI's developer plan 100
+# per day
+DEFAULT_BUDGETS = {'twitter': 1200, 'newsapi': 4}
+DEFAULT_INTERVALS = {'min': 300, 'initial': 3600, 'max': 6 * 3600}
+# New items per run the intervals steer towards: half a page
+DEFAULT_TARGET_YIELD = 50
+# How long a claim keeps a collection from other ticks; held() renews it
+# every third of that for as long as the run lasts, rate limit waits included
+CLAIM_SECONDS = 15 * 60
+
+
+class YieldScheduler:
+    """
+    Polling interval per query and source, following how many new items
+    each run returns
+
+    A run that finds more than the target yield shortens the interval (at
+    most halving it), one that finds less lengthens it (at most by half),
+    and one that found nothing grows it by half; a run cut off at its
+    item limit halves it. Intervals stay within the min and max. Each
+    source's runs then share its request budget: when the intervals ask
+    for more requests per hour than the budget, all of them are stretched
+    by the same factor, so hot queries keep their lead over quiet ones.
+    State is one document per source and query in a MongoDB collection.
+    """
+
+    def __init__(self, collection, budgets=None, intervals=None, target_yield=DEFAULT_TARGET_YIELD):
+        self.collection = collection
+        self.budgets = {**DEFAULT_BUDGETS, **(budgets or {})}
+        self.intervals = {**DEFAULT_INTERVALS, **(intervals or {})}
+        self.target_yield = target_yield
+
+    @staticmethod
+    def _id(source, query):
+        return f"{source}:{query}"
+
+    def register(self, queries, now=None):
+        """
+        Start tracking registered queries, new ones due right away, and
+        forget the ones no longer registered so they stop counting against
+        the budgets
+        """
+        now = now or datetime.now(timezone.utc)
+        registered = [self._id(source, entry['query']) for entry in queries for source in entry['sources']]
+        removed = self.collection.delete_many({'_id': {'$nin': registered}}).deleted_count
+        if removed:
+            logger.info(f"Stopped scheduling {removed} deregistered collections")
+        for entry in queries:
+            for source in entry['sources']:
+                self.collection.update_one(
+                    {'_id': self._id(source, entry['query'])},
+                    {'$setOnInsert': {
+                        'source': source, 'query': entry['query'], 'interval': self.intervals['initial'],
+                        'requests': 1.0, 'yield': 0.0, 'runs': 0, 'next_run': now,
+                    }},
+                    upsert=True
+                )
+
+    def claim_due(self, queries, now=None):
+        """
+        The registered (source, query) pairs that are due, claimed so that
+        an overlapping tick does not run them too
+        """
+        now = now or datetime.now(timezone.utc)
+        registered = {self._id(source, entry['query']) for entry in queries for source in entry['sources']}
+        claimed = []
+        for doc in self.collection.find({'next_run': {'$lte': now}}):
+            if doc['_id'] not in registered:
+                continue
+            result = self.collection.update_one(
+                {'_id': doc['_id'], 'next_run': doc['next_run']},
+                {'$set': {'next_run': now + timedelta(seconds=CLAIM_SECONDS)}}
+            )
+            if result.modified_count:
+                claimed.append((doc['source'], doc['query']))
+        return claimed
+
+    def renew(self, claimed, now=None):
+        """Push the claims on (source, query) pairs still running out by another CLAIM_SECONDS"""
+        now = now or datetime.now(timezone.utc)
+        self.collection.update_many(
+            {'_id': {'$in': [self._id(source, query) for source, query in claimed]}},
+            {'$set': {'next_run': now + timedelta(seconds=CLAIM_SECONDS)}}
+        )
+
+    @contextmanager
+    def held(self, claimed):
+        """Keep the claims on claimed renewed while the block runs; record() after it"""
+        stop = threading.Event()
+
+        def renew():
+            while not stop.wait(CLAIM_SECONDS / 3):
+                try:
+                    self.renew(claimed)
+                except Exception as e:
+                    logger.error(f"❌ Renewing collection claims failed: {e}")
+
+        thread = threading.Thread(target=renew, name='collect-claims', daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def _adapt(self, interval, new, finished):
+        if not finished:
+            factor = 0.5
+        elif new == 0:
+            factor = 1.5
+        else:
+            factor = min(max(self.target_yield / new, 0.5), 1.5)
+        return min(max(interval * factor, self.intervals['min']), self.intervals['max'])
+
+    def _stretch(self, source):
+        """Factor by which source's intervals must grow to stay within its budget"""
+        per_hour = sum(
+            doc.get('requests', 1.0) * 3600 / doc['interval']
+            for doc in self.collection.find({'source': source}, {'requests': 1, 'interval': 1})
+        )
+        return max(per_hour / self.budgets.get(source, per_hour or 1), 1.0)
+
+    def record(self, source, query, result, now=None):
+        """
+        Adapt the interval to a finished run and schedule the next one;
+        returns the seconds until then
+        """
+        now = now or datetime.now(timezone.utc)
+        doc = self.collection.find_one({'_id': self._id(source, query)}) or {
+            'interval': self.intervals['initial'], 'requests': 1.0, 'yield': 0.0}
+        update = {'last_run': now}
+        interval = doc['interval']
+        if 'error' not in result:
+            new = result.get('inserted', 0)
+            interval = self._adapt(interval, new, result.get('finished', True))
+            # Even an empty search costs one request
+            requests = max(result.get('pages', 0), 1)
+            update['interval'] = interval
+            update['requests'] = 0.5 * doc.get('requests', 1.0) + 0.5 * requests
+            update['yield'] = 0.5 * doc.get('yield', 0.0) + 0.5 * new
+            update['last_new'] = new
+        self.collection.update_one({'_id': self._id(source, query)}, {'$set': update, '$inc': {'runs': 1}})
+
+        delay = interval * self._stretch(source)
+        self.collection.update_one({'_id': self._id(source, query)},
+                                   {'$set': {'next_run': now + timedelta(seconds=delay)}})
+        return delay
+
+    def stats(self):
+        return [
+            {key: doc.get(key) for key in ('source', 'query', 'interval', 'yield', 'requests', 'runs', 'next_run')}
+            for doc in self.collection.find().sort('next_run', 1)
+        ]
@@ -1,13 +1,77 @@
 import tweepy
+import requests
+from requests.adapters import HTTPAdapter
 from newsapi import NewsApiClient
 from django.conf import settings
+from functools import lru_cache
+import pymongo
 from core.models import Tweet, NewsArticle
 from django.utils import timezone
 from datetime import datetime
+from .dedup import bulk_create_new
+from .collector import tweet_pages, article_pages, collect, searchable_since_id
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Most new items one incremental run takes in; the rest wait for the next run
+INCREMENTAL_LIMIT = 1000
+
+@lru_cache(maxsize=None)
+def shared_session(api):
+    """
+    One keep-alive HTTP session per API for the whole process, sized for
+    that API's concurrency, so services built per task or request reuse
+    open connections instead of each starting its own
+    """
+    pool_size = getattr(settings, 'COLLECTION_CONCURRENCY', {}).get(api, 4)
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(pool_size, 1))
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+@lru_cache(maxsize=None)
+def _mongo_client():
+    host = settings.DATABASES['default']['CLIENT'].get('host', 'mongodb://localhost:27017')
+    # tz_aware, so stored watermark times compare with the aware datetimes of new items
+    return pymongo.MongoClient(host, tz_aware=True)
+
+def state_collection(name):
+    """A MongoDB collection next to the models' for collection state (cursors, watermarks)"""
+    return _mongo_client()[settings.DATABASES['default']['NAME']][name]
+
+def tweet_from_api(tweet):
+    """Unsaved Tweet for a tweepy Tweet"""
+    return Tweet(
+        platform="twitter",
+        tweet_id=str(tweet.id),
+        author_id=str(tweet.author_id) if tweet.author_id else None,
+        created_at=tweet.created_at or timezone.now(),
+        lang=tweet.lang,
+        text=tweet.text
+    )
+
+def article_from_api(article):
+    """Unsaved NewsArticle for a NewsAPI article dict"""
+    # Parse published date
+    published_at = article.get("publishedAt")
+    if published_at:
+        published_at = datetime.fromisoformat(published_at.replace('Z', '+00:00'))
+    else:
+        published_at = timezone.now()
+    
+    return NewsArticle(
+        platform="newsapi",
+        source=article.get("source", {}).get("name", "Unknown") if article.get("source") else "Unknown",
+        author=article.get("author"),
+        title=article.get("title"),
+        description=article.get("description"),
+        url=article.get("url"),
+        published_at=published_at,
+        content=article.get("content")
+    )
+
 class TwitterService:
     def __init__(self):
         self.bearer_token = getattr(settings, 'TWITTER_CONFIG', {}).get('bearer_token')
@@ -16,6 +80,7 @@ class TwitterService:
             self.client = None
         else:
             self.client = tweepy.Client(bearer_token=self.bearer_token)
+            self.client.session = shared_session('twitter')
     
     def collect_tweets(self, query="misinformation OR fake news", max_results=10):
         """Collect recent tweets matching query and save to database."""
@@ -36,26 +101,101 @@ class TwitterService:
                 logger.warning("⚠️ No tweets found.")
                 return {'error': 'No tweets found', 'inserted': 0}
             
-            inserted_count = 0
-            for tweet in tweets.data:
-                # Check if tweet already exists
-                if Tweet.objects.filter(tweet_id=str(tweet.id)).exists():
-                    continue
-                
-                # Create new tweet object
-                tweet_obj = Tweet(
-                    platform="twitter",
-                    tweet_id=str(tweet.id),
-                    author_id=str(tweet.author_id) if tweet.author_id else None,
-                    created_at=tweet.created_at or timezone.now(),
-                    lang=tweet.lang,
-                    text=tweet.text
-                )
-                tweet_obj.save()
-                inserted_count += 1
+            # Stored tweets are skipped in one query and the rest written in one batch
+            result = bulk_create_new(Tweet, [tweet_from_api(tweet) for tweet in tweets.data], 'tweet_id')
+            
+            logger.info(f"✅ Inserted {result['inserted']} new tweets ({result['duplicates']} duplicates)")
+            return {'success': True, 'inserted': result['inserted'], 'duplicates': result['duplicates']}
+            
+        except Exception as e:
+            logger.error(f"❌ Error collecting tweets: {e}")
+            return {'error': str(e), 'inserted': 0}
+    
+    def collect_all_tweets(self, query="misinformation OR fake news", limit=None, checkpoints=None, job=None):
+        """
+        Collect every page of recent search results for query, writing one
+        page of up to 100 tweets at a time. With checkpoints, the cursor is
+        saved after each written page under job and a rerun resumes there.
+        """
+        if not self.client:
+            logger.error("Twitter client not initialized")
+            return {'error': 'Twitter client not configured', 'inserted': 0}
+        
+        job = job or f"twitter:{query}"
+        checkpoint = checkpoints.load(job) if checkpoints is not None else None
+        next_token = checkpoint['cursor'] if checkpoint else None
+        if checkpoint:
+            logger.info(f"↩️ Resuming '{job}' after {checkpoint['counts'].get('read', 0)} tweets")
+        
+        try:
+            logger.info(f"🔍 Fetching all tweets for query: {query}")
+            result = collect(
+                tweet_pages(self.client, query, next_token=next_token),
+                lambda tweets: bulk_create_new(Tweet, [tweet_from_api(tweet) for tweet in tweets], 'tweet_id'),
+                checkpoints=checkpoints, job=job, limit=limit,
+                counts=checkpoint['counts'] if checkpoint else None
+            )
+            logger.info(f"✅ Inserted {result.get('inserted', 0)} new tweets from {result['pages']} pages")
+            return {'success': True, 'inserted': 0, **result}
             
-            logger.info(f"✅ Inserted {inserted_count} new tweets")
-            return {'success': True, 'inserted': inserted_count}
+        except Exception as e:
+            logger.error(f"❌ Error collecting tweets: {e}")
+            return {'error': str(e), 'inserted': 0}
+    
+    def collect_new_tweets(self, query="misinformation OR fake news", watermarks=None, limit=INCREMENTAL_LIMIT,
+                           checkpoints=None):
+        """
+        Collect only the tweets newer than query's watermark, then move the
+        watermark to the newest one once everything is written
+
+        Results come newest first, so a run stopped at limit has not reached
+        the watermark yet and the watermark stays put. With checkpoints the
+        next run carries on with the same search where this one stopped.
+        """
+        if not self.client:
+            logger.error("Twitter client not initialized")
+            return {'error': 'Twitter client not configured', 'inserted': 0}
+        
+        job = f"twitter:new:{query}"
+        checkpoint = checkpoints.load(job) if checkpoints is not None else None
+        if checkpoint and checkpoint['state']['since_id'] and searchable_since_id(checkpoint['state']['since_id']) is None:
+            # The interrupted search can't be resumed once its since_id leaves the window
+            checkpoints.clear(job)
+            checkpoint = None
+        
+        if checkpoint:
+            state = checkpoint['state']
+            since_id = state['since_id']
+            logger.info(f"↩️ Resuming new tweets for '{query}' below tweet {state['newest']}")
+        else:
+            since_id = watermarks.get('twitter', query) if watermarks is not None else None
+            # Newest tweet written so far, and the since_id of this search
+            state = {'newest': since_id or 0, 'since_id': since_id}
+            if since_id and searchable_since_id(since_id) is None:
+                # Twitter rejects a since_id past the search window; the whole
+                # window is newer than the watermark anyway
+                logger.info(f"⏪ Watermark for '{query}' is older than 7 days, searching the full window")
+                since_id = state['since_id'] = None
+        
+        def write(tweets):
+            tweet_objs = [tweet_from_api(tweet) for tweet in tweets]
+            result = bulk_create_new(Tweet, tweet_objs, 'tweet_id')
+            state['newest'] = max(state['newest'], *(int(tweet.id) for tweet in tweets))
+            return result
+        
+        try:
+            logger.info(f"🔍 Fetching tweets for query: {query} (since {since_id or 'the start'})")
+            params = {'since_id': since_id} if since_id else {}
+            pages = tweet_pages(self.client, query, next_token=checkpoint['cursor'] if checkpoint else None, **params)
+            result = collect(pages, write, checkpoints=checkpoints, job=job, limit=limit, state=state)
+            if not result['finished']:
+                # Moving the watermark now would skip the tweets not read yet
+                logger.warning(f"⚠️ More than {limit} new tweets for '{query}'; "
+                               f"{'the next run carries on' if checkpoints is not None else 'watermark kept'}")
+            elif watermarks is not None and state['newest'] > (since_id or 0):
+                watermarks.advance('twitter', query, state['newest'])
+            logger.info(f"✅ Inserted {result.get('inserted', 0)} new tweets")
+            return {'success': True, 'inserted': 0, **result}
             
         except Exception as e:
             logger.error(f"❌ Error collecting tweets: {e}")
@@ -68,7 +208,7 @@ class NewsService:
             logger.error("NewsAPI key not configured")
             self.client = None
         else:
-            self.client = NewsApiClient(api_key=self.api_key)
+            self.client = NewsApiClient(api_key=self.api_key, session=shared_session('newsapi'))
     
     def collect_news(self, query="misinformation OR fake news", page_size=5):
         """Collect news articles matching query and save to database."""
@@ -90,35 +230,92 @@ class NewsService:
                 logger.warning("⚠️ No news articles found.")
                 return {'error': 'No articles found', 'inserted': 0}
             
-            inserted_count = 0
-            for article in articles["articles"]:
-                # Check if article already exists
-                if NewsArticle.objects.filter(url=article.get("url")).exists():
-                    continue
-                
-                # Parse published date
-                published_at = article.get("publishedAt")
-                if published_at:
-                    published_at = datetime.fromisoformat(published_at.replace('Z', '+00:00'))
-                else:
-                    published_at = timezone.now()
-                
-                # Create new article object
-                article_obj = NewsArticle(
-                    platform="newsapi",
-                    source=article.get("source", {}).get("name", "Unknown") if article.get("source") else "Unknown",
-                    author=article.get("author"),
-                    title=article.get("title"),
-                    description=article.get("description"),
-                    url=article.get("url"),
-                    published_at=published_at,
-                    content=article.get("content")
-                )
-                article_obj.save()
-                inserted_count += 1
+            # Stored articles are skipped in one query and the rest written in one batch
+            result = bulk_create_new(NewsArticle, [article_from_api(a) for a in articles["articles"]], 'url')
+            
+            logger.info(f"✅ Inserted {result['inserted']} new news articles ({result['duplicates']} duplicates)")
+            return {'success': True, 'inserted': result['inserted'], 'duplicates': result['duplicates']}
+            
+        except Exception as e:
+            logger.error(f"❌ Error collecting news: {e}")
+            return {'error': str(e), 'inserted': 0}
+    
+    def collect_all_news(self, query="misinformation OR fake news", limit=None, checkpoints=None, job=None):
+        """
+        Collect every page of NewsAPI results for query, 100 articles at a
+        time, with the same checkpointing as collect_all_tweets
+        """
+        if not self.client:
+            logger.error("NewsAPI client not initialized")
+            return {'error': 'NewsAPI client not configured', 'inserted': 0}
+        
+        job = job or f"newsapi:{query}"
+        checkpoint = checkpoints.load(job) if checkpoints is not None else None
+        page = checkpoint['cursor'] if checkpoint else 1
+        if checkpoint:
+            logger.info(f"↩️ Resuming '{job}' at page {page}")
+        
+        try:
+            logger.info(f"📰 Fetching all news for query: {query}")
+            result = collect(
+                article_pages(self.client, query, page=page),
+                lambda articles: bulk_create_new(NewsArticle, [article_from_api(a) for a in articles], 'url'),
+                checkpoints=checkpoints, job=job, limit=limit,
+                counts=checkpoint['counts'] if checkpoint else None
+            )
+            logger.info(f"✅ Inserted {result.get('inserted', 0)} new news articles from {result['pages']} pages")
+            return {'success': True, 'inserted': 0, **result}
             
-            logger.info(f"✅ Inserted {inserted_count} new news articles")
-            return {'success': True, 'inserted': inserted_count}
+        except Exception as e:
+            logger.error(f"❌ Error collecting news: {e}")
+            return {'error': str(e), 'inserted': 0}
+    
+    def collect_new_news(self, query="misinformation OR fake news", watermarks=None, limit=INCREMENTAL_LIMIT,
+                         checkpoints=None):
+        """
+        Collect only the articles published since query's watermark, then
+        move the watermark to the newest one once everything is written
+
+        As with collect_new_tweets, a run stopped at limit keeps the
+        watermark, and with checkpoints the next run resumes at the next page.
+        """
+        if not self.client:
+            logger.error("NewsAPI client not initialized")
+            return {'error': 'NewsAPI client not configured', 'inserted': 0}
+        
+        job = f"newsapi:new:{query}"
+        checkpoint = checkpoints.load(job) if checkpoints is not None else None
+        if checkpoint:
+            state = checkpoint['state']
+            logger.info(f"↩️ Resuming new articles for '{query}' at page {checkpoint['cursor']}")
+        else:
+            since = watermarks.get('newsapi', query) if watermarks is not None else None
+            # Newest publishedAt written so far, and the from of this search
+            state = {'newest': since, 'since': since}
+        since = state['since']
+        
+        def write(articles):
+            article_objs = [article_from_api(a) for a in articles]
+            result = bulk_create_new(NewsArticle, article_objs, 'url')
+            latest = max(a.published_at for a in article_objs)
+            if state['newest'] is None or latest > state['newest']:
+                state['newest'] = latest
+            return result
+        
+        try:
+            logger.info(f"📰 Fetching news for query: {query} (since {since or 'the start'})")
+            # from is inclusive and to the second, so the newest stored articles come back as duplicates
+            params = {'from_param': since.strftime('%Y-%m-%dT%H:%M:%S')} if since else {}
+            pages = article_pages(self.client, query, page=checkpoint['cursor'] if checkpoint else 1, **params)
+            result = collect(pages, write, checkpoints=checkpoints, job=job, limit=limit, state=state)
+            if not result['finished']:
+                # Moving the watermark now would skip the articles not read yet
+                logger.warning(f"⚠️ More than {limit} new articles for '{query}'; "
+                               f"{'the next run carries on' if checkpoints is not None else 'watermark kept'}")
+            elif watermarks is not None and state['newest'] and state['newest'] != since:
+                watermarks.advance('newsapi', query, state['newest'])
+            logger.info(f"✅ Inserted {result.get('inserted', 0)} new news articles")
+            return {'success': True, 'inserted': 0, **result}
             
         except Exception as e:
             logger.error(f"❌ Error collecting news: {e}")
@@ -1,5 +1,9 @@
-from celery import shared_task
-from .services import TwitterService, NewsService
+from celery import shared_task, current_app
+from django.conf import settings
+from .services import TwitterService, NewsService, state_collection
+from .collector import Checkpoints, Watermarks
+from .sweep import sweep, registered_queries
+from .scheduler import YieldScheduler
 import logging
 
 logger = logging.getLogger(__name__)
@@ -20,18 +24,78 @@ def collect_news_task(query="misinformation OR fake news", page_size=5):
     logger.info(f"News collection task completed: {result}")
     return result
 
+@shared_task
+def collect_new_tweets_task(query="misinformation OR fake news"):
+    """Async task to collect the tweets posted since the last run for query"""
+    watermarks = Watermarks(state_collection('collect_watermarks'))
+    checkpoints = Checkpoints(state_collection('collect_checkpoints'))
+    result = TwitterService().collect_new_tweets(query=query, watermarks=watermarks, checkpoints=checkpoints)
+    logger.info(f"Incremental tweet collection for '{query}' completed: {result}")
+    return result
+
+@shared_task
+def collect_new_news_task(query="misinformation OR fake news"):
+    """Async task to collect the articles published since the last run for query"""
+    watermarks = Watermarks(state_collection('collect_watermarks'))
+    checkpoints = Checkpoints(state_collection('collect_checkpoints'))
+    result = NewsService().collect_new_news(query=query, watermarks=watermarks, checkpoints=checkpoints)
+    logger.info(f"Incremental news collection for '{query}' completed: {result}")
+    return result
+
+@shared_task
+def collect_sweep_task():
+    """Async task to collect what is new for every registered query, concurrently"""
+    results = sweep()
+    logger.info(f"Collection sweep completed: {results}")
+    return results
+
 @shared_task
 def scheduled_data_collection():
     """Scheduled task to collect data periodically"""
     logger.info("Starting scheduled data collection...")
     
-    # Collect tweets
-    tweets_result = collect_tweets_task.delay()
-    
-    # Collect news
-    news_result = collect_news_task.delay()
+    # Every registered query in one task, so the queries share the API connection pools
+    sweep_result = collect_sweep_task.delay()
     
     return {
-        'tweets_task_id': tweets_result.id,
-        'news_task_id': news_result.id
+        'sweep_task_id': sweep_result.id
     }
+
+@shared_task
+def run_due_collections():
+    """
+    Scheduler tick: collect the registered queries whose adaptive interval
+    is up, then process new text right away instead of at the next slot
+    """
+    scheduler = YieldScheduler(
+        state_collection('collect_schedule'),
+        budgets=getattr(settings, 'COLLECTION_BUDGETS', None),
+        intervals=getattr(settings, 'COLLECTION_INTERVALS', None)
+    )
+    queries = registered_queries()
+    scheduler.register(queries)
+    due = scheduler.claim_due(queries)
+    if not due:
+        return {'collected': 0}
+    
+    by_query = {}
+    for source, query in due:
+        by_query.setdefault(query, []).append(source)
+    # A rate limited run can outlast the claim; it is renewed until the sweep is done
+    with scheduler.held(due):
+        results = sweep([{'query': query, 'sources': sources} for query, sources in by_query.items()])
+    
+    new = {'twitter': 0, 'newsapi': 0}
+    for source, query in due:
+        result = results[source][query]
+        delay = scheduler.record(source, query, result)
+        new[source] += result.get('inserted', 0)
+        logger.info(f"{source} '{query}': {result.get('inserted', 0)} new, next run in {delay / 60:.0f} min")
+    
+    # The text processing app is addressed by task name, like the beat schedule does
+    if new['twitter']:
+        current_app.send_task('text_processing.tasks.process_tweets_task')
+    if new['newsapi']:
+        current_app.send_task('text_processing.tasks.process_articles_task')
+    
+    return {'collected': len(due), 'new': new}
@@ -6,6 +6,7 @@ import sys
 # Add parent directory to path to import storage.db
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from storage.db import db, config, db_connected
+from ingestion.dedup import insert_new
 
 def collect_tweets(query="misinformation OR fake news", max_results=10):
     """
@@ -38,13 +39,8 @@ def collect_tweets(query="misinformation OR fake news", max_results=10):
             print("⚠️ No tweets found.")
             return
 
-        inserted_count = 0
+        docs = []
         for tweet in tweets.data:
-            # Skip if tweet already exists
-            existing = db.tweets.find_one({"tweet_id": str(tweet.id)})
-            if existing:
-                continue
-                
             doc = {
                 "platform": "twitter",
                 "tweet_id": str(tweet.id),
@@ -53,10 +49,13 @@ def collect_tweets(query="misinformation OR fake news", max_results=10):
                 "lang": tweet.lang,
                 "text": tweet.text
             }
-            db.tweets.insert_one(doc)
-            inserted_count += 1
+            docs.append(doc)
 
-        print(f"✅ Inserted {inserted_count} new tweets into MongoDB")
+        # One unordered insert; the unique index rejects stored tweets
+        result = insert_new(db.tweets, docs, "tweet_id")
+
+        print(f"✅ Inserted {result['inserted']} new tweets into MongoDB ({result['duplicates']} duplicates)")
+        return result
         
     except Exception as e:
         print(f"❌ Error collecting tweets: {e}")
\ No newline at end of file
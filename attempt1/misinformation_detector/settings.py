@@ -74,6 +74,18 @@ DATABASES = {
 TWITTER_CONFIG = config.get('twitter', {})
 NEWSAPI_CONFIG = config.get('newsapi', {})
 
+# BM25 index of cleaned articles, read by the bot's FactChecker
+NEWS_INDEX_PATH = config.get('news_index', {}).get('path', BASE_DIR / 'data' / 'news_index')
+
+# Queries collected on every sweep (a query string, or {query, sources}),
+# and how many requests each API may have in flight at once
+COLLECTION_QUERIES = config.get('collection', {}).get('queries', ['misinformation OR fake news'])
+COLLECTION_CONCURRENCY = config.get('collection', {}).get('concurrency', {'twitter': 4, 'newsapi': 2})
+# Collection requests per hour per API, and the bounds (seconds) of each
+# query's adaptive polling interval; see ingestion/scheduler.py
+COLLECTION_BUDGETS = config.get('collection', {}).get('budgets', {'twitter': 1200, 'newsapi': 4})
+COLLECTION_INTERVALS = config.get('collection', {}).get('intervals', {'min': 300, 'initial': 3600, 'max': 21600})
+
 # Celery Configuration
 CELERY_BROKER_URL = 'redis://localhost:6379'
 CELERY_RESULT_BACKEND = 'redis://localhost:6379'
@@ -0,0 +1,103 @@
+import sys
+import os
+from datetime import datetime, timedelta, timezone
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ingestion.collector import TWITTER_EPOCH_MS, collect, searchable_since_id, tweet_time
+
+
+def tweet_id_at(when):
+    return (int(when.timestamp() * 1000) - TWITTER_EPOCH_MS) << 22
+
+def test_tweet_time():
+    """The snowflake timestamp is read back to the millisecond"""
+    when = datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc)
+    assert tweet_time(tweet_id_at(when) + 12345) == when
+
+def test_stale_since_id_is_dropped():
+    """A watermark older than the 7-day search window is not sent as since_id"""
+    now = datetime(2024, 5, 10, tzinfo=timezone.utc)
+    fresh = tweet_id_at(now - timedelta(days=6))
+    stale = tweet_id_at(now - timedelta(days=8))
+    assert searchable_since_id(fresh, now=now) == fresh
+    assert searchable_since_id(stale, now=now) is None
+    assert searchable_since_id(None, now=now) is None
+
+
+class FakeCheckpoints:
+    """Checkpoints kept in a dict instead of MongoDB"""
+
+    def __init__(self):
+        self.saved = {}
+
+    def load(self, job):
+        return self.saved.get(job)
+
+    def save(self, job, cursor, counts, state=None):
+        self.saved[job] = {'_id': job, 'cursor': cursor, 'counts': dict(counts), 'state': dict(state or {})}
+
+    def clear(self, job):
+        self.saved.pop(job, None)
+
+
+def pages_from(cursor, pages=5, per_page=3, fail_at=None):
+    """Pages of (items, next cursor) as the page generators yield them, starting at cursor"""
+    for page in range(cursor, pages):
+        if page == fail_at:
+            raise ConnectionError("connection reset")
+        items = [f"item-{page}-{i}" for i in range(per_page)]
+        yield items, page + 1 if page + 1 < pages else None
+
+def test_collect_resumes_from_checkpoint():
+    """An interrupted run resumes after the last written page, writing each item once"""
+    checkpoints = FakeCheckpoints()
+    written = []
+    def write(items):
+        written.extend(items)
+        return {'inserted': len(items)}
+
+    try:
+        collect(pages_from(0, fail_at=3), write, checkpoints=checkpoints, job='job')
+    except ConnectionError:
+        pass
+    checkpoint = checkpoints.load('job')
+    assert checkpoint['cursor'] == 3
+    assert checkpoint['counts'] == {'read': 9, 'pages': 3, 'inserted': 9}
+
+    result = collect(pages_from(checkpoint['cursor']), write, checkpoints=checkpoints, job='job',
+                     counts=checkpoint['counts'])
+    assert result == {'read': 15, 'pages': 5, 'inserted': 15, 'finished': True}
+    assert written == [f"item-{p}-{i}" for p in range(5) for i in range(3)]
+    assert checkpoints.load('job') is None
+
+def test_collect_limit_applies_per_run():
+    """A run stopped at its limit keeps the checkpoint; the next run reads limit more items"""
+    checkpoints = FakeCheckpoints()
+    write = lambda items: {'inserted': len(items)}
+
+    first = collect(pages_from(0), write, checkpoints=checkpoints, job='job', limit=6)
+    assert first['finished'] is False and first['read'] == 6
+    checkpoint = checkpoints.load('job')
+    second = collect(pages_from(checkpoint['cursor']), write, checkpoints=checkpoints, job='job',
+                     limit=6, counts=checkpoint['counts'])
+    assert second['finished'] is False and second['read'] == 12
+    assert checkpoints.load('job')['cursor'] == 4
+
+def test_collect_checkpoints_state_with_the_cursor():
+    """What write keeps in state, like the newest id seen, is saved with each cursor"""
+    checkpoints = FakeCheckpoints()
+    state = {'newest': None}
+    def write(items):
+        state['newest'] = max(filter(None, [state['newest'], *items]))
+        return {}
+
+    first = collect(pages_from(0), write, checkpoints=checkpoints, job='job', limit=6, state=state)
+    assert first['finished'] is False
+    checkpoint = checkpoints.load('job')
+    assert checkpoint['state'] == {'newest': 'item-1-2'}
+
+    state = checkpoint['state']
+    second = collect(pages_from(checkpoint['cursor']), write, checkpoints=checkpoints, job='job', state=state)
+    assert second['finished'] is True
+    assert state == {'newest': 'item-4-2'}
+    assert checkpoints.load('job') is None
@@ -0,0 +1,94 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymongo.errors import BulkWriteError, OperationFailure
+
+from ingestion.dedup import DUPLICATE_KEY, insert_new
+
+
+class InsertResult:
+    def __init__(self, inserted_ids):
+        self.inserted_ids = inserted_ids
+
+
+class FakeCollection:
+    """Just enough of a pymongo collection for insert_new, with or without a unique index"""
+
+    def __init__(self, name, key, unique=True, indexes=None):
+        self.full_name = f"test.{name}"
+        self.key = key
+        self.unique = unique
+        self.indexes = dict(indexes or {'_id_': {'key': [('_id', 1)]}})
+        self.docs = []
+        self.finds = 0
+
+    def index_information(self):
+        return self.indexes
+
+    def create_index(self, key, unique=False):
+        if not self.unique:
+            raise OperationFailure("E11000 duplicate key error building the index")
+        if any(info['key'] == [(key, 1)] for info in self.indexes.values()):
+            raise OperationFailure("Index with name: tweet_id_1 already exists with a different name")
+        self.indexes[f"{key}_1"] = {'key': [(key, 1)], 'unique': unique}
+
+    def find(self, query, projection=None):
+        self.finds += 1
+        wanted = set(query[self.key]['$in'])
+        return [doc for doc in self.docs if doc[self.key] in wanted]
+
+    def insert_many(self, docs, ordered=True):
+        stored = {doc[self.key] for doc in self.docs}
+        errors = []
+        for i, doc in enumerate(docs):
+            if self.unique and doc[self.key] in stored:
+                errors.append({'index': i, 'code': DUPLICATE_KEY})
+                continue
+            self.docs.append(doc)
+            stored.add(doc[self.key])
+        if errors:
+            raise BulkWriteError({'writeErrors': errors, 'nInserted': len(docs) - len(errors)})
+        return InsertResult(list(range(len(docs))))
+
+
+def docs(*keys):
+    return [{'tweet_id': key, 'text': f"tweet {key}"} for key in keys]
+
+def test_insert_new_counts_duplicates():
+    """Repeats within a batch and keys the index rejects are duplicates, the rest inserted"""
+    collection = FakeCollection('tweets_counts', 'tweet_id')
+    assert insert_new(collection, docs('1', '2', '2', '3'), 'tweet_id') == \
+        {'inserted': 3, 'duplicates': 1, 'filtered': 0}
+    assert insert_new(collection, docs('3', '4', '1', '5'), 'tweet_id') == \
+        {'inserted': 2, 'duplicates': 2, 'filtered': 0}
+    assert len(collection.docs) == 5
+
+def test_indexed_inserts_never_look_keys_up():
+    """With the unique index, stored keys are rejected by insert_many in the same trip"""
+    collection = FakeCollection('tweets_no_lookup', 'tweet_id')
+    insert_new(collection, docs('1', '2'), 'tweet_id')
+    insert_new(collection, docs('1', '2', '3'), 'tweet_id')
+    assert collection.finds == 0
+
+def test_existing_unique_index_is_found_by_key():
+    """A unique index Djongo created under its own name counts; no lookups are needed"""
+    collection = FakeCollection('tweets_djongo', 'tweet_id', indexes={
+        '_id_': {'key': [('_id', 1)]},
+        'core_tweet_tweet_id_3f0a_uniq': {'key': [('tweet_id', 1)], 'unique': True},
+    })
+    assert insert_new(collection, docs('1', '2'), 'tweet_id') == \
+        {'inserted': 2, 'duplicates': 0, 'filtered': 0}
+    assert insert_new(collection, docs('2', '3'), 'tweet_id') == \
+        {'inserted': 1, 'duplicates': 1, 'filtered': 0}
+    assert collection.finds == 0
+
+def test_without_unique_index_every_key_is_looked_up():
+    """When the index can't be built, stored keys are still skipped rather than inserted twice"""
+    collection = FakeCollection('tweets_unindexed', 'tweet_id', unique=False)
+    collection.docs = docs('1', '1')
+    assert insert_new(collection, docs('1', '2'), 'tweet_id') == \
+        {'inserted': 1, 'duplicates': 1, 'filtered': 1}
+    assert insert_new(collection, docs('2', '3'), 'tweet_id') == \
+        {'inserted': 1, 'duplicates': 1, 'filtered': 1}
+    assert sorted(doc['tweet_id'] for doc in collection.docs) == ['1', '1', '2', '3']
@@ -14,6 +14,8 @@ class Command(BaseCommand):
                           help='Skip tweet text processing')
         parser.add_argument('--skip-articles', action='store_true',
                           help='Skip article text processing')
+        parser.add_argument('--rebuild-index', action='store_true',
+                          help='Add all cleaned articles to the news index')
 
     def handle(self, *args, **options):
         self.stdout.write(
@@ -40,6 +42,13 @@ class Command(BaseCommand):
                 self.style.SUCCESS(f"✅ Processed {articles_processed} articles")
             )
 
+        if options['rebuild_index']:
+            self.stdout.write('🔄 Rebuilding news index...')
+            indexed = cleaning_service.rebuild_news_index()
+            self.stdout.write(
+                self.style.SUCCESS(f"✅ Indexed {indexed} articles")
+            )
+
         # Print summary
         total_tweets = Tweet.objects.count()
         total_articles = NewsArticle.objects.count()
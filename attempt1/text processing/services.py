@@ -1,7 +1,10 @@
 import re
+import os
+import sys
 import nltk
 from nltk.corpus import stopwords
 from core.models import Tweet, NewsArticle
+from django.conf import settings
 from django.utils import timezone
 import logging
 
@@ -31,7 +34,34 @@ except (ImportError, OSError) as e:
     logger.info("💡 Install with: python -m spacy download en_core_web_sm")
     SPACY_AVAILABLE = False
 
+# The bot's BM25 news index lives in the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+try:
+    from bot.news_index import NewsIndex
+    NEWS_INDEX_AVAILABLE = True
+except ImportError as e:
+    logger.warning(f"⚠️ News index not available: {e}")
+    NEWS_INDEX_AVAILABLE = False
+
 class TextCleaningService:
+    def __init__(self, news_index=None):
+        """
+        Cleaned articles are also added to the news index at
+        settings.NEWS_INDEX_PATH, if set, for the bot's evidence lookups
+        """
+        index_path = getattr(settings, 'NEWS_INDEX_PATH', None)
+        if news_index is None and index_path and NEWS_INDEX_AVAILABLE:
+            news_index = NewsIndex(str(index_path))
+        self.news_index = news_index
+
+    def _index_article(self, article):
+        if self.news_index is not None:
+            self.news_index.add(
+                article.url, article.cleaned_text,
+                url=article.url, title=article.title, source=article.source,
+                published_at=article.published_at.isoformat() if article.published_at else None
+            )
+
     @staticmethod
     def clean_text(text: str) -> str:
         """
@@ -116,11 +146,34 @@ class TextCleaningService:
                 if cleaned:  # Only update if cleaning produced results
                     article.cleaned_text = cleaned
                     article.save(update_fields=['cleaned_text'])
+                    self._index_article(article)
                     processed_count += 1
         
+        if self.news_index is not None:
+            self.news_index.flush()
+        
         logger.info(f"✅ Processed {processed_count} articles")
         return processed_count
 
+    def rebuild_news_index(self, batch_size=50000):
+        """Index every already-cleaned article from scratch, e.g. when enabling the index"""
+        if self.news_index is None:
+            logger.warning("⚠️ NEWS_INDEX_PATH is not set, nothing to rebuild")
+            return 0
+        
+        articles_queryset = NewsArticle.objects.exclude(cleaned_text__isnull=True)
+        indexed_count = 0
+        # The new segments replace the old ones only once all are written
+        with self.news_index.rebuilding():
+            for article in articles_queryset.iterator():
+                self._index_article(article)
+                indexed_count += 1
+                if self.news_index.pending >= batch_size:
+                    self.news_index.flush()
+        
+        logger.info(f"✅ Indexed {indexed_count} articles")
+        return indexed_count
+
     def process_all(self, tweet_limit=None, article_limit=None):
         """Process both tweets and articles"""
         tweets_processed = self.process_tweets(limit=tweet_limit)
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the fact-checking bot
+
+Usage:
+    python benchmark.py [batch] [domains] [keywords] [news] [scanner] [similarity]
+"""
+import argparse
+import itertools
+import os
+import random
+import re
+import string
+import sys
+import tempfile
+import time
+
+# Add current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bot.domain_index import DomainIndex
+from bot.fact_checker import FactChecker
+from bot.keyword_matcher import KeywordMatcher
+from bot.news_index import NewsIndex
+from bot.similarity_index import SimilarityIndex
+from bot.text_scanner import scan_text
+
+SAMPLE_TWEETS = [
+    "BREAKING: Leaked documents show the miracle cure they don't want you to know about!!",
+    "According to reuters.com the vote count was certified this morning https://reuters.com/world/x",
+    "Doctors hate this one SECRET trick, 100% proven and 95% effective, 80% of people agree",
+    "Nice weather today, going for a walk in the park with the dog",
+    "Experts say the new study is flawed https://t.co/abc123 and https://fakenews.com/story",
+]
+
+
+def _random_tweets(rng: random.Random, size: int) -> list:
+    """Ordinary chatter with a sprinkling of SAMPLE_TWEETS and t.co links"""
+    vocab = ['the', 'vote', 'today', 'news', 'report', 'people', 'city', 'new',
+             'says', 'just', 'read', 'this', 'great', 'game', 'WOW', 'lol', '2024']
+    tweets = []
+    for i in range(size):
+        if i % 5 == 0:
+            tweets.append(rng.choice(SAMPLE_TWEETS))
+            continue
+        words = rng.choices(vocab, k=rng.randint(6, 25))
+        if rng.random() < 0.4:
+            words.append(f"https://t.co/{rng.getrandbits(40):x}")
+        tweets.append(' '.join(words))
+    return tweets
+
+
+def _random_phrase(rng: random.Random) -> str:
+    words = [
+        ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 9)))
+        for _ in range(rng.randint(1, 3))
+    ]
+    return ' '.join(words)
+
+
+def _time_per_call(func, texts, repeat: int) -> float:
+    """Return the mean time of func(text) in microseconds"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            func(text)
+    return (time.perf_counter() - start) / (repeat * len(texts)) * 1e6
+
+
+def bench_keywords(repeat: int = 200):
+    """Compare the Aho-Corasick matcher with one substring scan per keyword"""
+    rng = random.Random(42)
+    texts = [t.lower() for t in SAMPLE_TWEETS]
+
+    print(f"{'keywords':>10} {'naive us/tweet':>16} {'matcher us/tweet':>18} {'build ms':>10}")
+    for size in (10, 100, 1_000, 10_000, 50_000):
+        keywords = [_random_phrase(rng) for _ in range(size)]
+
+        start = time.perf_counter()
+        matcher = KeywordMatcher(keywords)
+        build_ms = (time.perf_counter() - start) * 1e3
+
+        def naive(text):
+            return [k for k in keywords if k in text]
+
+        naive_repeat = max(1, repeat * 10 // size)
+        naive_us = _time_per_call(naive, texts, naive_repeat)
+        matcher_us = _time_per_call(matcher.find, texts, repeat)
+        print(f"{size:>10} {naive_us:>16.1f} {matcher_us:>18.1f} {build_ms:>10.1f}")
+
+
+def _findall_features(text: str):
+    """The per-feature re.findall calls FactChecker made before scan_text"""
+    url_pattern = r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+'
+    return (
+        len(re.findall(r'[!]{2,}', text)),
+        len(re.findall(r'[A-Z]{4,}', text)),
+        len(re.findall(r'\d+%', text)),
+        re.findall(url_pattern, text),
+    )
+
+
+def bench_scanner(repeat: int = 20_000):
+    """Compare the single-pass scanner with one re.findall per feature"""
+    for name, func in (('re.findall x4', _findall_features), ('scan_text', scan_text)):
+        us = _time_per_call(func, SAMPLE_TWEETS, repeat)
+        print(f"{name:>14}: {us:6.2f} us/tweet")
+
+
+def bench_batch(size: int = 20_000):
+    """Compare analyze_batch with calling analyze_tweet in a loop"""
+    texts = _random_tweets(random.Random(7), size)
+    fact_checker = FactChecker()
+    fact_checker.analyze_batch(texts[:10])  # import NumPy outside the timing
+
+    def best_of(func, runs: int = 3) -> float:
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    loop_s = best_of(lambda: [fact_checker.analyze_tweet(text) for text in texts])
+    batch_s = best_of(lambda: fact_checker.analyze_batch(texts))
+
+    print(f"analyze_tweet loop: {size / loop_s:>10,.0f} tweets/s")
+    print(f"     analyze_batch: {size / batch_s:>10,.0f} tweets/s ({loop_s / batch_s:.1f}x)")
+
+
+def bench_domains(repeat: int = 20_000):
+    """Domain lookup time as the blocklist grows"""
+    rng = random.Random(11)
+
+    def domain():
+        return f"{_random_phrase(rng).replace(' ', '-')}.{rng.choice(['com', 'net', 'org'])}"
+
+    queries = [f"m.{domain()}" for _ in range(repeat)]
+    print(f"{'domains':>10} {'build s':>8} {'lookup us':>10}")
+    for size in (10_000, 100_000, 1_000_000):
+        start = time.perf_counter()
+        index = DomainIndex.from_lists([], [domain() for _ in range(size)])
+        build_s = time.perf_counter() - start
+        lookup_us = _time_per_call(index.lookup, queries, 1)
+        print(f"{size:>10} {build_s:>8.1f} {lookup_us:>10.1f}")
+
+
+def bench_news(queries: int = 200):
+    """BM25 query time as the article index grows, flushing 50k articles per segment"""
+    rng = random.Random(13)
+    # Zipf-like vocabulary, so common terms have long postings as in real news
+    vocab = [''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 9)))
+             for _ in range(50_000)]
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocab))))
+    tweets = [' '.join(rng.choices(vocab, cum_weights=cum_weights, k=12))
+              for _ in range(queries)]
+
+    print(f"{'articles':>10} {'build s':>8} {'segments':>9} {'MB':>7} {'query ms':>9}")
+    with tempfile.TemporaryDirectory() as path:
+        index = NewsIndex(path)
+        built = 0
+        build_s = 0.0
+        for size in (10_000, 100_000, 1_000_000):
+            start = time.perf_counter()
+            while built < size:
+                for i in range(built, min(built + 50_000, size)):
+                    text = ' '.join(rng.choices(vocab, cum_weights=cum_weights, k=40))
+                    index.add(f"https://example.com/{i}", text)
+                built = min(built + 50_000, size)
+                index.flush()
+            build_s += time.perf_counter() - start
+            megabytes = sum(os.path.getsize(s.path) for s in index.segments) / 1e6
+            query_ms = _time_per_call(index.search, tweets, 1) / 1000
+            print(f"{size:>10} {build_s:>8.1f} {len(index.segments):>9} "
+                  f"{megabytes:>7.1f} {query_ms:>9.2f}")
+        index.close()
+
+
+def bench_similarity(queries: int = 500):
+    """LSH insert and query cost, and recall of reworded claims, as the index grows"""
+    rng = random.Random(17)
+    vocab = [''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 9)))
+             for _ in range(50_000)]
+
+    def claim():
+        return rng.choices(vocab, k=rng.randint(10, 25))
+
+    def reword(words):
+        # Swap two words and maybe insert one: cosine similarity around 0.8
+        words = list(words)
+        for _ in range(2):
+            words[rng.randrange(len(words))] = rng.choice(vocab)
+        if rng.random() < 0.5:
+            words.insert(rng.randrange(len(words)), rng.choice(vocab))
+        return ' '.join(words)
+
+    print(f"{'items':>10} {'build s':>8} {'MB':>7} {'query ms':>9} {'recall@5':>9}")
+    index = SimilarityIndex()
+    built = 0
+    build_s = 0.0
+    claims = {}
+    for size in (10_000, 100_000, 1_000_000):
+        while built < size:
+            batch = [claim() for _ in range(min(50_000, size - built))]
+            for i in rng.sample(range(len(batch)), min(queries, len(batch)) // 10):
+                claims[built + i] = batch[i]
+            start = time.perf_counter()
+            index.add_many(range(built, built + len(batch)), [' '.join(w) for w in batch])
+            build_s += time.perf_counter() - start
+            built += len(batch)
+
+        sample = rng.sample(sorted(claims), min(queries, len(claims)))
+        reworded = [reword(claims[key]) for key in sample]
+        start = time.perf_counter()
+        found = sum(any(hit == key for hit, _, _ in index.query(text, 5))
+                    for key, text in zip(sample, reworded))
+        query_ms = (time.perf_counter() - start) / len(sample) * 1000
+        print(f"{size:>10} {build_s:>8.1f} {index.stats()['megabytes']:>7.1f} "
+              f"{query_ms:>9.2f} {found / len(sample):>9.2f}")
+
+
+BENCHMARKS = {
+    'batch': bench_batch,
+    'domains': bench_domains,
+    'keywords': bench_keywords,
+    'news': bench_news,
+    'scanner': bench_scanner,
+    'similarity': bench_similarity,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run fact-checking bot benchmarks")
+    parser.add_argument('names', nargs='*',
+                        help=f"Benchmarks to run: {', '.join(sorted(BENCHMARKS))} (default: all)")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+
+    for name in args.names or sorted(BENCHMARKS):
+        print(f"\n=== {name} ===")
+        BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+# bot/batch_analysis.py
+import re
+import time
+from collections import Counter
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from bot.scoring_rules import FLAG_KINDS
+from bot.text_scanner import _URL
+
+# Joins a batch into one string; nothing FactChecker looks for can contain it,
+# so no hit ever straddles two texts
+_SEPARATOR = '\x00'
+
+_URLS = re.compile(_URL)
+_NETLOC = re.compile(r'https?://([^/?#]*)')
+
+_EXCLAMATION = ord('!')
+_PERCENT = ord('%')
+
+# Above this many keywords one C-level find() per keyword over the batch costs
+# more than running the Aho-Corasick matcher on each text
+_KEYWORD_FIND_LIMIT = 256
+
+# Columns of the feature matrix
+KEYWORD_HITS, EXCLAMATION_RUNS, CAPS_RUNS, PERCENTAGES, URL_COUNT = range(5)
+
+STATUS_LABELS = np.array(['unclear', 'verified', 'disputed'], dtype=object)
+UNCLEAR, VERIFIED, DISPUTED = range(3)
+
+
+class BatchAnalysis:
+    """
+    Columnar result of FactChecker.analyze_batch
+
+    Confidence and status are NumPy arrays; per-row dicts in the same shape as
+    analyze_tweet() are only built when a row is indexed or iterated. Keyword
+    and URL hits are stored per distinct text, which rows maps each row to.
+    Reading rows has no side effects.
+    """
+
+    def __init__(self, fact_checker, rules, texts: Sequence[str], features: np.ndarray,
+                 rows: np.ndarray, keyword_rows: np.ndarray, keyword_ids: np.ndarray,
+                 url_rows: np.ndarray, urls: List[str],
+                 confidence: np.ndarray, status_codes: np.ndarray,
+                 similar_claims: Optional[List[List[Dict]]]):
+        self.texts = texts
+        self.features = features
+        self.confidence = confidence
+        self.status_codes = status_codes
+        self._rows = rows
+        self._keyword_rows = keyword_rows
+        self._keyword_ids = keyword_ids
+        self._keywords = fact_checker.suspicious_keywords
+        self._url_rows = url_rows
+        self._urls = urls
+        self._similar_claims = similar_claims
+        self._fact_checker = fact_checker
+        self._rules = rules
+
+    @property
+    def status(self) -> np.ndarray:
+        """Status labels ('verified', 'disputed', 'unclear') per row"""
+        return STATUS_LABELS[self.status_codes]
+
+    @property
+    def flag_counts(self) -> np.ndarray:
+        return _flag_counts(self.features)
+
+    def counts(self) -> Dict[str, int]:
+        """Number of rows per status"""
+        totals = np.bincount(self.status_codes, minlength=len(STATUS_LABELS))
+        return {label: int(n) for label, n in zip(STATUS_LABELS, totals)}
+
+    def flags(self, i: int) -> List[str]:
+        """Flags for row i, in the order analyze_tweet reports them"""
+        distinct = self._rows[i]
+        start, end = np.searchsorted(self._keyword_rows, [distinct, distinct + 1])
+        flags = [f"suspicious_keyword: {self._keywords[k]}"
+                 for k in self._keyword_ids[start:end]]
+
+        row = self.features[i]
+        if row[EXCLAMATION_RUNS] > 0:
+            flags.append("excessive_exclamation")
+        if row[CAPS_RUNS] > 2:
+            flags.append("excessive_caps")
+        if row[PERCENTAGES] > 2:
+            flags.append("many_percentages")
+        return flags
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __getitem__(self, i: int) -> Dict:
+        if i < 0:
+            i += len(self)
+        flags = self.flags(i)
+        reasoning = []
+        if flags:
+            reasoning.append(f"Contains {len(flags)} suspicious pattern(s)")
+
+        sources = []
+        distinct = self._rows[i]
+        start, end = np.searchsorted(self._url_rows, [distinct, distinct + 1])
+        if end > start:
+            # Rule hits were already counted for the whole batch
+            url_analysis = self._fact_checker._analyze_urls(self._urls[start:end], self._rules,
+                                                            count_hits=False)
+            sources = url_analysis['sources']
+            reasoning.extend(url_analysis['reasoning'])
+
+        evidence = self._fact_checker.find_evidence(self.texts[i])
+        if evidence:
+            reasoning.append(f"Related coverage in {len(evidence)} reliable article(s)")
+
+        status = STATUS_LABELS[self.status_codes[i]]
+        similar = list(self._similar_claims[i]) if self._similar_claims is not None else []
+        if similar:
+            reasoning.append(f"Reworded version of a claim previously rated {similar[0]['status']}")
+
+        return {
+            'text': self.texts[i],
+            'confidence': float(self.confidence[i]),
+            'status': status,
+            'reasoning': reasoning,
+            'sources': sources,
+            'flags': flags,
+            'evidence': evidence,
+            'similar_claims': similar
+        }
+
+    def __iter__(self) -> Iterator[Dict]:
+        for i in range(len(self)):
+            yield self[i]
+
+
+def _flag_columns(features: np.ndarray) -> List[np.ndarray]:
+    """Flags of each kind per row, in FLAG_KINDS order"""
+    return [features[:, KEYWORD_HITS],
+            features[:, EXCLAMATION_RUNS] > 0,
+            features[:, CAPS_RUNS] > 2,
+            features[:, PERCENTAGES] > 2]
+
+
+def _flag_counts(features: np.ndarray) -> np.ndarray:
+    keywords, exclamation, caps, percentages = _flag_columns(features)
+    return keywords + exclamation + caps + percentages
+
+
+def _flag_adjustment(rules, features: np.ndarray) -> np.ndarray:
+    """Per-row ScoringRules.flag_adjustment, with the same arithmetic"""
+    if rules.uniform_flag_weight is not None:
+        return _flag_counts(features) * rules.uniform_flag_weight
+    adjustment = np.zeros(len(features))
+    for column, weight in zip(_flag_columns(features), rules.flag_weights):
+        adjustment += column * weight
+    return adjustment
+
+
+def _runs_per_row(positions: np.ndarray, min_length: int, separators: np.ndarray,
+                  n: int) -> np.ndarray:
+    """Count maximal runs of consecutive positions at least min_length long in each text"""
+    if not len(positions):
+        return np.zeros(n, dtype=np.int64)
+    breaks = np.flatnonzero(np.diff(positions) != 1) + 1
+    run_starts = np.concatenate(([0], breaks))
+    run_lengths = np.diff(np.concatenate((run_starts, [len(positions)])))
+    starts = positions[run_starts[run_lengths >= min_length]]
+    return np.bincount(np.searchsorted(separators, starts), minlength=n)
+
+
+def _scan_features(blob: str, codes: np.ndarray, separators: np.ndarray, features: np.ndarray):
+    """
+    Fill the lexical columns and return (URL rows, URLs) in text order
+
+    Counts come from array operations over the code points of the whole batch
+    rather than one regex match at a time. They equal scan_text's: a maximal
+    run of 2+ '!' or 4+ A-Z is one findall match, and every '%' right after a
+    digit ends one percentage.
+    """
+    n = len(features)
+    features[:, EXCLAMATION_RUNS] = _runs_per_row(
+        np.flatnonzero(codes == _EXCLAMATION), 2, separators, n)
+    features[:, CAPS_RUNS] = _runs_per_row(
+        np.flatnonzero((codes - ord('A')) <= ord('Z') - ord('A')), 4, separators, n)
+
+    percents = np.flatnonzero(codes[1:] == _PERCENT) + 1
+    before = codes[percents - 1]
+    after_digit = (before - ord('0')) <= 9
+    # \d also matches non-ASCII decimal digits
+    for i in np.flatnonzero(before > 127):
+        after_digit[i] = chr(before[i]).isdecimal()
+    features[:, PERCENTAGES] = np.bincount(
+        np.searchsorted(separators, percents[after_digit]), minlength=n)
+
+    starts = []
+    urls = []
+    for match in _URLS.finditer(blob):
+        starts.append(match.start())
+        urls.append(match.group())
+    url_rows = np.searchsorted(separators, np.asarray(starts, dtype=np.int64))
+    features[:, URL_COUNT] = np.bincount(url_rows, minlength=n)
+    return url_rows, urls
+
+
+def _domain(fact_checker, url: str):
+    """FactChecker._extract_domain without urlparse for plain host names"""
+    match = _NETLOC.match(url)
+    # Expanded short links may lead anywhere (mailto:, //host/...), and
+    # bracketed IPv6 hosts need urlparse's validation
+    if match is None or '[' in match.group(1) or ']' in match.group(1):
+        return fact_checker._extract_domain(url)
+    return match.group(1).lower().replace('www.', '')
+
+
+def _keyword_hits(fact_checker, texts: List[str], blob: str, separators: np.ndarray):
+    """Return (row, keyword index) pairs sorted by row then keyword"""
+    keywords = fact_checker.suspicious_keywords
+    rows: List[int] = []
+    ids: List[int] = []
+
+    lowered = blob.lower()
+    if len(lowered) != len(blob):
+        # A few characters lowercase to two; offsets must come from the
+        # lowercased texts themselves
+        lowered_texts = [t.lower() for t in texts]
+        lowered = _SEPARATOR.join(lowered_texts)
+        lengths = np.fromiter(map(len, lowered_texts), dtype=np.int64, count=len(texts))
+        separators = np.cumsum(lengths[:-1] + 1) - 1
+
+    if len(keywords) <= _KEYWORD_FIND_LIMIT:
+        for k, keyword in enumerate(keywords):
+            if not keyword:
+                continue
+            hits = []
+            pos = lowered.find(keyword)
+            while pos != -1:
+                hits.append(pos)
+                pos = lowered.find(keyword, pos + 1)
+            if hits:
+                hit_rows = np.unique(np.searchsorted(separators, hits))
+                rows.extend(hit_rows.tolist())
+                ids.extend([k] * len(hit_rows))
+    else:
+        matcher = fact_checker._keyword_matcher
+        for row, text in enumerate(lowered.split(_SEPARATOR)):
+            for k in matcher.find_indices(text):
+                rows.append(row)
+                ids.append(k)
+
+    rows_arr = np.asarray(rows, dtype=np.int64)
+    ids_arr = np.asarray(ids, dtype=np.int64)
+    order = np.lexsort((ids_arr, rows_arr))
+    return rows_arr[order], ids_arr[order]
+
+
+def analyze_batch(fact_checker, texts: Sequence[str]) -> BatchAnalysis:
+    """Vectorized equivalent of calling fact_checker.analyze_tweet on every text"""
+    texts = list(texts)
+    n = len(texts)
+    # One rule set for the whole batch, even if it is swapped meanwhile
+    rules = fact_checker.rules
+    if n == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return BatchAnalysis(fact_checker, rules, texts, np.zeros((0, 5), dtype=np.int32),
+                             empty, empty, empty, empty, [], np.zeros(0),
+                             np.zeros(0, dtype=np.int8), None)
+
+    # Retweets and copied claims are scanned and scored once; rows maps each
+    # text to its distinct text
+    distinct: Dict[str, int] = {}
+    rows = np.array([distinct.setdefault(text, len(distinct)) for text in texts], dtype=np.int64)
+    distinct_texts = list(distinct)
+    m = len(distinct_texts)
+    features = np.zeros((m, 5), dtype=np.int32)
+    confidence = np.full(m, rules.base)
+
+    # One string and one code point array for the whole batch
+    blob = _SEPARATOR.join(distinct_texts)
+    if blob.count(_SEPARATOR) != m - 1:
+        # Nothing FactChecker matches involves U+FFFD either
+        scan_texts = [t.replace(_SEPARATOR, '\ufffd') for t in distinct_texts]
+        blob = _SEPARATOR.join(scan_texts)
+    else:
+        scan_texts = distinct_texts
+    codes = np.frombuffer(blob.encode('utf-32-le'), dtype=np.uint32)
+    separators = np.flatnonzero(codes == 0)
+
+    # Lexical features
+    url_rows, urls = _scan_features(blob, codes, separators, features)
+
+    # Suspicious keywords
+    keyword_rows, keyword_ids = _keyword_hits(fact_checker, scan_texts, blob, separators)
+    features[:, KEYWORD_HITS] = np.bincount(keyword_rows, minlength=m)
+
+    start = time.perf_counter()
+
+    # Domain reputation, looked up once per distinct URL and domain
+    distinct_urls = list(dict.fromkeys(urls))
+    finals = distinct_urls
+    if fact_checker.url_expander is not None:
+        finals = [fact_checker._resolve_url(url) for url in distinct_urls]
+    domains = [_domain(fact_checker, url) for url in finals]
+    domain_verdicts = {domain: fact_checker._domain_verdict(domain)
+                       for domain in set(domains) if domain}
+    url_verdicts = dict(zip(distinct_urls, map(domain_verdicts.get, domains)))
+    verdict_scores = {verdict: rules.domain_adjustment(verdict, count=False)
+                      for verdict in set(url_verdicts.values())}
+    url_adjustment = np.zeros(m)
+    # add.at is unbuffered, so each row sums its URLs in order like _analyze_urls
+    np.add.at(url_adjustment, url_rows,
+              np.fromiter((verdict_scores[url_verdicts[u]] for u in urls),
+                          dtype=np.float64, count=len(urls)))
+
+    # Same arithmetic, in the same order, as analyze_tweet
+    confidence += _flag_adjustment(rules, features)
+    confidence += url_adjustment
+
+    # Verified is checked first in analyze_tweet, so it is applied last here
+    status_codes = np.full(m, UNCLEAR, dtype=np.int8)
+    status_codes[confidence <= rules.disputed_threshold] = DISPUTED
+    status_codes[confidence >= rules.verified_threshold] = VERIFIED
+
+    # Back to one row per text
+    copies = np.bincount(rows, minlength=m)
+    features = features[rows]
+    confidence = confidence[rows]
+    status_codes = status_codes[rows]
+
+    # The rule hits analyze_tweet would have counted
+    for kind, column in zip(FLAG_KINDS, _flag_columns(features)):
+        rules.count(kind, int(column.sum()))
+    url_hits = Counter()
+    for url, hits in zip(urls, copies[url_rows].tolist()):
+        url_hits[url_verdicts[url]] += hits
+    for verdict, hits in url_hits.items():
+        if rules.domain_adjustment(verdict, count=False):
+            rules.count(f"domain_{verdict}", hits)
+    for label, hits in zip(STATUS_LABELS, np.bincount(status_codes, minlength=len(STATUS_LABELS))):
+        rules.count(label, int(hits))
+    rules.record(time.perf_counter() - start, n)
+
+    # Matching claims updates the claim index, so it happens here once, in
+    # text order like analyze_tweet, and not when rows are read
+    similar_claims = None
+    if fact_checker.claim_index is not None:
+        signatures = fact_checker.claim_index.signatures(texts)
+        similar_claims = [
+            fact_checker.match_signature(text, signature, STATUS_LABELS[code])
+            for text, signature, code in zip(texts, signatures, status_codes)
+        ]
+
+    return BatchAnalysis(fact_checker, rules, texts, features, rows, keyword_rows, keyword_ids,
+                         url_rows, urls, confidence, status_codes, similar_claims)
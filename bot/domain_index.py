@@ -0,0 +1,268 @@
+# bot/domain_index.py
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+RELIABLE = 'reliable'
+SUSPICIOUS = 'suspicious'
+_VERDICTS = {1: RELIABLE, 2: SUSPICIOUS}
+_CODES = {RELIABLE: 1, SUSPICIOUS: 2}
+
+# Index file layout, all little-endian and 8-byte aligned:
+#   header   magic, version, entry count, bloom bit count, bloom hash count,
+#            manifest length
+#   manifest JSON list of the list files built from, with sizes and mtimes
+#   bloom    bit array (may be empty)
+#   offsets  count + 1 uint64 offsets into the key blob
+#   verdicts one byte per entry
+#   keys     sorted reversed-label keys, concatenated
+_MAGIC = b'SSDI'
+_VERSION = 2
+_HEADER = struct.Struct('<4sIQQI4xQ')
+
+
+def _pad8(n: int) -> int:
+    return (n + 7) & ~7
+
+
+def domain_key(domain: str) -> bytes:
+    """
+    Reverse a domain's labels so every parent domain is a key prefix:
+    'edition.cnn.com' -> b'com.cnn.edition.'
+    """
+    labels = domain.strip().strip('.').lower().split('.')
+    return ('.'.join(reversed(labels)) + '.').encode('utf-8')
+
+
+def _bloom_positions(key: bytes, bits: int, hashes: int):
+    digest = hashlib.blake2b(key, digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], 'little')
+    h2 = int.from_bytes(digest[8:], 'little') | 1
+    return [(h1 + i * h2) % bits for i in range(hashes)]
+
+
+def _read_domains(path: str) -> List[str]:
+    """
+    Read a domain list, one domain per line. Blank lines and # comments are
+    skipped, and hosts-file lines ('0.0.0.0 example.com') use their last field.
+    """
+    domains = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                domains.append(line.split()[-1])
+    return domains
+
+
+def _manifest(reliable_paths: Iterable[str], suspicious_paths: Iterable[str]) -> bytes:
+    """The list files an index is built from, sorted, with their sizes and mtimes"""
+    files = []
+    for verdict, paths in ((RELIABLE, reliable_paths), (SUSPICIOUS, suspicious_paths)):
+        for path in sorted(paths):
+            stat = os.stat(path)
+            files.append([verdict, path, stat.st_size, stat.st_mtime_ns])
+    return json.dumps(files).encode('utf-8')
+
+
+def _stored_manifest(index_path: str) -> Optional[bytes]:
+    """Manifest in an index file's header, None if it has none"""
+    with open(index_path, 'rb') as f:
+        header = f.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            return None
+        magic, version, _, _, _, manifest_len = _HEADER.unpack(header)
+        if magic != _MAGIC or version != _VERSION:
+            return None
+        return f.read(manifest_len)
+
+
+class DomainIndex:
+    """
+    Reputation lookup for domains and all of their subdomains
+
+    Keys are kept sorted in one flat buffer, which can be a memory-mapped index
+    file, so millions of entries load instantly and cost no Python objects.
+    A lookup checks each parent of the domain (edition.cnn.com, cnn.com, com),
+    most specific first; a Bloom filter rules out most of them before any
+    binary search.
+    """
+
+    def __init__(self, buffer, source: Optional[str] = None):
+        self._buffer = buffer
+        self.source = source
+        view = memoryview(buffer)
+        magic, version, count, bloom_bits, bloom_hashes, manifest_len = _HEADER.unpack_from(view, 0)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"Not a domain index file: {source}")
+
+        pos = _HEADER.size
+        self.manifest = view[pos:pos + manifest_len].tobytes()
+        pos += _pad8(manifest_len)
+        bloom_len = _pad8((bloom_bits + 7) // 8)
+        self._bloom = view[pos:pos + bloom_len]
+        pos += bloom_len
+        self._offsets = view[pos:pos + (count + 1) * 8].cast('Q')
+        pos += (count + 1) * 8
+        self._verdicts = view[pos:pos + count]
+        pos += _pad8(count)
+        self._keys = view[pos:]
+
+        self._count = count
+        self._bloom_bits = bloom_bits
+        self._bloom_hashes = bloom_hashes
+
+    # Building
+
+    @staticmethod
+    def _serialize(entries: Dict[bytes, int], bloom_bits_per_entry: int,
+                   manifest: bytes = b'') -> bytes:
+        keys = sorted(entries)
+        count = len(keys)
+        bloom_bits = count * bloom_bits_per_entry if bloom_bits_per_entry else 0
+        # ~0.7 hashes per bit-per-entry minimises the false positive rate
+        bloom_hashes = max(1, round(bloom_bits_per_entry * 0.7)) if bloom_bits else 0
+
+        bloom = bytearray(_pad8((bloom_bits + 7) // 8))
+        offsets = [0]
+        for key in keys:
+            offsets.append(offsets[-1] + len(key))
+            if bloom_bits:
+                for bit in _bloom_positions(key, bloom_bits, bloom_hashes):
+                    bloom[bit >> 3] |= 1 << (bit & 7)
+
+        verdicts = bytes(entries[key] for key in keys)
+        return b''.join([
+            _HEADER.pack(_MAGIC, _VERSION, count, bloom_bits, bloom_hashes, len(manifest)),
+            manifest + bytes(_pad8(len(manifest)) - len(manifest)),
+            bytes(bloom),
+            struct.pack(f'<{count + 1}Q', *offsets),
+            verdicts + bytes(_pad8(count) - count),
+            b''.join(keys),
+        ])
+
+    @staticmethod
+    def _entries(reliable: Iterable[str], suspicious: Iterable[str]) -> Dict[bytes, int]:
+        entries = {}
+        for domain in reliable:
+            entries[domain_key(domain)] = _CODES[RELIABLE]
+        # A domain on both lists is treated as suspicious
+        for domain in suspicious:
+            entries[domain_key(domain)] = _CODES[SUSPICIOUS]
+        return entries
+
+    @classmethod
+    def from_lists(cls, reliable: Iterable[str], suspicious: Iterable[str],
+                   bloom_bits_per_entry: int = 10) -> 'DomainIndex':
+        """Build an in-memory index from domain lists"""
+        data = cls._serialize(cls._entries(reliable, suspicious), bloom_bits_per_entry)
+        return cls(data)
+
+    @classmethod
+    def build(cls, index_path: str, reliable_paths: Iterable[str] = (),
+              suspicious_paths: Iterable[str] = (), reliable: Iterable[str] = (),
+              suspicious: Iterable[str] = (), bloom_bits_per_entry: int = 10):
+        """Parse allowlist/blocklist files and write a prebuilt index file"""
+        reliable_paths = list(reliable_paths)
+        suspicious_paths = list(suspicious_paths)
+        # Taken before reading, so a list changed meanwhile is read again next time
+        manifest = _manifest(reliable_paths, suspicious_paths)
+        reliable = list(reliable)
+        suspicious = list(suspicious)
+        for path in reliable_paths:
+            reliable.extend(_read_domains(path))
+        for path in suspicious_paths:
+            suspicious.extend(_read_domains(path))
+
+        entries = cls._entries(reliable, suspicious)
+        tmp_path = f"{index_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(cls._serialize(entries, bloom_bits_per_entry, manifest))
+        os.replace(tmp_path, index_path)
+        logger.info(f"Built domain index {index_path} with {len(entries)} domains")
+
+    @classmethod
+    def open(cls, index_path: str) -> 'DomainIndex':
+        """Memory-map a prebuilt index file"""
+        with open(index_path, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(buffer, source=index_path)
+
+    @classmethod
+    def load_or_build(cls, index_path: str, reliable_paths: Iterable[str] = (),
+                      suspicious_paths: Iterable[str] = (), **kwargs) -> 'DomainIndex':
+        """
+        Open index_path, rebuilding it first unless it was built from the
+        same list files with the same sizes and mtimes. A list added,
+        dropped or replaced by an older copy counts as a change, which
+        comparing mtimes with the index's own would miss.
+        """
+        reliable_paths = list(reliable_paths)
+        suspicious_paths = list(suspicious_paths)
+        stale = not os.path.exists(index_path) or \
+            _stored_manifest(index_path) != _manifest(reliable_paths, suspicious_paths)
+        if stale:
+            cls.build(index_path, reliable_paths, suspicious_paths, **kwargs)
+        return cls.open(index_path)
+
+    # Lookup
+
+    def _might_contain(self, key: bytes) -> bool:
+        bits = self._bloom_bits
+        if not bits:
+            return True
+        bloom = self._bloom
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        # Same positions as _bloom_positions, stopping at the first clear bit
+        for i in range(self._bloom_hashes):
+            bit = (h1 + i * h2) % bits
+            if not bloom[bit >> 3] & (1 << (bit & 7)):
+                return False
+        return True
+
+    def _find(self, key: bytes) -> int:
+        """Binary search for key; returns its verdict code or 0"""
+        offsets, keys = self._offsets, self._keys
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            probe = keys[offsets[mid]:offsets[mid + 1]].tobytes()
+            if probe < key:
+                lo = mid + 1
+            elif probe > key:
+                hi = mid
+            else:
+                return self._verdicts[mid]
+        return 0
+
+    def lookup(self, domain: str) -> Optional[str]:
+        """Return RELIABLE, SUSPICIOUS or None for a domain or any parent of it"""
+        host = domain.rsplit('@', 1)[-1]
+        if not host.endswith(']'):
+            host = host.split(':', 1)[0]
+        if not host or not self._count:
+            return None
+
+        key = domain_key(host)
+
+        # Most specific suffix first: b'com.cnn.edition.', b'com.cnn.', b'com.'
+        end = len(key)
+        while end > 0:
+            prefix = key[:end]
+            if self._might_contain(prefix):
+                code = self._find(prefix)
+                if code:
+                    return _VERDICTS[code]
+            end = key.rfind(b'.', 0, end - 1) + 1
+        return None
+
+    def __len__(self) -> int:
+        return self._count
@@ -1,14 +1,28 @@
-import re
+import hashlib
 import requests
 from typing import Dict, List, Optional
 import time
+import logging
+
+from bot.domain_index import RELIABLE, SUSPICIOUS, DomainIndex
+from bot.keyword_matcher import KeywordMatcher
+from bot.scoring_rules import ScoringRules
+from bot.text_scanner import TextFeatures, scan_text
+from bot.verdict_cache import VerdictCache, normalize_claim
+
+logger = logging.getLogger(__name__)
+
+# Claim statuses as stored in the labels of a SimilarityIndex
+CLAIM_STATUSES = ('unclear', 'verified', 'disputed')
 
 class FactChecker:
     """
     Simple fact-checking system using web search and pattern matching
     """
     
-    def __init__(self):
+    def __init__(self, keywords_path: Optional[str] = None, confidence_threshold: float = 0.7,
+                 verdict_cache: Optional[VerdictCache] = None,
+                 rules: Optional[ScoringRules] = None):
         self.suspicious_keywords = [
             'breaking', 'urgent', 'shocking', 'leaked', 'exposed',
             'they don\'t want you to know', 'mainstream media won\'t tell you',
@@ -21,77 +35,239 @@ class FactChecker:
             'factcheck.org', 'snopes.com', 'politifact.com',
             'who.int', 'cdc.gov', 'nih.gov'
         ]
+        
+        self.suspicious_domains = [
+            'fakenews.com', 'clickbait.com', 'conspiracy.net',
+            # Add more as needed
+        ]
+        
+        # Matches subdomains too (edition.cnn.com, m.bbc.com). Indexes loaded
+        # with load_domain_lists are consulted before this built-in one.
+        self.domain_indexes = [
+            DomainIndex.from_lists(self.reliable_sources, self.suspicious_domains)
+        ]
+        
+        # Weights and thresholds; without a rules file, confidence at or above
+        # the threshold is 'verified' and at or below its mirror image (0.3 for
+        # the default 0.7) is 'disputed'. A RulesWatcher may replace this.
+        self.rules = rules or ScoringRules(verified=confidence_threshold)
+        
+        # Copies of the same claim are only analyzed once while cached
+        self.verdict_cache = verdict_cache
+        
+        # Short links (t.co) resolved ahead of time by a UrlExpander
+        self.url_expander = None
+        
+        # BM25 index of stored news articles, searched for related coverage
+        self.news_index = None
+        self.evidence_k = 3
+        
+        # LSH index of analyzed claims, for spotting reworded repeats
+        self.claim_index = None
+        self.claim_similarity = 0.8
+        
+        if keywords_path:
+            self.load_suspicious_keywords(keywords_path)
+    
+    @property
+    def verified_threshold(self) -> float:
+        return self.rules.verified_threshold
+    
+    @property
+    def disputed_threshold(self) -> float:
+        return self.rules.disputed_threshold
+    
+    @property
+    def suspicious_keywords(self) -> tuple:
+        """Suspicious keywords, read-only so the matcher never goes stale"""
+        return self._keyword_matcher.keywords
+    
+    @suspicious_keywords.setter
+    def suspicious_keywords(self, keywords: List[str]):
+        # Recompile the automaton whenever the keyword list is replaced
+        self._keyword_matcher = KeywordMatcher(keywords)
+    
+    def load_domain_lists(self, index_path: str, reliable_paths: List[str] = (),
+                          suspicious_paths: List[str] = ()):
+        """
+        Add allowlist/blocklist files (one domain per line) to domain reputation.
+        The lists are compiled into index_path once and memory-mapped afterwards.
+        """
+        index = DomainIndex.load_or_build(index_path, reliable_paths, suspicious_paths)
+        self.domain_indexes.insert(0, index)
+        logger.info(f"Loaded {len(index)} domains from {index_path}")
+    
+    def _domain_verdict(self, domain: str) -> Optional[str]:
+        """RELIABLE, SUSPICIOUS or None from the first index that knows the domain"""
+        for index in self.domain_indexes:
+            verdict = index.lookup(domain)
+            if verdict:
+                return verdict
+        return None
+    
+    def add_suspicious_keywords(self, keywords: List[str]):
+        """Append keywords to the list and rebuild the matcher"""
+        self.suspicious_keywords = list(self.suspicious_keywords) + list(keywords)
+    
+    def load_suspicious_keywords(self, path: str):
+        """Add keywords from a text file, one phrase per line (# for comments)"""
+        with open(path, 'r', encoding='utf-8') as f:
+            keywords = [line.strip() for line in f]
+        self.add_suspicious_keywords([k for k in keywords if k and not k.startswith('#')])
     
     def analyze_tweet(self, tweet_text: str) -> Dict:
         """
         Analyze a tweet for potential misinformation
         Returns a dictionary with verification results
         """
+        if self.verdict_cache is not None:
+            return self.verdict_cache.get_or_compute(tweet_text, self._analyze_tweet)
+        return self._analyze_tweet(tweet_text)
+    
+    def _analyze_tweet(self, tweet_text: str) -> Dict:
+        """Run every check on a tweet, bypassing the verdict cache"""
+        # One rule set for the whole tweet, even if it is swapped meanwhile
+        rules = self.rules
         result = {
             'text': tweet_text,
-            'confidence': 0.5,
+            'confidence': rules.base,
             'status': 'unclear',  # 'verified', 'disputed', 'unclear'
             'reasoning': [],
             'sources': [],
-            'flags': []
+            'flags': [],
+            'evidence': [],
+            'similar_claims': []
         }
         
+        # Walk the tweet once for every lexical feature
+        features = scan_text(tweet_text)
+        
         # Check for suspicious patterns
-        flags = self._check_suspicious_patterns(tweet_text)
+        flags = self._check_suspicious_patterns(tweet_text, features)
         result['flags'] = flags
         
         # Adjust confidence based on flags
+        start = time.perf_counter()
         if flags:
-            result['confidence'] -= len(flags) * 0.1
+            result['confidence'] += rules.flag_adjustment(flags)
             result['reasoning'].append(f"Contains {len(flags)} suspicious pattern(s)")
         
         # Check for URLs and analyze them
-        urls = self._extract_urls(tweet_text)
+        urls = self._extract_urls(tweet_text, features)
         if urls:
-            url_analysis = self._analyze_urls(urls)
+            url_analysis = self._analyze_urls(urls, rules)
             result['sources'] = url_analysis['sources']
             result['confidence'] += url_analysis['confidence_adjustment']
             result['reasoning'].extend(url_analysis['reasoning'])
         
         # Determine final status
-        if result['confidence'] >= 0.7:
-            result['status'] = 'verified'
-        elif result['confidence'] <= 0.3:
-            result['status'] = 'disputed'
-        else:
-            result['status'] = 'unclear'
+        result['status'] = rules.status(result['confidence'])
+        rules.record(time.perf_counter() - start)
+        
+        # Related articles from reliable outlets
+        evidence = self.find_evidence(tweet_text)
+        if evidence:
+            result['evidence'] = evidence
+            result['reasoning'].append(f"Related coverage in {len(evidence)} reliable article(s)")
+        
+        similar = self.match_claim(tweet_text, result['status'])
+        if similar:
+            result['similar_claims'] = similar
+            result['reasoning'].append(
+                f"Reworded version of a claim previously rated {similar[0]['status']}"
+            )
         
         return result
     
-    def _check_suspicious_patterns(self, text: str) -> List[str]:
+    def analyze_batch(self, texts: List[str]):
+        """
+        Analyze many tweets at once with vectorized scoring
+        Returns a BatchAnalysis whose rows match analyze_tweet() results
+        """
+        # NumPy is only needed for batch work, not for the bot's reply path
+        from bot.batch_analysis import analyze_batch
+        return analyze_batch(self, texts)
+    
+    def find_evidence(self, text: str) -> List[Dict]:
+        """Top related news articles from reliable sources, best match first"""
+        if self.news_index is None or self.evidence_k <= 0:
+            return []
+        evidence = []
+        # Over-fetch, since articles from other outlets are dropped
+        for article in self.news_index.search(text, self.evidence_k * 4):
+            domain = self._extract_domain(article.get('url') or '')
+            if domain and self._domain_verdict(domain) == RELIABLE:
+                evidence.append(article)
+                if len(evidence) == self.evidence_k:
+                    break
+        return evidence
+    
+    def match_claim(self, text: str, status: str, k: int = 3) -> List[Dict]:
+        """
+        Find earlier claims similar to text, then remember text with its status.
+        Claims are keyed by their normalized text, so exact repeats never match.
+        """
+        if self.claim_index is None:
+            return []
+        return self.match_signature(text, self.claim_index.signatures([text])[0], status, k)
+    
+    def match_signature(self, text: str, signature, status: str, k: int = 3) -> List[Dict]:
+        """match_claim for a signature already computed by the claim index"""
+        # Casefolded, so a shouted copy of a claim is the same claim rather
+        # than a near match of itself
+        digest = hashlib.blake2b(normalize_claim(text).encode('utf-8'), digest_size=8).digest()
+        key = int.from_bytes(digest, 'little', signed=True)
+        
+        if not signature.any():
+            # Nothing to compare a text without words by
+            return []
+        # One lock across the lookup and the insert, so two workers checking
+        # the same claim don't both store it
+        with self.claim_index.lock:
+            hits = self.claim_index.query_signature(signature, k + 1, self.claim_similarity)
+            if all(hit_key != key for hit_key, _, _ in hits):
+                self.claim_index.add_signatures([key], signature[None, :],
+                                                [CLAIM_STATUSES.index(status)])
+        return [
+            {'key': hit_key, 'similarity': round(similarity, 3), 'status': CLAIM_STATUSES[label]}
+            for hit_key, similarity, label in hits if hit_key != key
+        ][:k]
+    
+    def _check_suspicious_patterns(self, text: str,
+                                   features: Optional[TextFeatures] = None) -> List[str]:
         """Check for suspicious keywords and patterns"""
+        if features is None:
+            features = scan_text(text)
         flags = []
         text_lower = text.lower()
         
-        for keyword in self.suspicious_keywords:
-            if keyword in text_lower:
-                flags.append(f"suspicious_keyword: {keyword}")
+        # Single pass over the text regardless of how many keywords are loaded
+        for keyword in self._keyword_matcher.find(text_lower):
+            flags.append(f"suspicious_keyword: {keyword}")
         
         # Check for excessive punctuation/caps
-        if len(re.findall(r'[!]{2,}', text)) > 0:
+        if features.exclamation_runs > 0:
             flags.append("excessive_exclamation")
         
-        if len(re.findall(r'[A-Z]{4,}', text)) > 2:
+        if features.caps_runs > 2:
             flags.append("excessive_caps")
         
         # Check for numbers without context (often misleading statistics)
-        if len(re.findall(r'\d+%', text)) > 2:
+        if features.percentages > 2:
             flags.append("many_percentages")
         
         return flags
     
-    def _extract_urls(self, text: str) -> List[str]:
+    def _extract_urls(self, text: str, features: Optional[TextFeatures] = None) -> List[str]:
         """Extract URLs from tweet text"""
-        url_pattern = r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+'
-        return re.findall(url_pattern, text)
+        if features is None:
+            features = scan_text(text)
+        return features.urls(text)
     
-    def _analyze_urls(self, urls: List[str]) -> Dict:
+    def _analyze_urls(self, urls: List[str], rules: Optional[ScoringRules] = None,
+                      count_hits: bool = True) -> Dict:
         """Analyze URLs for reliability"""
+        rules = rules or self.rules
         analysis = {
             'sources': [],
             'confidence_adjustment': 0,
@@ -99,19 +275,26 @@ class FactChecker:
         }
         
         for url in urls:
-            domain = self._extract_domain(url)
+            domain = self._extract_domain(self._resolve_url(url))
             if domain:
                 analysis['sources'].append(domain)
                 
-                if domain in self.reliable_sources:
-                    analysis['confidence_adjustment'] += 0.2
+                adjustment = rules.domain_adjustment(self._domain_verdict(domain), count_hits)
+                if adjustment > 0:
+                    analysis['confidence_adjustment'] += adjustment
                     analysis['reasoning'].append(f"Contains link to reliable source: {domain}")
-                elif self._is_suspicious_domain(domain):
-                    analysis['confidence_adjustment'] -= 0.2
+                elif adjustment < 0:
+                    analysis['confidence_adjustment'] += adjustment
                     analysis['reasoning'].append(f"Contains link to questionable source: {domain}")
         
         return analysis
     
+    def _resolve_url(self, url: str) -> str:
+        """Where a short link leads, if the URL expander has already followed it"""
+        if self.url_expander is None:
+            return url
+        return self.url_expander.resolved(url)
+    
     def _extract_domain(self, url: str) -> Optional[str]:
         """Extract domain from URL"""
         try:
@@ -123,11 +306,7 @@ class FactChecker:
     
     def _is_suspicious_domain(self, domain: str) -> bool:
         """Check if domain is known for misinformation"""
-        suspicious_domains = [
-            'fakenews.com', 'clickbait.com', 'conspiracy.net',
-            # Add more as needed
-        ]
-        return domain in suspicious_domains
+        return self._domain_verdict(domain) == SUSPICIOUS
     
     def generate_response(self, analysis: Dict, original_user: str) -> str:
         """Generate appropriate response based on analysis"""
@@ -154,4 +333,10 @@ class FactChecker:
             reason = analysis['reasoning'][0][:50] + "..." if len(analysis['reasoning'][0]) > 50 else analysis['reasoning'][0]
             response += f" ({reason})"
         
+        # Point to related coverage when the claim is not confirmed
+        if status != 'verified' and analysis.get('evidence'):
+            link = f" Related: {analysis['evidence'][0]['url']}"
+            if len(response) + len(link) <= 280:
+                response += link
+        
         return response[:280]  # Ensure within Twitter limit
\ No newline at end of file
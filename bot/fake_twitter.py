@@ -0,0 +1,564 @@
+# bot/fake_twitter.py
+import json
+import logging
+import queue
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+logger = logging.getLogger(__name__)
+
+# Per-window call limits of the endpoints the bot uses, as on the real API
+DEFAULT_LIMITS = {
+    'GET /2/tweets/search/recent': 450,
+    'GET /2/tweets/:id': 300,
+    'GET /2/tweets': 300,
+    'POST /2/tweets': 200,
+    'GET /1.1/account/verify_credentials.json': 75,
+    'POST /1.1/statuses/update.json': 300,
+    'GET /2/tweets/search/stream': 50,
+    'GET /2/tweets/search/stream/rules': 450,
+    'POST /2/tweets/search/stream/rules': 450,
+}
+
+_ID = re.compile(r'(?<=.)/\d+')
+_FIRST_ID = 1_800_000_000_000_000_000
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+
+class FakeTwitter:
+    """
+    In-memory stand-in for the parts of the Twitter v1.1/v2 API the bot
+    uses: recent search, the filtered stream and its rules, tweet lookup,
+    posting (v2 create_tweet and v1.1 update_status) and
+    verify_credentials
+
+    Every response carries x-rate-limit-* headers and goes over its
+    endpoint's limit with a 429. latency (plus up to jitter) is added to
+    every call, and error_rate of the calls fail with a 503; both can be
+    set per endpoint in endpoint_latency and endpoint_errors. The calls
+    per endpoint and every reply, with the time it arrived, are recorded.
+    Open streams get a keep-alive every keepalive seconds without tweets.
+    """
+
+    def __init__(self, bot_username: str = 'factbot', latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, limits: Optional[Dict[str, int]] = None, window: float = 900,
+                 endpoint_latency: Optional[Dict[str, float]] = None,
+                 endpoint_errors: Optional[Dict[str, float]] = None, keepalive: float = 20.0,
+                 seed: int = 0):
+        self.bot_username = bot_username
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.limits = dict(DEFAULT_LIMITS, **(limits or {}))
+        self.window = window
+        self.endpoint_latency = endpoint_latency or {}
+        self.endpoint_errors = endpoint_errors or {}
+        self.keepalive = keepalive
+        self.rules: Dict[str, Dict] = {}
+        self._streams: List[queue.Queue] = []
+        self.tweets: Dict[int, Dict] = {}
+        self.users: Dict[str, Dict] = {}
+        self.calls: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        self.limited: Dict[str, int] = {}
+        # Mention id -> times at which replies to it arrived
+        self.replies: Dict[int, List[float]] = {}
+        self.mention_times: Dict[int, float] = {}
+        self._next_id = _FIRST_ID
+        self._windows: Dict[str, List] = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.bot = self.user(bot_username)
+
+    # State
+
+    def user(self, username: str) -> Dict:
+        with self._lock:
+            if username not in self.users:
+                self.users[username] = {'id': str(len(self.users) + 1000), 'name': username,
+                                        'username': username}
+            return self.users[username]
+
+    def _add_tweet(self, text: str, author: Dict, reply_to: Optional[int] = None) -> Dict:
+        with self._lock:
+            # Snowflake-like: later tweets always get larger ids
+            self._next_id += self._random.randint(1, 1000)
+            tweet_id = self._next_id
+            parent = self.tweets.get(reply_to) if reply_to else None
+            tweet = {
+                'id': tweet_id, 'text': text, 'author_id': author['id'],
+                'conversation_id': parent['conversation_id'] if parent else tweet_id,
+                'in_reply_to': reply_to, 'created_at': time.time(),
+            }
+            self.tweets[tweet_id] = tweet
+            return tweet
+
+    def post(self, text: str, author: str, reply_to: Optional[int] = None) -> Dict:
+        """A tweet by someone other than the bot"""
+        tweet = self._add_tweet(text, self.user(author), reply_to)
+        self._publish(tweet)
+        return tweet
+
+    def mention(self, text: str, author: str = 'someone', root_text: Optional[str] = None,
+                root: Optional[int] = None) -> Dict:
+        """
+        Tweet a mention of the bot; as a reply to root, or to a new root
+        tweet with root_text, when given
+        """
+        if root is None and root_text:
+            root = self.post(root_text, 'original_poster')['id']
+        if f"@{self.bot_username}" not in text:
+            text = f"@{self.bot_username} {text}"
+        tweet = self._add_tweet(text, self.user(author), root)
+        with self._lock:
+            self.mention_times[tweet['id']] = tweet['created_at']
+        self._publish(tweet)
+        return tweet
+
+    # Filtered stream
+
+    def _publish(self, tweet: Dict):
+        """Deliver tweet to the open streams if it matches a rule"""
+        with self._lock:
+            rules = [rule for rule in self.rules.values() if self._matches(tweet, rule['value'])]
+            streams = list(self._streams)
+        if rules:
+            for stream in streams:
+                stream.put((tweet, rules))
+
+    def open_stream(self) -> tuple:
+        """(status, headers, queue of (tweet, matching rules)) for a stream connection"""
+        status, headers, payload = self.handle('GET', '/2/tweets/search/stream', check_only=True)
+        if status != 200:
+            return status, headers, payload
+        stream: queue.Queue = queue.Queue()
+        with self._lock:
+            self._streams.append(stream)
+        return status, headers, stream
+
+    def close_stream(self, stream: queue.Queue):
+        with self._lock:
+            if stream in self._streams:
+                self._streams.remove(stream)
+
+    def drop_streams(self):
+        """Close every open stream from the server side, as the API does now and then"""
+        with self._lock:
+            streams = list(self._streams)
+        for stream in streams:
+            stream.put(None)
+
+    def stream_payload(self, tweet: Dict, rules: List[Dict], expansions: str) -> Dict:
+        payload = {'data': self._v2_tweet(tweet),
+                   'matching_rules': [{'id': rule['id'], 'tag': rule.get('tag')} for rule in rules]}
+        includes = self._includes([tweet], expansions)
+        if includes:
+            payload['includes'] = includes
+        return payload
+
+    def _get_rules(self, query: Dict) -> tuple:
+        with self._lock:
+            rules = list(self.rules.values())
+        if not rules:
+            return 200, {'meta': {'sent': _now(), 'result_count': 0}}
+        return 200, {'data': rules, 'meta': {'sent': _now(), 'result_count': len(rules)}}
+
+    def _change_rules(self, query: Dict) -> tuple:
+        created = []
+        with self._lock:
+            for rule in query.get('add') or []:
+                self._next_id += 1
+                rule = dict(rule, id=str(self._next_id))
+                self.rules[rule['id']] = rule
+                created.append(rule)
+            deleted = [rule_id for rule_id in (query.get('delete') or {}).get('ids', [])
+                       if self.rules.pop(str(rule_id), None)]
+        summary = {'created': len(created), 'not_created': 0, 'valid': len(created), 'invalid': 0,
+                   'deleted': len(deleted), 'not_deleted': 0}
+        payload = {'meta': {'sent': _now(), 'summary': summary}}
+        if created:
+            payload['data'] = created
+        return 200, payload
+
+    # Requests
+
+    def _endpoint(self, method: str, path: str) -> str:
+        return f"{method} {_ID.sub('/:id', path)}"
+
+    def _rate_limit(self, endpoint: str) -> Dict:
+        """Count a call against endpoint's window; 'remaining' is -1 once over the limit"""
+        limit = self.limits.get(endpoint, 900)
+        now = time.time()
+        with self._lock:
+            window = self._windows.get(endpoint)
+            if window is None or now >= window[1]:
+                window = self._windows[endpoint] = [0, now + self.window]
+            window[0] += 1
+            return {'limit': limit, 'remaining': limit - window[0], 'reset': int(window[1]) + 1}
+
+    def handle(self, method: str, url: str, body: bytes = b'', check_only: bool = False) -> tuple:
+        """
+        (status, headers, payload) for a request; sleeps for the emulated
+        latency. check_only stops after the latency, errors and rate limit.
+        """
+        parsed = urlparse(url)
+        path = parsed.path
+        endpoint = self._endpoint(method, path)
+        with self._lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+            delay = self.endpoint_latency.get(endpoint, self.latency)
+            delay += self._random.uniform(0, self.jitter) if self.jitter else 0.0
+            fail = self._random.random() < self.endpoint_errors.get(endpoint, self.error_rate)
+        if delay:
+            time.sleep(delay)
+
+        window = self._rate_limit(endpoint)
+        headers = {
+            'x-rate-limit-limit': str(window['limit']),
+            'x-rate-limit-remaining': str(max(window['remaining'], 0)),
+            'x-rate-limit-reset': str(window['reset']),
+        }
+        if window['remaining'] < 0:
+            self._count(self.limited, endpoint)
+            return 429, headers, {'title': 'Too Many Requests', 'status': 429}
+        if fail:
+            self._count(self.errors, endpoint)
+            return 503, headers, {'title': 'Service Unavailable', 'status': 503}
+        if check_only:
+            return 200, headers, None
+
+        query = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+        if body and method == 'POST':
+            if body.lstrip().startswith(b'{'):
+                query.update(json.loads(body))
+            else:
+                query.update({key: values[-1] for key, values in parse_qs(body.decode()).items()})
+
+        handler = {
+            'GET /2/tweets/search/recent': self._search,
+            'GET /2/tweets/:id': lambda q: self._lookup([int(path.rsplit('/', 1)[1])], q, single=True),
+            'GET /2/tweets': lambda q: self._lookup([int(i) for i in q.get('ids', '').split(',') if i], q),
+            'POST /2/tweets': self._create_tweet,
+            'GET /2/tweets/search/stream/rules': self._get_rules,
+            'POST /2/tweets/search/stream/rules': self._change_rules,
+            'GET /1.1/account/verify_credentials.json': lambda q: (200, self._v1_user(self.bot)),
+            'POST /1.1/statuses/update.json': self._update_status,
+        }.get(endpoint)
+        if handler is None:
+            return 404, headers, {'title': 'Not Found', 'detail': f"{method} {path}", 'status': 404}
+        status, payload = handler(query)
+        return status, headers, payload
+
+    def _count(self, counter: Dict, endpoint: str):
+        with self._lock:
+            counter[endpoint] = counter.get(endpoint, 0) + 1
+
+    def _matches(self, tweet: Dict, query: str) -> bool:
+        for term in query.split():
+            if term == '-is:retweet':
+                continue
+            negated = term.startswith('-')
+            term = term.lstrip('-')
+            if term.startswith('from:'):
+                matched = tweet['author_id'] == self.users.get(term[5:], {}).get('id')
+            elif term.startswith('in_reply_to_tweet_id:'):
+                matched = str(tweet['in_reply_to']) == term.split(':', 1)[1]
+            else:
+                matched = term.lower() in tweet['text'].lower()
+            if matched == negated:
+                return False
+        return True
+
+    def _search(self, query: Dict) -> tuple:
+        since_id = int(query.get('since_id', 0))
+        # next_token is the id below which the next page starts
+        until_id = int(query.get('next_token') or query.get('until_id') or 0)
+        max_results = min(max(int(query.get('max_results', 10)), 10), 100)
+        with self._lock:
+            found = [tweet for tweet_id, tweet in sorted(self.tweets.items(), reverse=True)
+                     if tweet_id > since_id and (not until_id or tweet_id < until_id)
+                     and self._matches(tweet, query.get('query', ''))]
+        page = found[:max_results]
+        if not page:
+            return 200, {'meta': {'result_count': 0}}
+        meta = {'newest_id': str(page[0]['id']), 'oldest_id': str(page[-1]['id']),
+                'result_count': len(page)}
+        if len(found) > max_results:
+            meta['next_token'] = str(page[-1]['id'])
+        payload = {'data': [self._v2_tweet(tweet) for tweet in page], 'meta': meta}
+        includes = self._includes(page, query.get('expansions', ''))
+        if includes:
+            payload['includes'] = includes
+        return 200, payload
+
+    def _includes(self, tweets: List[Dict], expansions: str) -> Dict:
+        includes = {}
+        expansions = expansions.split(',')
+        with self._lock:
+            if 'author_id' in expansions:
+                by_id = {user['id']: user for user in self.users.values()}
+                authors = {tweet['author_id'] for tweet in tweets}
+                includes['users'] = [by_id[author_id] for author_id in authors]
+            if 'referenced_tweets.id' in expansions:
+                parents = {tweet['in_reply_to'] for tweet in tweets if tweet['in_reply_to'] in self.tweets}
+                if parents:
+                    includes['tweets'] = [self._v2_tweet(self.tweets[parent]) for parent in parents]
+        return includes
+
+    def _lookup(self, tweet_ids: List[int], query: Dict, single: bool = False) -> tuple:
+        with self._lock:
+            found = [self._v2_tweet(self.tweets[tweet_id]) for tweet_id in tweet_ids if tweet_id in self.tweets]
+        missing = [{'value': str(tweet_id), 'detail': f"Could not find tweet with id: [{tweet_id}].",
+                    'title': 'Not Found Error'} for tweet_id in tweet_ids if tweet_id not in self.tweets]
+        payload = {}
+        if found:
+            payload['data'] = found[0] if single else found
+        if missing:
+            payload['errors'] = missing
+        return 200, payload
+
+    def _reply(self, text: str, reply_to: Optional[str]) -> Dict:
+        tweet = self._add_tweet(text, self.bot, int(reply_to) if reply_to else None)
+        if tweet['in_reply_to'] is not None:
+            with self._lock:
+                self.replies.setdefault(tweet['in_reply_to'], []).append(tweet['created_at'])
+        self._publish(tweet)
+        return tweet
+
+    def _create_tweet(self, query: Dict) -> tuple:
+        reply_to = (query.get('reply') or {}).get('in_reply_to_tweet_id')
+        tweet = self._reply(query.get('text', ''), reply_to)
+        return 201, {'data': {'id': str(tweet['id']), 'text': tweet['text']}}
+
+    def _update_status(self, query: Dict) -> tuple:
+        tweet = self._reply(query.get('status', ''), query.get('in_reply_to_status_id'))
+        return 200, {'id': tweet['id'], 'id_str': str(tweet['id']), 'text': tweet['text'],
+                     'created_at': self._v1_time(tweet['created_at']), 'user': self._v1_user(self.bot)}
+
+    @staticmethod
+    def _v2_tweet(tweet: Dict) -> Dict:
+        data = {
+            'id': str(tweet['id']), 'text': tweet['text'], 'author_id': tweet['author_id'],
+            'edit_history_tweet_ids': [str(tweet['id'])],
+            'conversation_id': str(tweet['conversation_id']),
+            'created_at': datetime.fromtimestamp(tweet['created_at'], timezone.utc)
+                                  .strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z',
+        }
+        if tweet['in_reply_to']:
+            data['referenced_tweets'] = [{'type': 'replied_to', 'id': str(tweet['in_reply_to'])}]
+        return data
+
+    @staticmethod
+    def _v1_time(timestamp: float) -> str:
+        return datetime.fromtimestamp(timestamp, timezone.utc).strftime('%a %b %d %H:%M:%S %z %Y')
+
+    def _v1_user(self, user: Dict) -> Dict:
+        return {'id': int(user['id']), 'id_str': user['id'], 'name': user['name'],
+                'screen_name': user['username']}
+
+    # Results
+
+    def report(self) -> Dict:
+        """Throughput, mention-to-reply latency and API calls per mention so far"""
+        with self._lock:
+            mentions = dict(self.mention_times)
+            replies = {mention_id: list(times) for mention_id, times in self.replies.items()
+                       if mention_id in mentions}
+            calls = dict(self.calls)
+            errors = dict(self.errors)
+            limited = dict(self.limited)
+        latencies = sorted(times[0] - mentions[mention_id] for mention_id, times in replies.items())
+        report = {
+            'mentions': len(mentions),
+            'answered': len(replies),
+            'duplicate_replies': sum(len(times) - 1 for times in replies.values()),
+            'api_calls': calls,
+            'api_calls_per_mention': sum(calls.values()) / len(mentions) if mentions else 0.0,
+            'errors_injected': errors,
+            'rate_limited': limited,
+        }
+        if latencies:
+            first = min(mentions.values())
+            last = max(times[0] for times in replies.values())
+            report['replies_per_second'] = len(replies) / max(last - first, 1e-9)
+            for name, q in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99)):
+                report[f'latency_{name}'] = latencies[min(len(latencies) - 1, int(len(latencies) * q))]
+            report['latency_max'] = latencies[-1]
+        return report
+
+
+class FakeTwitterServer:
+    """FakeTwitter served over HTTP on localhost, in a background thread"""
+
+    def __init__(self, twitter: FakeTwitter, host: str = '127.0.0.1', port: int = 0):
+        self.twitter = twitter
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler_class(self):
+        twitter = self.twitter
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, as the API clients reuse their connections
+            protocol_version = 'HTTP/1.1'
+
+            def _send(self, status: int, headers: Dict, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _respond(self, method: str):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                self._send(*twitter.handle(method, self.path, body))
+
+            def _write_chunk(self, data: bytes):
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def _stream(self):
+                status, headers, stream = twitter.open_stream()
+                if status != 200:
+                    self._send(status, headers, stream)
+                    return
+                expansions = parse_qs(urlparse(self.path).query).get('expansions', [''])[-1]
+                self.send_response(200)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                try:
+                    while True:
+                        try:
+                            item = stream.get(timeout=twitter.keepalive)
+                        except queue.Empty:
+                            self._write_chunk(b"\r\n")
+                            continue
+                        if item is None:
+                            break
+                        tweet, rules = item
+                        payload = twitter.stream_payload(tweet, rules, expansions)
+                        self._write_chunk(json.dumps(payload).encode() + b"\r\n")
+                    self.wfile.write(b"0\r\n\r\n")
+                    self.close_connection = True
+                except OSError:
+                    # The client went away
+                    self.close_connection = True
+                finally:
+                    twitter.close_stream(stream)
+
+            def do_GET(self):
+                if urlparse(self.path).path == '/2/tweets/search/stream':
+                    self._stream()
+                    return
+                self._respond('GET')
+
+            def do_POST(self):
+                self._respond('POST')
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        return Handler
+
+    def start(self) -> 'FakeTwitterServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='fake-twitter', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class MentionReplayer:
+    """
+    Feeds a stream of mentions to a FakeTwitter in a background thread
+
+    Each mention is a dict with 'text' and optionally 'author', 'root_text'
+    (the tweet it replies to) and 'at' (seconds from the start). Mentions
+    with 'at' are replayed on that schedule, divided by speed; the others
+    arrive at rate per second.
+    """
+
+    def __init__(self, twitter: FakeTwitter, mentions: Iterable[Dict], rate: float = 10.0,
+                 speed: float = 1.0):
+        self.twitter = twitter
+        self.mentions = list(mentions)
+        self.rate = rate
+        self.speed = speed
+        self.published = 0
+        self.done = threading.Event()
+        self._roots: Dict[str, int] = {}
+
+    def _publish(self, mention: Dict):
+        root = None
+        if mention.get('root_text'):
+            # Mentions replying to the same text share one root tweet, as in a viral thread
+            root = self._roots.get(mention['root_text'])
+            if root is None:
+                root = self._roots[mention['root_text']] = self.twitter.post(
+                    mention['root_text'], 'original_poster')['id']
+        self.twitter.mention(mention['text'], mention.get('author', 'someone'), root=root)
+        self.published += 1
+
+    def run(self):
+        start = time.time()
+        for i, mention in enumerate(self.mentions):
+            at = mention['at'] / self.speed if 'at' in mention else i / self.rate
+            wait = start + at - time.time()
+            if wait > 0:
+                time.sleep(wait)
+            self._publish(mention)
+        self.done.set()
+
+    def start(self) -> 'MentionReplayer':
+        threading.Thread(target=self.run, name='mention-replayer', daemon=True).start()
+        return self
+
+
+def load_mentions(path: str) -> List[Dict]:
+    """Recorded mentions, one JSON object per line"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def synthetic_mentions(count: int, texts: List[str], reply_fraction: float = 0.5,
+                       roots: int = 20, seed: int = 0) -> List[Dict]:
+    """
+    count mentions over texts; reply_fraction of them reply to one of
+    roots shared root tweets, so the root cache sees viral threads
+    """
+    rng = random.Random(seed)
+    root_texts = [rng.choice(texts) + f" #{i}" for i in range(roots)]
+    mentions = []
+    for i in range(count):
+        mention = {'author': f"user{rng.randrange(count)}"}
+        if root_texts and rng.random() < reply_fraction:
+            mention['text'] = "is this true?"
+            mention['root_text'] = rng.choice(root_texts)
+        else:
+            mention['text'] = f"check this: {rng.choice(texts)} ({i})"
+        mentions.append(mention)
+    return mentions
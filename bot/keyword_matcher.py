@@ -0,0 +1,85 @@
+# bot/keyword_matcher.py
+from typing import Iterable, List, Tuple
+
+# Below this many keywords a C-level substring test per keyword beats walking
+# the automaton one character at a time in Python
+_SUBSTRING_LIMIT = 128
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton for finding many keywords in one pass over a text.
+
+    The automaton is compiled once from the keyword list; scanning a text costs
+    O(len(text) + hits) no matter how many keywords were loaded. Short lists
+    are checked with plain substring tests instead.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords: Tuple[str, ...] = tuple(keywords)
+        self._goto: List[dict] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]
+        self._build()
+
+    def _build(self):
+        """Build the trie, then the failure links breadth-first"""
+        goto, fail, out = self._goto, self._fail, self._out
+
+        for index, keyword in enumerate(self.keywords):
+            if not keyword:
+                continue
+            state = 0
+            for ch in keyword:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    fail.append(0)
+                    out.append(())
+                state = nxt
+            out[state] = out[state] + (index,)
+
+        # Root children fail back to the root; deeper states follow their
+        # parent's failure chain and inherit the matches of where they land
+        queue = list(goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                target = goto[f].get(ch, 0)
+                fail[nxt] = target if target != nxt else 0
+                if out[fail[nxt]]:
+                    out[nxt] = out[nxt] + out[fail[nxt]]
+
+    def find_indices(self, text: str) -> List[int]:
+        """Return the sorted indices of every keyword that occurs in text"""
+        if len(self.keywords) <= _SUBSTRING_LIMIT:
+            return [i for i, keyword in enumerate(self.keywords) if keyword and keyword in text]
+
+        goto, fail, out = self._goto, self._fail, self._out
+        hits = set()
+        state = 0
+
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                hits.update(out[state])
+
+        return sorted(hits)
+
+    def find(self, text: str) -> List[str]:
+        """Return every keyword that occurs in text, in keyword-list order"""
+        keywords = self.keywords
+        return [keywords[i] for i in self.find_indices(text)]
+
+    def __len__(self) -> int:
+        return len(self.keywords)
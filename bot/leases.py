@@ -0,0 +1,301 @@
+# bot/leases.py
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Redis is only needed when workers share leases through it
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+# How long a finished mention is remembered, beyond the 7 days of recent search
+DONE_RETENTION = 8 * 86400
+
+
+def default_owner() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class SQLiteLeaseStore:
+    """
+    Leases on mention ids in a SQLite file shared by the workers of one host
+
+    A worker owns a mention while its lease is live. Leases are short and
+    renewed before a reply is posted; a crashed worker's leases simply
+    expire, and the mention (stored with its lease) is taken over by
+    whichever worker reclaims it first. Finished mentions stay marked done
+    so they are never leased again.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS leases ('
+            'mention_id TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL, '
+            'done INTEGER NOT NULL DEFAULT 0, payload TEXT)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS leases_expiry ON leases (done, expires_at)')
+
+    def _transaction(self, func):
+        # BEGIN IMMEDIATE takes the write lock up front, so the check and the
+        # update of a lease are atomic across processes
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                result = func(self._db, time.time())
+                self._db.execute('COMMIT')
+                return result
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+
+    def acquire(self, payloads: Dict[str, Dict], owner: str, ttl: float) -> List[str]:
+        """
+        Lease the mentions of payloads that were never leased to owner;
+        returns the ids granted. Expired leases are left to reclaim().
+        """
+        def run(db, now):
+            granted = []
+            for mention_id, payload in payloads.items():
+                if db.execute(
+                    'INSERT OR IGNORE INTO leases (mention_id, owner, expires_at, payload) VALUES (?, ?, ?, ?)',
+                    (mention_id, owner, now + ttl, json.dumps(payload, default=str))
+                ).rowcount:
+                    granted.append(mention_id)
+            return granted
+        return self._transaction(run)
+
+    def renew(self, mention_id: str, owner: str, ttl: float) -> bool:
+        """Extend owner's lease, or retake it if it lapsed unclaimed; False if lost"""
+        def run(db, now):
+            return bool(db.execute(
+                'UPDATE leases SET owner = ?, expires_at = ? '
+                'WHERE mention_id = ? AND done = 0 AND (owner = ? OR expires_at < ?)',
+                (owner, now + ttl, mention_id, owner, now)
+            ).rowcount)
+        return self._transaction(run)
+
+    def complete(self, mention_id: str, owner: str) -> bool:
+        """Mark owner's mention done for good"""
+        def run(db, now):
+            return bool(db.execute(
+                'UPDATE leases SET done = 1, expires_at = ?, payload = NULL '
+                'WHERE mention_id = ? AND owner = ? AND done = 0',
+                (now + DONE_RETENTION, mention_id, owner)
+            ).rowcount)
+        return self._transaction(run)
+
+    def release(self, mention_id: str, owner: str):
+        """Give a mention back before the lease runs out"""
+        def run(db, now):
+            db.execute('UPDATE leases SET expires_at = 0 WHERE mention_id = ? AND owner = ? AND done = 0',
+                       (mention_id, owner))
+        self._transaction(run)
+
+    def reclaim(self, owner: str, ttl: float, limit: int = 100) -> List[Dict]:
+        """Take over mentions whose lease expired before they were done"""
+        def run(db, now):
+            rows = db.execute(
+                'SELECT mention_id, payload FROM leases WHERE done = 0 AND expires_at < ? LIMIT ?',
+                (now, limit)
+            ).fetchall()
+            for mention_id, _ in rows:
+                db.execute('UPDATE leases SET owner = ?, expires_at = ? WHERE mention_id = ?',
+                           (owner, now + ttl, mention_id))
+            # Finished mentions older than the retention are forgotten
+            db.execute('DELETE FROM leases WHERE done = 1 AND expires_at < ?', (now,))
+            return [json.loads(payload) for _, payload in rows if payload]
+        return self._transaction(run)
+
+    def stats(self) -> Dict:
+        now = time.time()
+        with self._lock:
+            live, done, expired = self._db.execute(
+                'SELECT SUM(done = 0 AND expires_at >= ?), SUM(done = 1), SUM(done = 0 AND expires_at < ?) '
+                'FROM leases', (now, now)
+            ).fetchone()
+        return {'live': live or 0, 'done': done or 0, 'expired': expired or 0}
+
+    def close(self):
+        self._db.close()
+
+
+class RedisLeaseStore:
+    """
+    The same leases in Redis, for workers spread over several hosts
+
+    lease:<id> holds the owner with a TTL, done:<id> marks finished
+    mentions, mention:<id> keeps the payload for a takeover, and the sorted
+    set leases:expiry indexes unfinished leases by expiry time.
+    """
+
+    # First lease of a mention: it must never have been leased before
+    _ACQUIRE = """
+    if redis.call('EXISTS', KEYS[2]) == 1 or redis.call('EXISTS', KEYS[4]) == 1 then return 0 end
+    redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+    redis.call('SET', KEYS[4], ARGV[5], 'EX', ARGV[6])
+    redis.call('ZADD', KEYS[3], ARGV[3], ARGV[4])
+    return 1
+    """
+    # Take over an expired lease; leases of finished mentions are dropped from the index
+    _TAKEOVER = """
+    if redis.call('EXISTS', KEYS[2]) == 1 then
+        redis.call('ZREM', KEYS[3], ARGV[4])
+        return nil
+    end
+    if not redis.call('SET', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then return nil end
+    redis.call('ZADD', KEYS[3], ARGV[3], ARGV[4])
+    return redis.call('GET', KEYS[4])
+    """
+    # Extend or retake a lease unless the mention is done or someone else holds it
+    _RENEW = """
+    if redis.call('EXISTS', KEYS[2]) == 1 then return 0 end
+    local holder = redis.call('GET', KEYS[1])
+    if holder and holder ~= ARGV[1] then return 0 end
+    redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+    redis.call('ZADD', KEYS[3], ARGV[3], ARGV[4])
+    return 1
+    """
+    _COMPLETE = """
+    if redis.call('GET', KEYS[1]) ~= ARGV[1] then return 0 end
+    redis.call('SET', KEYS[2], 1, 'EX', ARGV[2])
+    redis.call('DEL', KEYS[1], KEYS[4])
+    redis.call('ZREM', KEYS[3], ARGV[3])
+    return 1
+    """
+    _RELEASE = """
+    if redis.call('GET', KEYS[1]) == ARGV[1] then redis.call('DEL', KEYS[1]) end
+    return 0
+    """
+
+    def __init__(self, url: str, prefix: str = 'factbot'):
+        if not REDIS_AVAILABLE:
+            raise ImportError("Redis leases need the redis package: pip install redis")
+        self._redis = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._acquire = self._redis.register_script(self._ACQUIRE)
+        self._takeover = self._redis.register_script(self._TAKEOVER)
+        self._renew = self._redis.register_script(self._RENEW)
+        self._complete = self._redis.register_script(self._COMPLETE)
+        self._release = self._redis.register_script(self._RELEASE)
+
+    def _keys(self, mention_id: str):
+        p = self.prefix
+        return (f"{p}:lease:{mention_id}", f"{p}:done:{mention_id}",
+                f"{p}:leases:expiry", f"{p}:mention:{mention_id}")
+
+    def acquire(self, payloads: Dict[str, Dict], owner: str, ttl: float) -> List[str]:
+        granted = []
+        for mention_id, payload in payloads.items():
+            if self._acquire(keys=list(self._keys(mention_id)),
+                             args=[owner, int(ttl * 1000), time.time() + ttl, mention_id,
+                                   json.dumps(payload, default=str), DONE_RETENTION]):
+                granted.append(mention_id)
+        return granted
+
+    def renew(self, mention_id: str, owner: str, ttl: float) -> bool:
+        lease, done, expiry, _ = self._keys(mention_id)
+        return bool(self._renew(keys=[lease, done, expiry],
+                                args=[owner, int(ttl * 1000), time.time() + ttl, mention_id]))
+
+    def complete(self, mention_id: str, owner: str) -> bool:
+        lease, done, expiry, mention = self._keys(mention_id)
+        return bool(self._complete(keys=[lease, done, expiry, mention],
+                                   args=[owner, DONE_RETENTION, mention_id]))
+
+    def release(self, mention_id: str, owner: str):
+        lease, _, _, _ = self._keys(mention_id)
+        self._release(keys=[lease], args=[owner])
+
+    def reclaim(self, owner: str, ttl: float, limit: int = 100) -> List[Dict]:
+        _, _, expiry, _ = self._keys('')
+        taken = []
+        for raw_id in self._redis.zrangebyscore(expiry, '-inf', time.time(), start=0, num=limit):
+            mention_id = raw_id.decode()
+            payload = self._takeover(keys=list(self._keys(mention_id)),
+                                     args=[owner, int(ttl * 1000), time.time() + ttl, mention_id])
+            if payload:
+                taken.append(json.loads(payload))
+        return taken
+
+    def stats(self) -> Dict:
+        _, _, expiry, _ = self._keys('')
+        now = time.time()
+        return {
+            'live': self._redis.zcount(expiry, now, '+inf'),
+            'expired': self._redis.zcount(expiry, '-inf', now),
+        }
+
+    def close(self):
+        self._redis.close()
+
+
+def open_lease_store(url: str):
+    """redis://... for Redis, anything else is a SQLite path (sqlite:/// prefix optional)"""
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisLeaseStore(url)
+    if url.startswith('sqlite:///'):
+        url = url[len('sqlite:///'):]
+    return SQLiteLeaseStore(url)
+
+
+class MentionLeases:
+    """A worker's view of the shared lease store"""
+
+    def __init__(self, store, owner: Optional[str] = None, ttl: float = 60):
+        self.store = store
+        self.owner = owner or default_owner()
+        self.ttl = ttl
+        self.taken_over = 0
+        self.lost = 0
+
+    def claim(self, mentions: List[Dict]) -> List[Dict]:
+        """The mentions this worker won; the others belong to other workers"""
+        if not mentions:
+            return []
+        granted = set(self.store.acquire({m['id']: m for m in mentions}, self.owner, self.ttl))
+        return [m for m in mentions if m['id'] in granted]
+
+    def reclaim(self) -> List[Dict]:
+        """Mentions left behind by workers whose leases expired"""
+        mentions = self.store.reclaim(self.owner, self.ttl)
+        for mention in mentions:
+            if mention.get('created_at'):
+                mention['created_at'] = datetime.fromisoformat(mention['created_at'])
+            # The previous owner may have replied before it died
+            mention['reclaimed'] = True
+        if mentions:
+            logger.info(f"Took over {len(mentions)} mentions from workers whose leases expired")
+        self.taken_over += len(mentions)
+        return mentions
+
+    def hold(self, mention_id: str, extra: float = 0.0) -> bool:
+        """
+        Renew the lease right before acting on the mention, for extra
+        seconds on top of the ttl when the action may have to wait
+        """
+        held = self.store.renew(mention_id, self.owner, self.ttl + extra)
+        if not held:
+            self.lost += 1
+        return held
+
+    def done(self, mention_id: str):
+        self.store.complete(mention_id, self.owner)
+
+    def stats(self) -> Dict:
+        stats = self.store.stats()
+        stats.update(owner=self.owner, taken_over=self.taken_over, lost=self.lost)
+        return stats
@@ -0,0 +1,222 @@
+# bot/mention_store.py
+import logging
+import math
+import os
+import struct
+import threading
+import time
+from typing import Dict, Optional, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# One log record per processed mention: tweet id, time it was processed
+_RECORD = struct.Struct('<qd')
+_RECORD_DTYPE = np.dtype([('id', '<i8'), ('at', '<f8')])
+_MASK = (1 << 64) - 1
+# Added ids kept in a set, and checked exactly, before merging into the sorted array
+_TAIL = 4096
+
+
+def _mix(x: int) -> int:
+    """splitmix64 finalizer on a Python int"""
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK
+    return x ^ (x >> 31)
+
+
+def _mix_array(x: np.ndarray) -> np.ndarray:
+    """_mix over a uint64 array"""
+    with np.errstate(over='ignore'):
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return x ^ (x >> np.uint64(31))
+
+
+class ProcessedMentionStore:
+    """
+    Set of mention ids the bot has already answered, kept for a time window
+
+    Ids are appended to a log file of fixed-size records, so the store
+    survives restarts and loads with a single read. In memory, ids live in a
+    sorted int64 array (plus a small set of recent additions) fronted by a
+    Bloom filter: most lookups are for new mentions and are answered by the
+    filter alone, and a filter hit is confirmed exactly, so there are no
+    false positives.
+
+    Ids processed longer ago than window_days are evicted and the log is
+    compacted. Recent search only returns the last 7 days of tweets, so
+    older mentions cannot come back. The store is safe to share between
+    threads.
+    """
+
+    def __init__(self, path: Optional[str] = None, window_days: float = 7,
+                 capacity: int = 100000, false_positive_rate: float = 0.001,
+                 evict_interval: float = 3600):
+        self.path = path
+        self.window = window_days * 86400
+        self.false_positive_rate = false_positive_rate
+        self.evict_interval = evict_interval
+
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._times = np.zeros(0, dtype=np.float64)
+        self._recent: Dict[int, float] = {}
+        self.bloom_hits = 0
+        self.bloom_false_positives = 0
+        # Reentrant: add() checks membership and may evict under it
+        self._lock = threading.RLock()
+
+        if path and os.path.exists(path):
+            self._load()
+        self._resize_bloom(max(capacity, 2 * len(self._ids)))
+        self._last_evict = time.time()
+        self.evict()
+
+        self._log = open(path, 'ab') if path else None
+
+    # Bloom filter
+
+    def _resize_bloom(self, capacity: int):
+        """Size the filter for capacity ids at the target false positive rate and refill it"""
+        self._capacity = capacity
+        bits = math.ceil(-capacity * math.log(self.false_positive_rate) / math.log(2) ** 2)
+        self._bloom_bits = max(64, bits)
+        self._hash_count = max(1, round(self._bloom_bits / capacity * math.log(2)))
+
+        bloom = np.zeros((self._bloom_bits + 7) // 8, dtype=np.uint8)
+        ids = np.concatenate((self._ids, np.fromiter(self._recent, dtype=np.int64, count=len(self._recent))))
+        if len(ids):
+            h = _mix_array(ids.view(np.uint64))
+            h1 = h & np.uint64(0xFFFFFFFF)
+            h2 = (h >> np.uint64(32)) | np.uint64(1)
+            for i in range(self._hash_count):
+                with np.errstate(over='ignore'):
+                    positions = (h1 + np.uint64(i) * h2) % np.uint64(self._bloom_bits)
+                np.bitwise_or.at(bloom, (positions >> np.uint64(3)).astype(np.int64),
+                                 np.left_shift(np.uint8(1), (positions & np.uint64(7)).astype(np.uint8)))
+        self._bloom = bytearray(bloom.tobytes())
+
+    def _positions(self, tweet_id: int):
+        h = _mix(tweet_id & _MASK)
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        return [(h1 + i * h2) % self._bloom_bits for i in range(self._hash_count)]
+
+    def _bloom_add(self, tweet_id: int):
+        bloom = self._bloom
+        for pos in self._positions(tweet_id):
+            bloom[pos >> 3] |= 1 << (pos & 7)
+
+    def _bloom_contains(self, tweet_id: int) -> bool:
+        bloom = self._bloom
+        return all(bloom[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(tweet_id))
+
+    # Membership
+
+    def __contains__(self, tweet_id: Union[int, str]) -> bool:
+        tweet_id = int(tweet_id)
+        with self._lock:
+            if not self._bloom_contains(tweet_id):
+                return False
+            self.bloom_hits += 1
+            if tweet_id in self._recent:
+                return True
+            i = np.searchsorted(self._ids, tweet_id)
+            if i < len(self._ids) and self._ids[i] == tweet_id:
+                return True
+            self.bloom_false_positives += 1
+            return False
+
+    def add(self, tweet_id: Union[int, str], at: Optional[float] = None):
+        """Record a mention as processed"""
+        tweet_id = int(tweet_id)
+        with self._lock:
+            if tweet_id in self:
+                return
+            at = time.time() if at is None else at
+            if self._log is not None:
+                # Flushed per record, so a crash right after replying is still recorded
+                self._log.write(_RECORD.pack(tweet_id, at))
+                self._log.flush()
+
+            self._recent[tweet_id] = at
+            self._bloom_add(tweet_id)
+            if len(self._recent) > _TAIL:
+                self._merge_recent()
+            if len(self) > self._capacity:
+                self._resize_bloom(2 * self._capacity)
+            if at - self._last_evict > self.evict_interval:
+                self.evict()
+
+    def __len__(self) -> int:
+        return len(self._ids) + len(self._recent)
+
+    def _merge_recent(self):
+        ids = np.fromiter(self._recent.keys(), dtype=np.int64, count=len(self._recent))
+        times = np.fromiter(self._recent.values(), dtype=np.float64, count=len(self._recent))
+        self._set_arrays(np.concatenate((self._ids, ids)), np.concatenate((self._times, times)))
+        self._recent = {}
+
+    def _set_arrays(self, ids: np.ndarray, times: np.ndarray):
+        order = np.argsort(ids, kind='stable')
+        self._ids, self._times = ids[order], times[order]
+
+    # Persistence and eviction
+
+    def _load(self):
+        size = os.path.getsize(self.path)
+        torn = size % _RECORD.size
+        if torn:
+            # A record cut short by a crash mid-write
+            logger.warning(f"Dropping a partial record at the end of {self.path}")
+            with open(self.path, 'r+b') as f:
+                f.truncate(size - torn)
+        records = np.fromfile(self.path, dtype=_RECORD_DTYPE)
+        ids, first = np.unique(records['id'], return_index=True)
+        self._ids, self._times = ids, records['at'][first]
+        logger.info(f"Loaded {len(ids)} processed mentions from {self.path}")
+
+    def evict(self, now: Optional[float] = None) -> int:
+        """Forget mentions processed more than the window ago; returns how many"""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._last_evict = now
+            self._merge_recent()
+            keep = self._times >= now - self.window
+            evicted = len(keep) - int(keep.sum())
+            if not evicted:
+                return 0
+
+            self._ids, self._times = self._ids[keep], self._times[keep]
+            self._resize_bloom(self._capacity)
+            if self.path:
+                self._compact()
+            logger.info(f"Evicted {evicted} processed mentions older than the window")
+            return evicted
+
+    def _compact(self):
+        """Rewrite the log with only the live records, replacing it atomically"""
+        records = np.empty(len(self._ids), dtype=_RECORD_DTYPE)
+        records['id'], records['at'] = self._ids, self._times
+        tmp_path = f"{self.path}.tmp"
+        records.tofile(tmp_path)
+        reopen = getattr(self, '_log', None) is not None
+        if reopen:
+            self._log.close()
+        os.replace(tmp_path, self.path)
+        if reopen:
+            self._log = open(self.path, 'ab')
+
+    def stats(self) -> Dict:
+        return {
+            'mentions': len(self),
+            'bloom_hits': self.bloom_hits,
+            'bloom_false_positives': self.bloom_false_positives,
+            'kilobytes': (self._ids.nbytes + self._times.nbytes + len(self._bloom)) / 1e3,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
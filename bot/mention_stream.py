@@ -0,0 +1,137 @@
+# bot/mention_stream.py
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import tweepy
+
+from bot.rate_limiter import redirect_session
+
+logger = logging.getLogger(__name__)
+
+# Tag of the stream rule this bot owns, so other rules on the app are left alone
+RULE_TAG = 'factbot-mentions'
+
+
+class MentionStream(tweepy.StreamingClient):
+    """
+    Mentions of the bot from the v2 filtered stream, as they are posted
+
+    tweepy's stream reconnects on its own, with the backoff the API asks
+    for: linear up to 16s after network errors, exponential from 5s (60s
+    for 429s) up to 320s after HTTP errors. The API sends a keep-alive
+    every 20 seconds, so a read that times out after 21 counts as a stall
+    and reconnects. 'connected' is only set while the stream is up; the
+    bot polls search whenever it is not, and once after every (re)connect
+    to pick up what was posted in between.
+    """
+
+    def __init__(self, bearer_token: str, username: str, on_mentions: Callable[[tweepy.Response], None],
+                 api_host: Optional[str] = None, **kwargs):
+        # chunk_size=None hands over each chunk as it arrives; with a fixed
+        # size, the end of a tweet would wait for the next keep-alive
+        kwargs.setdefault('chunk_size', None)
+        kwargs.setdefault('daemon', True)
+        super().__init__(bearer_token, **kwargs)
+        if api_host:
+            redirect_session(self.session, api_host)
+        self.username = username
+        self.on_mentions = on_mentions
+        self.connected = threading.Event()
+        self.connects = 0
+        self.errors = 0
+        self.keepalives = 0
+        self.tweets = 0
+        self.last_data: Optional[float] = None
+        self._catch_up = threading.Event()
+
+    @property
+    def rule(self) -> str:
+        return f"@{self.username} -is:retweet -from:{self.username}"
+
+    def sync_rules(self):
+        """Make our tagged rule the one for this bot's mentions, replacing outdated ones"""
+        current = self.get_rules().data or []
+        ours = [rule for rule in current if rule.tag == RULE_TAG]
+        stale = [rule.id for rule in ours if rule.value != self.rule]
+        if stale:
+            self.delete_rules(stale)
+        if len(stale) == len(ours):
+            self.add_rules(tweepy.StreamRule(self.rule, tag=RULE_TAG))
+            logger.info(f"Added stream rule: {self.rule}")
+
+    def start(self):
+        """Sync the rule and connect in a background thread"""
+        self.sync_rules()
+        return self.filter(
+            threaded=True,
+            tweet_fields=['created_at', 'author_id', 'conversation_id'],
+            expansions=['author_id', 'referenced_tweets.id'],
+            user_fields=['username'],
+        )
+
+    def stop(self):
+        self.disconnect()
+        self.connected.clear()
+
+    def needs_catch_up(self) -> bool:
+        """True once after each (re)connect"""
+        if self._catch_up.is_set():
+            self._catch_up.clear()
+            return True
+        return False
+
+    # tweepy.StreamingClient callbacks, run on the stream's thread
+
+    def on_connect(self):
+        self.connects += 1
+        self.last_data = time.time()
+        self.connected.set()
+        self._catch_up.set()
+        logger.info("Connected to the mention stream")
+
+    def on_keep_alive(self):
+        self.keepalives += 1
+        self.last_data = time.time()
+
+    def on_response(self, response):
+        self.last_data = time.time()
+        if response.data is None:
+            return
+        self.tweets += 1
+        try:
+            self.on_mentions(tweepy.Response([response.data], response.includes, response.errors, {}))
+        except Exception as e:
+            logger.error(f"Error handling streamed mention {response.data.id}: {e}")
+
+    def on_connection_error(self):
+        self.errors += 1
+        self.connected.clear()
+
+    def on_request_error(self, status_code):
+        self.errors += 1
+        self.connected.clear()
+        logger.error(f"Mention stream returned HTTP {status_code}")
+        if status_code in (401, 403):
+            # Not retried: the app has no stream access, so the bot keeps polling
+            logger.error("No access to the filtered stream; staying with search polling")
+            self.disconnect()
+
+    def on_closed(self, response):
+        self.connected.clear()
+        logger.warning("Mention stream closed by the server, reconnecting")
+
+    def on_disconnect(self):
+        self.connected.clear()
+        logger.info("Disconnected from the mention stream")
+
+    def stats(self) -> Dict:
+        return {
+            'connected': self.connected.is_set(),
+            'connects': self.connects,
+            'errors': self.errors,
+            'keepalives': self.keepalives,
+            'tweets': self.tweets,
+            'idle_seconds': round(time.time() - self.last_data, 1) if self.last_data else None,
+        }
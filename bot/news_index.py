@@ -0,0 +1,553 @@
+# bot/news_index.py
+import json
+import logging
+import math
+import mmap
+import os
+import re
+import struct
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+# Same vocabulary clean_text leaves behind: lowercase words of 3+ letters
+_TOKEN = re.compile(r'[a-z]{3,}')
+
+# Segment file layout, all little-endian and 8-byte aligned:
+#   header        magic, version, doc count, term count, posting count, total length
+#   term offsets  term count + 1 uint64 offsets into the term blob
+#   post offsets  term count + 1 uint64 offsets into the postings
+#   doc ids       uint32 per posting, ascending within a term
+#   tfs           uint16 per posting
+#   doc lengths   uint32 per document
+#   meta offsets  doc count + 1 uint64 offsets into the metadata blob
+#   terms         sorted terms, concatenated
+#   metadata      one JSON object per document, concatenated
+_MAGIC = b'BM25'
+_VERSION = 1
+_HEADER = struct.Struct('<4sIQQQQ')
+_MANIFEST = 'segments.json'
+_LOCK = 'segments.lock'
+
+
+def _pad8(n: int) -> int:
+    return (n + 7) & ~7
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+
+def _serialize(terms: List[bytes], postings: List[tuple], doc_lengths: np.ndarray,
+               metadata: List[bytes]) -> bytes:
+    """postings[i] is a (doc ids, tfs) pair of arrays for terms[i]"""
+    doc_count = len(doc_lengths)
+    counts = np.fromiter((len(docs) for docs, _ in postings), dtype=np.uint64, count=len(terms))
+    post_offsets = np.concatenate(([0], np.cumsum(counts))).astype('<u8')
+    term_offsets = np.concatenate(
+        ([0], np.cumsum([len(t) for t in terms], dtype=np.uint64))).astype('<u8')
+    meta_offsets = np.concatenate(
+        ([0], np.cumsum([len(m) for m in metadata], dtype=np.uint64))).astype('<u8')
+    posting_count = int(post_offsets[-1])
+
+    if postings:
+        doc_ids = np.concatenate([docs for docs, _ in postings]).astype('<u4')
+        tfs = np.concatenate([tf for _, tf in postings]).astype('<u2')
+    else:
+        doc_ids = np.zeros(0, dtype='<u4')
+        tfs = np.zeros(0, dtype='<u2')
+
+    def padded(array: np.ndarray) -> bytes:
+        data = array.tobytes()
+        return data + bytes(_pad8(len(data)) - len(data))
+
+    term_blob = b''.join(terms)
+    return b''.join([
+        _HEADER.pack(_MAGIC, _VERSION, doc_count, len(terms), posting_count,
+                     int(doc_lengths.sum(dtype=np.uint64))),
+        term_offsets.tobytes(),
+        post_offsets.tobytes(),
+        padded(doc_ids),
+        padded(tfs),
+        padded(doc_lengths.astype('<u4')),
+        meta_offsets.tobytes(),
+        term_blob + bytes(_pad8(len(term_blob)) - len(term_blob)),
+        b''.join(metadata),
+    ])
+
+
+class _Segment:
+    """One immutable, memory-mapped segment file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._buffer)
+        magic, version, docs, terms, postings, total_length = _HEADER.unpack_from(view, 0)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"Not a news index segment: {path}")
+
+        def array(dtype, count):
+            nonlocal pos
+            result = np.frombuffer(self._buffer, dtype=dtype, count=count, offset=pos)
+            pos += _pad8(result.nbytes)
+            return result
+
+        pos = _HEADER.size
+        self.term_offsets = array('<u8', terms + 1)
+        self.post_offsets = array('<u8', terms + 1)
+        self.doc_ids = array('<u4', postings)
+        self.tfs = array('<u2', postings)
+        self.doc_lengths = array('<u4', docs)
+        self.meta_offsets = array('<u8', docs + 1)
+        self._terms = view[pos:pos + int(self.term_offsets[-1])]
+        pos += _pad8(int(self.term_offsets[-1]))
+        self._metadata = view[pos:]
+
+        self.doc_count = docs
+        self.term_count = terms
+        self.total_length = total_length
+
+    def term(self, i: int) -> bytes:
+        return self._terms[self.term_offsets[i]:self.term_offsets[i + 1]].tobytes()
+
+    def find(self, term: bytes) -> int:
+        """Binary search for term; returns its index or -1"""
+        lo, hi = 0, self.term_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            probe = self.term(mid)
+            if probe < term:
+                lo = mid + 1
+            elif probe > term:
+                hi = mid
+            else:
+                return mid
+        return -1
+
+    def postings(self, i: int):
+        start, end = self.post_offsets[i], self.post_offsets[i + 1]
+        return self.doc_ids[start:end], self.tfs[start:end]
+
+    def metadata(self, doc: int) -> Dict:
+        start, end = self.meta_offsets[doc], self.meta_offsets[doc + 1]
+        return json.loads(self._metadata[start:end].tobytes())
+
+    def close(self):
+        self._terms.release()
+        self._metadata.release()
+        self.term_offsets = self.post_offsets = self.doc_ids = None
+        self.tfs = self.doc_lengths = self.meta_offsets = None
+        try:
+            self._buffer.close()
+        except BufferError:
+            # Arrays handed out by postings() still reference the map; it is
+            # unmapped once they are gone
+            pass
+
+
+class NewsIndex:
+    """
+    BM25 inverted index over cleaned news article text
+
+    Articles are buffered by add() and written by flush() as an immutable
+    segment file holding sorted terms and uint32/uint16 postings. Segments are
+    memory-mapped, so opening the index costs nothing however large it is, and
+    a query only touches the postings of its own terms. A segments.json
+    manifest lists the live segments. Once there are more than max_segments,
+    they are merged into one. Writers in several processes update the
+    manifest under a lock file; readers in other processes pick up new
+    segments with refresh().
+    """
+
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75, max_segments: int = 8):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.max_segments = max_segments
+        self.segments: List[_Segment] = []
+        self._manifest_version = None
+        # Segments dropped by the last refresh, closed at the next one so
+        # that searches still running on them can finish
+        self._retired: List[_Segment] = []
+        # Names of the segments flushed inside rebuilding()
+        self._staged: Optional[List[str]] = None
+
+        self._pending: Dict[str, List[tuple]] = defaultdict(list)
+        self._pending_lengths: List[int] = []
+        self._pending_metadata: List[bytes] = []
+
+        self.queries = 0
+        self.query_seconds = 0.0
+
+        self.refresh()
+
+    # Writing
+
+    def add(self, doc_id: str, text: str, **metadata):
+        """Buffer one article; it becomes searchable after flush()"""
+        counts: Dict[str, int] = defaultdict(int)
+        for token in tokenize(text):
+            counts[token] += 1
+        if not counts:
+            return
+
+        doc = len(self._pending_lengths)
+        for token, tf in counts.items():
+            self._pending[token].append((doc, min(tf, 0xFFFF)))
+        self._pending_lengths.append(sum(counts.values()))
+        self._pending_metadata.append(
+            json.dumps({'id': doc_id, **metadata}, ensure_ascii=False).encode('utf-8'))
+
+    def add_many(self, docs: Iterable[Dict]):
+        for doc in docs:
+            doc = dict(doc)
+            self.add(doc.pop('id'), doc.pop('text'), **doc)
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending_lengths)
+
+    def flush(self) -> int:
+        """Write buffered articles as a new segment; returns how many were written"""
+        count = self.pending
+        if not count:
+            return 0
+
+        terms = sorted(self._pending)
+        postings = []
+        for term in terms:
+            pairs = np.array(self._pending[term], dtype=np.uint32)
+            postings.append((pairs[:, 0], pairs[:, 1]))
+        data = _serialize([t.encode('utf-8') for t in terms], postings,
+                          np.array(self._pending_lengths, dtype=np.uint32),
+                          self._pending_metadata)
+
+        name = self._write_segment(data)
+        self._pending.clear()
+        self._pending_lengths = []
+        self._pending_metadata = []
+        logger.info(f"Indexed {count} articles into {name}")
+
+        if self._staged is not None:
+            self._staged.append(name)
+            return count
+        with self._locked():
+            self.refresh(force=True)
+            names = [os.path.basename(s.path) for s in self.segments] + [name]
+            self._write_manifest(names)
+
+        if len(names) > self.max_segments:
+            self.merge()
+        return count
+
+    @contextmanager
+    def rebuilding(self):
+        """
+        Index from scratch: the segments flushed inside the block replace
+        every live segment in one manifest write when it exits, so readers
+        see the old index until then and never a mix of both
+        """
+        self._staged = []
+        try:
+            yield self
+            self.flush()
+            with self._locked():
+                self.refresh(force=True)
+                old = [os.path.basename(s.path) for s in self.segments]
+                self._write_manifest(self._staged, drop=old)
+        except BaseException:
+            for name in self._staged:
+                self._remove(name)
+            raise
+        finally:
+            self._staged = None
+
+        if len(self.segments) > self.max_segments:
+            self.merge()
+
+    def merge(self):
+        """Merge every segment into one"""
+        self.refresh()
+        if len(self.segments) < 2:
+            return
+        start = time.perf_counter()
+        merged = [os.path.basename(s.path) for s in self.segments]
+
+        # Every segment's terms, with the union's sort order as a shared term id
+        seg_terms = [np.array([s.term(i) for i in range(s.term_count)], dtype=object)
+                     for s in self.segments]
+        union = np.unique(np.concatenate(seg_terms)) if seg_terms else np.zeros(0, dtype=object)
+
+        term_ids, doc_ids, tfs = [], [], []
+        doc_base = 0
+        for segment, terms in zip(self.segments, seg_terms):
+            ids = np.searchsorted(union, terms)
+            counts = np.diff(segment.post_offsets.astype(np.int64))
+            term_ids.append(np.repeat(ids, counts))
+            doc_ids.append(segment.doc_ids.astype(np.uint32) + doc_base)
+            tfs.append(segment.tfs)
+            doc_base += segment.doc_count
+
+        term_ids = np.concatenate(term_ids)
+        doc_ids = np.concatenate(doc_ids)
+        tfs = np.concatenate(tfs)
+        # Segments are already in doc order, so a stable sort on term keeps
+        # each term's postings ascending
+        order = np.argsort(term_ids, kind='stable')
+        doc_ids, tfs = doc_ids[order], tfs[order]
+        bounds = np.concatenate(([0], np.cumsum(np.bincount(term_ids, minlength=len(union)))))
+        postings = [(doc_ids[bounds[i]:bounds[i + 1]], tfs[bounds[i]:bounds[i + 1]])
+                    for i in range(len(union))]
+
+        doc_lengths = np.concatenate([s.doc_lengths for s in self.segments])
+        metadata = [s._metadata[s.meta_offsets[d]:s.meta_offsets[d + 1]].tobytes()
+                    for s in self.segments for d in range(s.doc_count)]
+
+        name = self._write_segment(_serialize(list(union), postings, doc_lengths, metadata))
+        with self._locked():
+            self.refresh(force=True)
+            names = [os.path.basename(s.path) for s in self.segments]
+            if not set(merged) <= set(names):
+                # Another writer merged these segments meanwhile
+                self._remove(name)
+                return
+            self._write_manifest([name] + [n for n in names if n not in merged], drop=merged)
+        logger.info(f"Merged {len(merged)} news index segments in "
+                    f"{time.perf_counter() - start:.1f}s")
+
+    def _write_segment(self, data: bytes) -> str:
+        os.makedirs(self.path, exist_ok=True)
+        name = f"seg-{time.time_ns():x}.bm25"
+        tmp_path = os.path.join(self.path, f"{name}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, os.path.join(self.path, name))
+        return name
+
+    @contextmanager
+    def _locked(self):
+        """Hold the index's lock file, so writers update the manifest one at a time"""
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, _LOCK), 'a+b') as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                while True:
+                    try:
+                        # LK_LOCK gives up after 10 seconds; keep waiting
+                        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        continue
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _remove(self, name: str) -> bool:
+        try:
+            os.remove(os.path.join(self.path, name))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            # Windows won't delete a file another process still has mapped
+            logger.debug(f"Could not remove {name} yet: {e}")
+            return False
+        return True
+
+    def _write_manifest(self, names: List[str], drop: Iterable[str] = ()):
+        """
+        Replace the manifest with names and delete the dropped segment files;
+        the caller holds the lock and has refreshed. Files still in use
+        elsewhere stay listed as retired and are retried by the next write.
+        """
+        retired = self._read_manifest().get('retired', []) + [n for n in drop if n not in names]
+        manifest_path = os.path.join(self.path, _MANIFEST)
+        tmp_path = f"{manifest_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'segments': names, 'retired': retired}, f)
+        os.replace(tmp_path, manifest_path)
+
+        # Close this process's maps of the dropped segments before deleting them
+        self.refresh(force=True)
+        self._close_retired()
+        left = [name for name in retired if not self._remove(name)]
+        if left != retired:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'segments': names, 'retired': left}, f)
+            os.replace(tmp_path, manifest_path)
+            self.refresh(force=True)
+
+    # Reading
+
+    def _read_manifest(self) -> Dict:
+        try:
+            with open(os.path.join(self.path, _MANIFEST), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _close_retired(self):
+        for segment in self._retired:
+            segment.close()
+        self._retired = []
+
+    def refresh(self, force: bool = False) -> bool:
+        """Reopen the segment list if the manifest changed; returns True if it did"""
+        manifest_path = os.path.join(self.path, _MANIFEST)
+        try:
+            stat = os.stat(manifest_path)
+        except FileNotFoundError:
+            return False
+        # Each write replaces the file, so the inode changes even when two
+        # writes land within the mtime's resolution
+        version = (stat.st_mtime_ns, stat.st_ino)
+        if version == self._manifest_version and not force:
+            return False
+
+        self._close_retired()
+        names = self._read_manifest().get('segments', [])
+        current = {os.path.basename(s.path): s for s in self.segments}
+        self.segments = [current.pop(name, None) or _Segment(os.path.join(self.path, name))
+                         for name in names]
+        self._retired = list(current.values())
+        self._manifest_version = version
+        return True
+
+    def __len__(self) -> int:
+        return sum(s.doc_count for s in self.segments)
+
+    def search(self, text: str, k: int = 5) -> List[Dict]:
+        """Top-k articles for text by BM25, as their metadata plus a 'score'"""
+        start = time.perf_counter()
+        try:
+            return self._search(text, k)
+        finally:
+            self.queries += 1
+            self.query_seconds += time.perf_counter() - start
+
+    def _search(self, text: str, k: int) -> List[Dict]:
+        # refresh() may swap the list meanwhile; keep scoring against this one
+        segments = self.segments
+        terms = {t.encode('utf-8') for t in tokenize(text)}
+        doc_count = sum(s.doc_count for s in segments)
+        if not terms or not doc_count or k <= 0:
+            return []
+        avg_length = sum(s.total_length for s in segments) / doc_count
+
+        # Locate each term in every segment; df is summed over segments
+        found = []
+        for term in terms:
+            hits = []
+            df = 0
+            for s, segment in enumerate(segments):
+                i = segment.find(term)
+                if i >= 0:
+                    hits.append((s, i))
+                    df += int(segment.post_offsets[i + 1] - segment.post_offsets[i])
+            if df:
+                found.append((math.log(1 + (doc_count - df + 0.5) / (df + 0.5)), hits))
+        if not found:
+            return []
+
+        k1, b = self.k1, self.b
+        bases = np.cumsum([0] + [s.doc_count for s in segments])
+
+        def term_scores(idf, s, doc_ids, tfs):
+            tf = tfs.astype(np.float64)
+            norm = k1 * (1 - b + b * segments[s].doc_lengths[doc_ids] / avg_length)
+            return idf * tf * (k1 + 1) / (tf + norm)
+
+        # MaxScore: rare terms are scored over their full postings first. Once
+        # the common terms left could not lift an unseen article past the
+        # current k-th score, they are only looked up for the candidates,
+        # by binary search in their doc-ordered postings.
+        found.sort(key=lambda item: -item[0])
+        remaining = [idf * (k1 + 1) for idf, _ in found]
+        remaining = np.cumsum(remaining[::-1])[::-1].tolist() + [0.0]
+
+        candidates = np.zeros(0, dtype=np.int64)
+        totals = np.zeros(0)
+        for j, (idf, hits) in enumerate(found):
+            if len(totals) >= k and remaining[j] < -np.partition(-totals, k - 1)[k - 1]:
+                break
+            docs, scores = [candidates], [totals]
+            for s, i in hits:
+                doc_ids, tfs = segments[s].postings(i)
+                scores.append(term_scores(idf, s, doc_ids, tfs))
+                docs.append(doc_ids.astype(np.int64) + bases[s])
+            # Each piece is already doc-ordered, which a stable sort exploits
+            docs = np.concatenate(docs)
+            order = np.argsort(docs, kind='stable')
+            docs = docs[order]
+            first = np.flatnonzero(np.concatenate(([True], docs[1:] != docs[:-1])))
+            candidates = docs[first]
+            totals = np.add.reduceat(np.concatenate(scores)[order], first)
+        else:
+            j = len(found)
+
+        # Articles that cannot reach the k-th score even with every remaining
+        # term are dropped before each lookup
+        for j in range(j, len(found)):
+            kth = -np.partition(-totals, k - 1)[k - 1]
+            keep = totals + remaining[j] >= kth
+            candidates, totals = candidates[keep], totals[keep]
+            segment_of = np.searchsorted(bases, candidates, side='right') - 1
+            idf, hits = found[j]
+            for s, i in hits:
+                doc_ids, tfs = segments[s].postings(i)
+                mine = np.flatnonzero(segment_of == s)
+                local = candidates[mine] - bases[s]
+                pos = np.searchsorted(doc_ids, local)
+                pos[pos == len(doc_ids)] = 0
+                match = doc_ids[pos] == local
+                pos = pos[match]
+                totals[mine[match]] += term_scores(idf, s, doc_ids[pos], tfs[pos])
+
+        if len(totals) > k:
+            top = np.argpartition(-totals, k - 1)[:k]
+        else:
+            top = np.arange(len(totals))
+        top = top[np.lexsort((candidates[top], -totals[top]))]
+
+        results = []
+        for t in top:
+            doc = int(candidates[t])
+            s = int(np.searchsorted(bases, doc, side='right')) - 1
+            result = segments[s].metadata(doc - int(bases[s]))
+            result['score'] = float(totals[t])
+            results.append(result)
+        return results
+
+    def stats(self) -> Dict:
+        return {
+            'articles': len(self),
+            'segments': len(self.segments),
+            'pending': self.pending,
+            'queries': self.queries,
+            'avg_query_ms': self.query_seconds / self.queries * 1000 if self.queries else 0.0,
+        }
+
+    def close(self):
+        self._close_retired()
+        for segment in self.segments:
+            segment.close()
+        self.segments = []
@@ -0,0 +1,124 @@
+# bot/pipeline.py
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class Stage:
+    """One step of a StagePipeline: a bounded input queue and its worker threads"""
+
+    def __init__(self, name: str, func: Callable, workers: int, queue_size: int):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self.next: Optional['Stage'] = None
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"{self.name}-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                self.queue.task_done()
+                return
+            start = time.perf_counter()
+            try:
+                result = self.func(item)
+            except Exception as e:
+                logger.error(f"{self.name} stage failed: {e}")
+                result = None
+                with self._lock:
+                    self.errors += 1
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.processed += 1
+                self.busy_seconds += elapsed
+                if result is None and self.next is not None:
+                    self.dropped += 1
+            if result is not None and self.next is not None:
+                # Blocks while the next stage is full, which holds this one back
+                self.next.queue.put(result)
+            self.queue.task_done()
+
+    def stop(self):
+        for _ in self._threads:
+            self.queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'queued': self.queue.qsize(),
+                'processed': self.processed,
+                'dropped': self.dropped,
+                'errors': self.errors,
+                'avg_ms': self.busy_seconds / self.processed * 1000 if self.processed else 0.0,
+            }
+
+
+class StagePipeline:
+    """
+    Stages connected by bounded queues, each with its own worker threads
+
+    Each stage's function takes an item and returns the item for the next
+    stage, or None to drop it. Since the stages run at the same time, the
+    throughput is that of the slowest stage rather than the sum of all of
+    them, and the bounded queues keep a slow stage from piling up work.
+    """
+
+    def __init__(self):
+        self.stages: List[Stage] = []
+        self._by_name: Dict[str, Stage] = {}
+
+    def add_stage(self, name: str, func: Callable, workers: int = 1,
+                  queue_size: int = 100) -> 'StagePipeline':
+        stage = Stage(name, func, max(1, workers), queue_size)
+        if self.stages:
+            self.stages[-1].next = stage
+        self.stages.append(stage)
+        self._by_name[name] = stage
+        return self
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+
+    def submit(self, item, stage: Optional[str] = None):
+        """Queue item at the first stage, or at the named one"""
+        target = self._by_name[stage] if stage else self.stages[0]
+        target.queue.put(item)
+
+    def join(self, until: Optional[str] = None):
+        """Wait until every item has passed through the stages up to until (default: all)"""
+        for stage in self.stages:
+            stage.queue.join()
+            if stage.name == until:
+                return
+
+    def stop(self):
+        """Finish the queued items and stop the workers, first stage first"""
+        for stage in self.stages:
+            stage.stop()
+
+    def stats(self) -> Dict:
+        return {stage.name: stage.stats() for stage in self.stages}
@@ -0,0 +1,309 @@
+# bot/rate_limiter.py
+import asyncio
+import logging
+import math
+import re
+import threading
+import time
+from typing import Dict, Optional
+
+import requests
+import tweepy
+
+from bot import metrics
+
+logger = logging.getLogger(__name__)
+
+# tweepy.asynchronous needs extra packages; see twitter_bot.ASYNC_AVAILABLE
+try:
+    from tweepy.asynchronous import AsyncClient
+except (ImportError, tweepy.errors.TweepyException):
+    AsyncClient = None
+
+# Ids in routes, but not the API version at the start
+_ID = re.compile(r'(?<=.)/\d+')
+# Length of a v2 rate limit window
+WINDOW = 900
+API_HOST = 'https://api.twitter.com'
+
+
+def endpoint_key(method: str, route: str) -> str:
+    """Rate limit bucket of a request: the method plus the route without ids"""
+    return f"{method.upper()} {_ID.sub('/:id', route)}"
+
+
+class TokenBucket:
+    """
+    Token bucket for one endpoint, kept in step with the API's own count
+
+    It starts unlimited. Every response reports the endpoint's limit, the
+    calls remaining and when the window resets, and the bucket adopts those
+    numbers: the remaining calls can be spent at once, and the bucket is
+    refilled to the limit at each reset. Tokens may go negative; each
+    reservation then waits for the reset that covers it.
+    """
+
+    def __init__(self, window: float = WINDOW):
+        self.window = window
+        self.limit: Optional[int] = None
+        self.tokens = 0.0
+        self.reset = 0.0
+        self.waits = 0
+
+    def _refill(self, now: float):
+        if now >= self.reset:
+            resets = 1 + int((now - self.reset) // self.window)
+            self.tokens = min(float(self.limit), self.tokens + resets * self.limit)
+            self.reset += resets * self.window
+
+    def delay(self, now: Optional[float] = None) -> float:
+        """Seconds until a call could be made, without reserving it"""
+        if self.limit is None:
+            return 0.0
+        now = time.time() if now is None else now
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        windows = math.ceil((1 - self.tokens) / self.limit)
+        return self.reset - now + (windows - 1) * self.window
+
+    def reserve(self, now: Optional[float] = None) -> float:
+        """Take a token; returns how long the caller must wait before using it"""
+        if self.limit is None:
+            return 0.0
+        now = time.time() if now is None else now
+        wait = self.delay(now)
+        self.tokens -= 1
+        if wait > 0:
+            self.waits += 1
+        return wait
+
+    def observe(self, limit: Optional[int], remaining: int, reset: Optional[float],
+                now: Optional[float] = None):
+        """Adopt the limit, remaining calls and reset time reported by the API"""
+        now = time.time() if now is None else now
+        if self.limit is None:
+            self.limit = limit or max(remaining, 1)
+            self.tokens = float(remaining)
+        else:
+            self.limit = limit or self.limit
+            self._refill(now)
+            # Calls reserved but not answered yet are already counted in tokens
+            self.tokens = min(self.tokens, float(remaining))
+        self.reset = reset if reset and reset > now else max(self.reset, now + self.window)
+
+
+class _EndpointMetrics:
+    """Metric children of one endpoint, so requests skip the label lookups"""
+
+    _cache: Dict[str, '_EndpointMetrics'] = {}
+
+    def __init__(self, key: str):
+        self.key = key
+        self.seconds = metrics.API_SECONDS.labels(key)
+        self.waits = metrics.RATE_LIMIT_WAITS.labels(key)
+        self.wait_seconds = metrics.RATE_LIMIT_WAIT_SECONDS.labels(key)
+
+    @classmethod
+    def get(cls, method: str, route: str) -> '_EndpointMetrics':
+        key = endpoint_key(method, route)
+        endpoint = cls._cache.get(key)
+        if endpoint is None:
+            endpoint = cls._cache[key] = cls(key)
+        return endpoint
+
+    def waited(self, seconds: float):
+        self.waits.inc()
+        self.wait_seconds.inc(seconds)
+
+    def error(self, status):
+        metrics.API_ERRORS.labels(self.key, status).inc()
+
+
+def _status(error: Exception) -> str:
+    response = getattr(error, 'response', None)
+    status = getattr(response, 'status_code', None) or getattr(response, 'status', None)
+    return str(status) if status else type(error).__name__
+
+
+class RateLimiter:
+    """Per-endpoint token buckets, so reads and writes are budgeted separately"""
+
+    def __init__(self, window: float = WINDOW):
+        self.window = window
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.limited = 0
+        self._lock = threading.Lock()
+
+    def _bucket(self, key: str) -> TokenBucket:
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(self.window)
+        return bucket
+
+    def delay(self, method: str, route: str) -> float:
+        with self._lock:
+            return self._bucket(endpoint_key(method, route)).delay()
+
+    def reserve(self, method: str, route: str) -> float:
+        with self._lock:
+            return self._bucket(endpoint_key(method, route)).reserve()
+
+    def observe(self, method: str, route: str, headers, status: int = 200):
+        """Feed a response's x-rate-limit-* headers to its endpoint's bucket"""
+        if status == 429:
+            self.limited += 1
+        remaining = headers.get('x-rate-limit-remaining')
+        if remaining is None:
+            return
+        limit = headers.get('x-rate-limit-limit')
+        reset = headers.get('x-rate-limit-reset')
+        remaining = 0 if status == 429 else int(remaining)
+        with self._lock:
+            self._bucket(endpoint_key(method, route)).observe(
+                int(limit) if limit else None, remaining, float(reset) if reset else None
+            )
+
+    def stats(self) -> Dict:
+        now = time.time()
+        with self._lock:
+            return {
+                'limited': self.limited,
+                'endpoints': {
+                    key: {'limit': bucket.limit, 'tokens': round(bucket.tokens, 1),
+                          'delay': round(bucket.delay(now), 1), 'waits': bucket.waits}
+                    for key, bucket in self.buckets.items() if bucket.limit is not None
+                },
+            }
+
+
+class _HostAdapter(requests.adapters.HTTPAdapter):
+    """Sends requests meant for the Twitter API to another host"""
+
+    def __init__(self, host: str):
+        super().__init__()
+        self.host = host.rstrip('/')
+
+    def send(self, request, **kwargs):
+        request.url = self.host + request.url[len(API_HOST):]
+        return super().send(request, **kwargs)
+
+
+def redirect_session(session: requests.Session, host: str):
+    """Point a tweepy session at host instead of the Twitter API, e.g. a FakeTwitterServer"""
+    session.mount(API_HOST, _HostAdapter(host))
+
+
+class RateLimitedClient(tweepy.Client):
+    """
+    tweepy.Client that waits on its own endpoint's budget before each call
+
+    Unlike wait_on_rate_limit, a call only ever waits for the endpoint it
+    uses, and the budget is known before a 429 is hit.
+    """
+
+    def __init__(self, *args, limiter: RateLimiter, api_host: Optional[str] = None, **kwargs):
+        kwargs['wait_on_rate_limit'] = False
+        super().__init__(*args, **kwargs)
+        self.limiter = limiter
+        if api_host:
+            redirect_session(self.session, api_host)
+
+    def request(self, method, route, params=None, json=None, user_auth=False):
+        endpoint = _EndpointMetrics.get(method, route)
+        for attempt in range(2):
+            wait = self.limiter.reserve(method, route)
+            if wait > 0:
+                logger.info(f"Waiting {wait:.0f}s for the {endpoint.key} rate limit")
+                endpoint.waited(wait)
+                time.sleep(wait)
+            start = time.perf_counter()
+            try:
+                response = super().request(method, route, params, json, user_auth)
+            except tweepy.TooManyRequests as e:
+                # Out of step with the API: adopt its numbers and retry once
+                endpoint.error(429)
+                self.limiter.observe(method, route, e.response.headers, 429)
+                if attempt:
+                    raise
+                continue
+            except Exception as e:
+                endpoint.error(_status(e))
+                raise
+            finally:
+                endpoint.seconds.observe(time.perf_counter() - start)
+            self.limiter.observe(method, route, response.headers, response.status_code)
+            return response
+
+
+if AsyncClient is not None:
+    class AsyncRateLimitedClient(AsyncClient):
+        """AsyncClient counterpart of RateLimitedClient; waiting only suspends the caller"""
+
+        def __init__(self, *args, limiter: RateLimiter, api_host: Optional[str] = None, **kwargs):
+            kwargs['wait_on_rate_limit'] = False
+            super().__init__(*args, **kwargs)
+            self.limiter = limiter
+            self.api_host = api_host
+
+        async def _open_session(self):
+            # AsyncClient has no way to change its host but a session of our own
+            import aiohttp
+            from yarl import URL
+            host = self.api_host.rstrip('/')
+
+            class HostSession(aiohttp.ClientSession):
+                def _request(self, method, url, *args, **kwargs):
+                    url = str(url)
+                    if url.startswith(API_HOST):
+                        url = URL(host + url[len(API_HOST):], encoded=True)
+                    return super()._request(method, url, *args, **kwargs)
+
+            self.session = HostSession()
+
+        async def request(self, method, route, params=None, json=None, user_auth=False):
+            if self.api_host and self.session is None:
+                await self._open_session()
+            endpoint = _EndpointMetrics.get(method, route)
+            for attempt in range(2):
+                wait = self.limiter.reserve(method, route)
+                if wait > 0:
+                    logger.info(f"Waiting {wait:.0f}s for the {endpoint.key} rate limit")
+                    endpoint.waited(wait)
+                    await asyncio.sleep(wait)
+                start = time.perf_counter()
+                try:
+                    response = await super().request(method, route, params, json, user_auth)
+                except tweepy.TooManyRequests as e:
+                    endpoint.error(429)
+                    self.limiter.observe(method, route, e.response.headers, 429)
+                    if attempt:
+                        raise
+                    continue
+                except Exception as e:
+                    endpoint.error(_status(e))
+                    raise
+                finally:
+                    endpoint.seconds.observe(time.perf_counter() - start)
+                self.limiter.observe(method, route, response.headers, response.status)
+                return response
+
+
+class PollScheduler:
+    """
+    Adaptive polling interval: back to min_interval as soon as mentions
+    arrive, doubling towards max_interval while polls come back empty
+    """
+
+    def __init__(self, min_interval: float, max_interval: float, initial: Optional[float] = None):
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.interval = min(max(initial or min_interval, min_interval), self.max_interval)
+
+    def next_interval(self, mentions: int, search_delay: float = 0.0) -> float:
+        """Seconds to wait before the next poll, never sooner than the search budget allows"""
+        if mentions:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * 2, self.max_interval)
+        return max(self.interval, search_delay)
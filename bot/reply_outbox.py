@@ -0,0 +1,155 @@
+# bot/reply_outbox.py
+import logging
+import random
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+SENDING = 'sending'
+UNSURE = 'unsure'
+POSTED = 'posted'
+FAILED = 'failed'
+
+
+class ReplyOutbox:
+    """
+    Write-ahead log of replies to post, in SQLite
+
+    A reply is stored before any attempt to post it, keyed on the mention it
+    answers, so it survives a crash and is never queued twice. Posting
+    claims an entry (pending -> sending) and then marks it posted, or
+    failed with an exponential backoff before the next attempt. An entry
+    still 'sending' when the outbox is reopened may or may not have been
+    posted; it comes back as 'unsure' and the poster checks before retrying.
+    """
+
+    def __init__(self, path: str = ':memory:', max_attempts: int = 8,
+                 backoff: float = 5.0, max_backoff: float = 900.0):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS replies ('
+            'mention_id TEXT PRIMARY KEY, text TEXT NOT NULL, state TEXT NOT NULL, '
+            'attempts INTEGER NOT NULL DEFAULT 0, next_attempt_at REAL NOT NULL, '
+            'created_at REAL NOT NULL, mention_at REAL, posted_at REAL, reply_id TEXT, last_error TEXT)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS replies_due ON replies (state, next_attempt_at)')
+        recovered = self._db.execute(
+            'UPDATE replies SET state = ? WHERE state = ?', (UNSURE, SENDING)
+        ).rowcount
+        self._db.commit()
+        if recovered:
+            logger.warning(f"{recovered} replies were being posted when the bot stopped; "
+                           "they will be checked before any retry")
+
+    def enqueue(self, mention_id: str, text: str, mention_at: Optional[float] = None,
+                unsure: bool = False) -> bool:
+        """
+        Store a reply to post; returns False if mention_id already has one.
+        unsure is for mentions someone else may already have answered.
+        """
+        now = time.time()
+        with self._lock:
+            added = self._db.execute(
+                'INSERT OR IGNORE INTO replies '
+                '(mention_id, text, state, next_attempt_at, created_at, mention_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (mention_id, text, UNSURE if unsure else PENDING, now, now, mention_at)
+            ).rowcount
+            self._db.commit()
+        return bool(added)
+
+    def due(self, limit: int = 100) -> List[str]:
+        """Mention ids whose reply is ready for a (re)try"""
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT mention_id FROM replies WHERE state IN (?, ?) AND next_attempt_at <= ? '
+                'ORDER BY next_attempt_at LIMIT ?',
+                (PENDING, UNSURE, time.time(), limit)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def claim(self, mention_id: str) -> Optional[Dict]:
+        """
+        Take a due reply for posting, or None if it is not due or someone
+        else has it. The entry's 'unsure' is True if an earlier attempt may
+        have gone through.
+        """
+        with self._lock:
+            row = self._db.execute(
+                'SELECT text, state, attempts, mention_at FROM replies '
+                'WHERE mention_id = ? AND state IN (?, ?) AND next_attempt_at <= ?',
+                (mention_id, PENDING, UNSURE, time.time())
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute('UPDATE replies SET state = ? WHERE mention_id = ?', (SENDING, mention_id))
+            self._db.commit()
+        text, state, attempts, mention_at = row
+        return {'mention_id': mention_id, 'text': text, 'unsure': state == UNSURE,
+                'attempts': attempts, 'mention_at': mention_at}
+
+    def mark_posted(self, mention_id: str, reply_id: Optional[str] = None):
+        with self._lock:
+            self._db.execute(
+                'UPDATE replies SET state = ?, posted_at = ?, reply_id = ?, last_error = NULL '
+                'WHERE mention_id = ?',
+                (POSTED, time.time(), reply_id, mention_id)
+            )
+            self._db.commit()
+
+    def mark_failed(self, mention_id: str, error: str) -> float:
+        """Schedule a retry with backoff; returns the delay, or -1 once out of attempts"""
+        with self._lock:
+            row = self._db.execute(
+                'SELECT attempts FROM replies WHERE mention_id = ?', (mention_id,)
+            ).fetchone()
+            attempts = (row[0] if row else 0) + 1
+            if attempts >= self.max_attempts:
+                state, delay = FAILED, -1.0
+            else:
+                # Full jitter, so retries after an outage do not all land at once
+                state = PENDING
+                delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempts))
+            self._db.execute(
+                'UPDATE replies SET state = ?, attempts = ?, next_attempt_at = ?, last_error = ? '
+                'WHERE mention_id = ?',
+                (state, attempts, time.time() + max(delay, 0), error[:500], mention_id)
+            )
+            self._db.commit()
+        if delay < 0:
+            logger.error(f"Giving up on the reply to {mention_id} after {attempts} attempts: {error}")
+        return delay
+
+    def discard(self, mention_id: str):
+        """Drop a reply that is no longer ours to post"""
+        with self._lock:
+            self._db.execute('DELETE FROM replies WHERE mention_id = ? AND state != ?', (mention_id, POSTED))
+            self._db.commit()
+
+    def prune(self, older_than: float = 7 * 86400) -> int:
+        """Drop posted replies older than older_than seconds"""
+        with self._lock:
+            removed = self._db.execute(
+                'DELETE FROM replies WHERE state = ? AND posted_at < ?',
+                (POSTED, time.time() - older_than)
+            ).rowcount
+            self._db.commit()
+        return removed
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counts = dict(self._db.execute('SELECT state, COUNT(*) FROM replies GROUP BY state').fetchall())
+        return {state: counts.get(state, 0) for state in (PENDING, SENDING, UNSURE, POSTED, FAILED)}
+
+    def close(self):
+        self._db.close()
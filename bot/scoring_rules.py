@@ -0,0 +1,224 @@
+# bot/scoring_rules.py
+import logging
+import os
+import threading
+from collections import Counter
+from typing import Dict, Optional, Sequence
+
+import yaml
+
+from bot.domain_index import RELIABLE, SUSPICIOUS
+
+logger = logging.getLogger(__name__)
+
+# Flag kinds in the order FactChecker reports them
+FLAG_KINDS = ('suspicious_keyword', 'excessive_exclamation', 'excessive_caps', 'many_percentages')
+
+
+class ScoringRules:
+    """
+    Confidence scoring rules, compiled into lookup tables
+
+    A rules file is YAML; every section is optional and defaults to the
+    built-in scoring:
+
+        base: 0.5
+        flags:
+          default: -0.1          # per flag
+          excessive_caps: -0.15  # per-kind overrides
+        domains:
+          reliable: 0.2          # per linked domain
+          suspicious: -0.2
+        thresholds:
+          verified: 0.7          # confidence >= verified
+          disputed: 0.3          # confidence <= disputed
+
+    When every flag kind has the same weight, the flag adjustment is a single
+    multiplication, as in the original inline code. Every rule counts its
+    hits, and the time spent scoring is recorded.
+    """
+
+    def __init__(self, base: float = 0.5, flag_weight: float = -0.1,
+                 flag_weights: Optional[Dict[str, float]] = None,
+                 reliable: float = 0.2, suspicious: float = -0.2,
+                 verified: float = 0.7, disputed: Optional[float] = None,
+                 source: Optional[str] = None):
+        flag_weights = dict(flag_weights or {})
+        unknown = set(flag_weights) - set(FLAG_KINDS)
+        if unknown:
+            raise ValueError(f"Unknown flag kind(s) in scoring rules: {', '.join(sorted(unknown))}")
+        if disputed is None:
+            disputed = round(1 - verified, 6)
+
+        self.base = float(base)
+        self.verified_threshold = float(verified)
+        self.disputed_threshold = float(disputed)
+        self.source = source
+
+        # Decision tables
+        self.flag_weights = tuple(float(flag_weights.get(kind, flag_weight)) for kind in FLAG_KINDS)
+        self.domain_weights = {RELIABLE: float(reliable), SUSPICIOUS: float(suspicious)}
+
+        if len(set(self.flag_weights)) == 1:
+            self.uniform_flag_weight = self.flag_weights[0]
+            self.flag_adjustment = self._uniform_flag_adjustment
+        else:
+            self.uniform_flag_weight = None
+            self.flag_adjustment = self._table_flag_adjustment
+
+        # Every rule name is present up front, so counting is a plain dict update
+        self.hits: Dict[str, int] = dict.fromkeys(
+            FLAG_KINDS + (f"domain_{RELIABLE}", f"domain_{SUSPICIOUS}",
+                          'verified', 'disputed', 'unclear'), 0)
+        self.evaluations = 0
+        self.eval_seconds = 0.0
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict], source: Optional[str] = None,
+                  **defaults) -> 'ScoringRules':
+        """Compile rules from a parsed rules file; defaults fill missing thresholds"""
+        data = data or {}
+        unknown = set(data) - {'base', 'flags', 'domains', 'thresholds'}
+        if unknown:
+            raise ValueError(f"Unknown scoring rule section(s): {', '.join(sorted(unknown))}")
+
+        flags = dict(data.get('flags') or {})
+        domains = data.get('domains') or {}
+        thresholds = data.get('thresholds') or {}
+        kwargs = dict(defaults)
+        if 'base' in data:
+            kwargs['base'] = data['base']
+        if 'default' in flags:
+            kwargs['flag_weight'] = flags.pop('default')
+        kwargs['flag_weights'] = flags
+        for verdict in (RELIABLE, SUSPICIOUS):
+            if verdict in domains:
+                kwargs[verdict] = domains[verdict]
+        for name in ('verified', 'disputed'):
+            if name in thresholds:
+                kwargs[name] = thresholds[name]
+        return cls(source=source, **kwargs)
+
+    @classmethod
+    def load(cls, path: str, **defaults) -> 'ScoringRules':
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(yaml.safe_load(f), source=path, **defaults)
+
+    # Evaluation
+
+    def _uniform_flag_adjustment(self, flags: Sequence[str]) -> float:
+        hits = self.hits
+        for flag in flags:
+            # Only keyword flags carry a suffix ('suspicious_keyword: secret')
+            kind = flag if flag in hits else 'suspicious_keyword'
+            hits[kind] += 1
+        return len(flags) * self.uniform_flag_weight
+
+    def _table_flag_adjustment(self, flags: Sequence[str]) -> float:
+        hits = self.hits
+        counts = Counter(flag if flag in hits else 'suspicious_keyword' for flag in flags)
+        # Summed per kind in a fixed order, as the batch path does
+        adjustment = 0.0
+        for kind, weight in zip(FLAG_KINDS, self.flag_weights):
+            if counts[kind]:
+                hits[kind] += counts[kind]
+                adjustment += counts[kind] * weight
+        return adjustment
+
+    def domain_adjustment(self, verdict: Optional[str], count: bool = True) -> float:
+        """Adjustment for one linked domain with the given reputation"""
+        weight = self.domain_weights.get(verdict, 0)
+        if weight and count:
+            self.hits[f"domain_{verdict}"] += 1
+        return weight
+
+    def status(self, confidence: float) -> str:
+        if confidence >= self.verified_threshold:
+            status = 'verified'
+        elif confidence <= self.disputed_threshold:
+            status = 'disputed'
+        else:
+            status = 'unclear'
+        self.hits[status] += 1
+        return status
+
+    def count(self, rule: str, hits: int):
+        """Add hits counted elsewhere, e.g. over a whole batch"""
+        if hits:
+            self.hits[rule] = self.hits.get(rule, 0) + hits
+
+    def record(self, seconds: float, evaluations: int = 1):
+        self.evaluations += evaluations
+        self.eval_seconds += seconds
+
+    def stats(self) -> Dict:
+        return {
+            'source': self.source,
+            'hits': {rule: hits for rule, hits in self.hits.items() if hits},
+            'evaluations': self.evaluations,
+            'avg_eval_us': (self.eval_seconds / self.evaluations * 1e6
+                            if self.evaluations else 0.0),
+        }
+
+
+class RulesWatcher:
+    """
+    Polls a rules file and swaps newly compiled rules into a FactChecker
+
+    A file that fails to load or compile is logged and ignored, leaving the
+    current rules in place. Cached verdicts are dropped on every swap since
+    they were scored under the old rules.
+    """
+
+    def __init__(self, path: str, fact_checker, interval: float = 5.0, **defaults):
+        self.path = path
+        self.fact_checker = fact_checker
+        self.interval = interval
+        self.defaults = defaults
+        self.reloads = 0
+        self._mtime = self._current_mtime()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _current_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def check(self) -> bool:
+        """Reload the rules if the file changed; returns True if they were swapped"""
+        mtime = self._current_mtime()
+        if mtime is None or mtime == self._mtime:
+            return False
+        self._mtime = mtime
+
+        try:
+            rules = ScoringRules.load(self.path, **self.defaults)
+        except Exception as e:
+            logger.error(f"Keeping current scoring rules, {self.path} is invalid: {e}")
+            return False
+
+        # A single reference assignment: in-flight analyses finish with the
+        # rules they started with
+        self.fact_checker.rules = rules
+        if self.fact_checker.verdict_cache is not None:
+            self.fact_checker.verdict_cache.clear()
+        self.reloads += 1
+        logger.info(f"Reloaded scoring rules from {self.path}")
+        return True
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='rules-watcher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
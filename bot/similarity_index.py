@@ -0,0 +1,368 @@
+# bot/similarity_index.py
+import hashlib
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from bot.news_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint16)
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+# Texts hashed per chunk, which bounds the size of the bit matrices, and per
+# block of the weighting matrix product
+_CHUNK = 2048
+_BLOCK = 128
+# Inserts kept out of the band tables, and compared against every query,
+# before they become a run
+_TAIL = 4096
+# Default cap on stored items
+MAX_ITEMS = 1_000_000
+# Items kept beyond max_items before the oldest are evicted, as a fraction of
+# max_items; evicting rewrites the band tables, so it is done in bulk
+_EVICT_SLACK = 0.25
+
+
+def _token_hash(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def _mix(z: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer, a cheap bijective scramble of 64-bit values"""
+    with np.errstate(over='ignore'):
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+
+def _expand(hashes: np.ndarray, words: int) -> np.ndarray:
+    """Stretch 64-bit feature hashes to words * 64 pseudo-random bits"""
+    lanes = np.arange(1, words + 1, dtype=np.uint64) * _GOLDEN
+    with np.errstate(over='ignore'):
+        return _mix(hashes[:, None] + lanes[None, :])
+
+
+class SimilarityIndex:
+    """
+    Locality-sensitive hashing index for finding reworded claims
+
+    Each text becomes a SimHash signature: a random-projection sign sketch of
+    its hashed word and bigram counts, so the fraction of differing bits
+    estimates the angle between two texts. Signatures live in one uint64
+    array. Each band of band_bits bits has an array of items grouped by band
+    value, and a query only compares the items sharing at least one band with it.
+
+    With the defaults (25 bands of 10 bits) a text with cosine similarity 0.8
+    to a stored one finds it about 93% of the time, while unrelated items
+    collide in a band with probability 1/1024.
+
+    Inserts go to a small unsorted tail first and are turned into a run of
+    band tables in bulk. Runs are merged pairwise, log-structured, whenever
+    a run is at least half the size of the one before it, so each item is
+    merged O(log n) times and a query looks at O(log n) runs. Once there are
+    more than max_items items the oldest are evicted. Inserts, queries and
+    saves hold the index's lock, so analysis threads can share one index.
+    """
+
+    def __init__(self, bits: int = 256, band_bits: int = 10, max_items: Optional[int] = MAX_ITEMS):
+        if bits <= 0 or bits % 64 or not 1 <= band_bits <= min(bits, 20):
+            raise ValueError("bits must be a multiple of 64 and band_bits between 1 and 20")
+        self.bits = bits
+        self.band_bits = band_bits
+        self.words = bits // 64
+        # Leftover bits past the last whole band still count towards similarity
+        self.bands = bits // band_bits
+        self._band_weights = np.left_shift(np.uint32(1), np.arange(band_bits, dtype=np.uint32))
+        self.max_items = max_items
+
+        self._signatures = np.zeros((0, self.words), dtype=np.uint64)
+        self._keys = np.zeros(0, dtype=np.int64)
+        self._labels = np.zeros(0, dtype=np.uint8)
+        self._size = 0
+
+        # Runs of band tables, oldest first. In a run (offsets, items), the
+        # items with value v in a band are items[band, offsets[band, v]:offsets[band, v + 1]]
+        self._runs: List[Tuple[np.ndarray, np.ndarray]] = []
+        self._indexed = 0
+        # Items added since the last save
+        self.unsaved = 0
+
+        self._hash_cache: Dict[str, int] = {}
+        # Reentrant, so a caller can hold it across a query and an insert
+        self.lock = threading.RLock()
+
+    # Signatures
+
+    def signatures(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        SimHash signatures of texts, one row of uint64 words per text. A text
+        without tokens gets an all-zero row, which is never stored or matched.
+        """
+        out = np.zeros((len(texts), self.words), dtype=np.uint64)
+        for start in range(0, len(texts), _CHUNK):
+            out[start:start + _CHUNK] = self._signature_chunk(texts[start:start + _CHUNK])
+        return out
+
+    def _signature_chunk(self, texts: Sequence[str]) -> np.ndarray:
+        cache = self._hash_cache
+        if len(cache) > 1_000_000:
+            cache.clear()
+
+        token_hashes, lengths = [], []
+        for text in texts:
+            tokens = tokenize(text)
+            lengths.append(len(tokens))
+            for token in tokens:
+                h = cache.get(token)
+                if h is None:
+                    h = cache[token] = _token_hash(token)
+                token_hashes.append(h)
+
+        if not token_hashes:
+            return np.zeros((len(texts), self.words), dtype=np.uint64)
+
+        # Features are every word and every adjacent word pair, each occurrence
+        # weighted 1; pair hashes are derived from the word hashes
+        unigrams = np.array(token_hashes, dtype=np.uint64)
+        rows = np.repeat(np.arange(len(texts)), lengths)
+        pairs = np.flatnonzero(rows[1:] == rows[:-1])
+        with np.errstate(over='ignore'):
+            bigrams = _mix(unigrams[pairs] * _GOLDEN + unigrams[pairs + 1])
+        hashes = np.concatenate((unigrams, bigrams))
+        order = np.argsort(np.concatenate((rows, rows[pairs])), kind='stable')
+        counts = np.bincount(rows, minlength=len(texts)) * 2 - 1
+        counts[counts < 0] = 0
+
+        bits = np.unpackbits(_expand(hashes[order], self.words).view(np.uint8),
+                             axis=1).astype(np.float32)
+        bounds = np.concatenate(([0], np.cumsum(counts)))
+
+        # Each feature adds +1 where its bit is set and -1 where it is not, so
+        # a signature bit is set when more than half the features set it. The
+        # per-text sums are a (texts x features) matrix product, done in
+        # blocks so the matrix stays small.
+        set_count = np.empty((len(texts), self.bits), dtype=np.float32)
+        for start in range(0, len(texts), _BLOCK):
+            end = min(start + _BLOCK, len(texts))
+            lo, hi = bounds[start], bounds[end]
+            block_rows = np.repeat(np.arange(end - start), counts[start:end])
+            block = np.zeros((end - start, hi - lo), dtype=np.float32)
+            block[block_rows, np.arange(hi - lo)] = 1
+            set_count[start:end] = block @ bits[lo:hi]
+
+        return np.packbits(set_count * 2 > counts[:, None], axis=1).view(np.uint64)
+
+    def _band_view(self, signatures: np.ndarray) -> np.ndarray:
+        """(bands, n) band values of signatures"""
+        bits = np.unpackbits(np.ascontiguousarray(signatures).view(np.uint8), axis=1)
+        bits = bits[:, :self.bands * self.band_bits].reshape(len(signatures), self.bands, self.band_bits)
+        return (bits @ self._band_weights).T
+
+    # Inserting
+
+    def add(self, key: int, text: str, label: int = 0):
+        self.add_many([key], [text], [label])
+
+    def add_many(self, keys: Sequence[int], texts: Sequence[str],
+                 labels: Optional[Sequence[int]] = None):
+        """Insert texts under integer keys, with an optional small label each"""
+        self.add_signatures(keys, self.signatures(texts), labels)
+
+    def add_signatures(self, keys: Sequence[int], signatures: np.ndarray,
+                       labels: Optional[Sequence[int]] = None):
+        if labels is None:
+            labels = np.zeros(len(signatures), dtype=np.uint8)
+        # Texts without tokens would all match each other exactly
+        nonempty = signatures.any(axis=1)
+        if not nonempty.all():
+            signatures = signatures[nonempty]
+            keys = np.asarray(keys)[nonempty]
+            labels = np.asarray(labels)[nonempty]
+        count = len(signatures)
+        if not count:
+            return
+
+        with self.lock:
+            needed = self._size + count
+            if needed > len(self._keys):
+                # Grow geometrically so inserts stay amortized O(1)
+                capacity = max(needed, 2 * len(self._keys), 1024)
+                self._signatures = np.resize(self._signatures, (capacity, self.words))
+                self._keys = np.resize(self._keys, capacity)
+                self._labels = np.resize(self._labels, capacity)
+            self._signatures[self._size:needed] = signatures
+            self._keys[self._size:needed] = keys
+            self._labels[self._size:needed] = labels
+            self._size = needed
+            self.unsaved += count
+
+            if self._size - self._indexed > _TAIL:
+                self._index_tail()
+            if self.max_items is not None and self._size > self.max_items * (1 + _EVICT_SLACK):
+                self._evict(self._size - self.max_items)
+
+    # Band tables
+
+    def _build_run(self, first: int, signatures: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Band tables for the items first, first + 1, ... with these signatures"""
+        values = self._band_view(signatures)
+        offsets = np.zeros((self.bands, (1 << self.band_bits) + 1), dtype=np.int64)
+        items = np.empty((self.bands, len(signatures)), dtype=np.uint32)
+        for band in range(self.bands):
+            items[band] = np.argsort(values[band], kind='stable') + first
+            offsets[band, 1:] = np.cumsum(np.bincount(values[band], minlength=offsets.shape[1] - 1))
+        return offsets, items
+
+    def _merge_runs(self, older: Tuple[np.ndarray, np.ndarray],
+                    newer: Tuple[np.ndarray, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Merge two runs in one pass per band: within each value's group the
+        older run's items stay first, so groups remain in insertion order
+        """
+        (old_offsets, old_items), (new_offsets, new_items) = older, newer
+        offsets = old_offsets + new_offsets
+        items = np.empty((self.bands, old_items.shape[1] + new_items.shape[1]), dtype=np.uint32)
+        values = np.arange(offsets.shape[1] - 1)
+        for band in range(self.bands):
+            # An item moves up by the other run's items in earlier groups (and,
+            # for the newer run, in its own group)
+            old_values = np.repeat(values, np.diff(old_offsets[band]))
+            new_values = np.repeat(values, np.diff(new_offsets[band]))
+            items[band, np.arange(len(old_values)) + new_offsets[band, old_values]] = old_items[band]
+            items[band, np.arange(len(new_values)) + old_offsets[band, new_values + 1]] = new_items[band]
+        return offsets, items
+
+    def _index_tail(self):
+        """Turn the unindexed tail into a run, merging runs of similar size"""
+        with self.lock:
+            self._runs.append(self._build_run(self._indexed, self._signatures[self._indexed:self._size]))
+            self._indexed = self._size
+            while len(self._runs) > 1 and self._runs[-2][1].shape[1] <= 2 * self._runs[-1][1].shape[1]:
+                newer = self._runs.pop()
+                self._runs[-1] = self._merge_runs(self._runs[-1], newer)
+
+    def _compact(self):
+        """Index the tail and merge every run into one"""
+        with self.lock:
+            if self._size > self._indexed:
+                self._index_tail()
+            while len(self._runs) > 1:
+                newer = self._runs.pop()
+                self._runs[-1] = self._merge_runs(self._runs[-1], newer)
+
+    def _evict(self, count: int):
+        """Drop the count oldest items; the rest are renumbered from 0"""
+        with self.lock:
+            self._compact()
+            size = self._size - count
+            self._signatures = self._signatures[count:self._size].copy()
+            self._keys = self._keys[count:self._size].copy()
+            self._labels = self._labels[count:self._size].copy()
+            if self._runs:
+                offsets, items = self._runs[0]
+                kept_items = np.empty((self.bands, size), dtype=np.uint32)
+                for band in range(self.bands):
+                    keep = items[band] >= count
+                    # Items kept before each group boundary
+                    kept_before = np.concatenate(([0], np.cumsum(keep)))
+                    offsets[band] = kept_before[offsets[band]]
+                    kept_items[band] = items[band, keep] - count
+                self._runs = [(offsets, kept_items)]
+            self._size = self._indexed = size
+            logger.info(f"Evicted the {count} oldest claims from the similarity index")
+
+    def __len__(self) -> int:
+        return self._size
+
+    # Querying
+
+    def query(self, text: str, k: int = 5, min_similarity: float = 0.0) -> List[Tuple[int, float, int]]:
+        """Most similar stored texts as (key, estimated cosine similarity, label)"""
+        return self.query_signature(self.signatures([text])[0], k, min_similarity)
+
+    def query_signature(self, signature: np.ndarray, k: int = 5,
+                        min_similarity: float = 0.0) -> List[Tuple[int, float, int]]:
+        if k <= 0 or not signature.any():
+            return []
+        with self.lock:
+            if not self._size:
+                return []
+
+            values = self._band_view(signature[None, :])[:, 0]
+            candidates = [np.arange(self._indexed, self._size, dtype=np.uint32)]
+            for offsets, items in self._runs:
+                for band, value in enumerate(values):
+                    lo, hi = offsets[band, value:value + 2]
+                    if hi > lo:
+                        candidates.append(items[band, lo:hi])
+            candidates = np.unique(np.concatenate(candidates))
+            if not len(candidates):
+                return []
+
+            differing = self._signatures[candidates] ^ signature
+            distance = _POPCOUNT[differing.view(np.uint8)].sum(axis=1)
+            similarity = np.cos(np.pi * distance / self.bits)
+
+            keep = np.flatnonzero(similarity >= min_similarity)
+            if len(keep) > k:
+                keep = keep[np.argpartition(-similarity[keep], k - 1)[:k]]
+            keep = keep[np.argsort(-similarity[keep], kind='stable')]
+            items = candidates[keep]
+            return [(int(key), float(sim), int(label))
+                    for key, sim, label in zip(self._keys[items], similarity[keep], self._labels[items])]
+
+    # Persistence
+
+    def save(self, path: str):
+        """Write the index to an .npz file, replacing it atomically"""
+        tmp_path = f"{path}.tmp.npz"
+        with self.lock:
+            self._compact()
+            offsets, items = self._runs[0] if self._runs else (
+                np.zeros((self.bands, (1 << self.band_bits) + 1), dtype=np.int64),
+                np.zeros((self.bands, 0), dtype=np.uint32))
+            np.savez(
+                tmp_path,
+                config=np.array([self.bits, self.band_bits]),
+                signatures=self._signatures[:self._size],
+                keys=self._keys[:self._size],
+                labels=self._labels[:self._size],
+                band_offsets=offsets,
+                band_items=items,
+            )
+            os.replace(tmp_path, path)
+            self.unsaved = 0
+
+    @classmethod
+    def load(cls, path: str, max_items: Optional[int] = MAX_ITEMS) -> 'SimilarityIndex':
+        with np.load(path) as data:
+            bits, band_bits = (int(v) for v in data['config'])
+            index = cls(bits, band_bits, max_items)
+            index._signatures = data['signatures']
+            index._keys = data['keys']
+            index._labels = data['labels']
+            index._runs = [(data['band_offsets'], data['band_items'])]
+        index._size = index._indexed = len(index._keys)
+        logger.info(f"Loaded similarity index {path} with {index._size} items")
+        return index
+
+    @classmethod
+    def load_or_create(cls, path: str, **kwargs) -> 'SimilarityIndex':
+        if os.path.exists(path):
+            return cls.load(path, kwargs.get('max_items', MAX_ITEMS))
+        return cls(**kwargs)
+
+    def stats(self) -> Dict:
+        arrays = [self._signatures, self._keys, self._labels]
+        for offsets, items in self._runs:
+            arrays += [offsets, items]
+        return {
+            'items': self._size,
+            'unindexed': self._size - self._indexed,
+            'runs': len(self._runs),
+            'megabytes': sum(a.nbytes for a in arrays) / 1e6,
+        }
@@ -0,0 +1,60 @@
+# bot/text_scanner.py
+import re
+from typing import NamedTuple, Tuple
+
+# Every lexical feature FactChecker looks at, as one alternation so a tweet is
+# walked once. The leading lookahead lets the regex engine skip straight to
+# characters that can start a match. The alternatives never overlap except
+# inside URLs, which are re-scanned below so counts match running each pattern
+# on its own.
+#
+# The URL character class is the union of the alternatives in the original
+# pattern; its %XX branch only matched characters the class already covers.
+_URL = r'https?://[a-zA-Z0-9$-_@.&+!*\\(),]+'
+_SCANNER = re.compile(
+    r'(?=[h!A-Z\d])(?:'
+    r'(?P<url>' + _URL + r')'
+    r'|(?P<exclamation>!{2,})'
+    r'|(?P<caps>[A-Z]{4,})'
+    r'|(?P<percentage>\d+%))'
+)
+_URL_INNER = re.compile(r'(!{2,})|([A-Z]{4,})|(\d+%)')
+
+
+class TextFeatures(NamedTuple):
+    """Counts and URL spans found in a single scan of a tweet"""
+    exclamation_runs: int
+    caps_runs: int
+    percentages: int
+    url_spans: Tuple[Tuple[int, int], ...]
+
+    def urls(self, text: str) -> list:
+        """Slice the URLs out of the text that was scanned"""
+        return [text[start:end] for start, end in self.url_spans]
+
+
+def scan_text(text: str) -> TextFeatures:
+    """Scan text once and return its exclamation, caps, percentage and URL features"""
+    exclamation = caps = percentages = 0
+    url_spans = []
+
+    for match in _SCANNER.finditer(text):
+        kind = match.lastgroup
+        if kind == 'url':
+            url_spans.append(match.span())
+            for inner in _URL_INNER.finditer(match.group()):
+                index = inner.lastindex
+                if index == 1:
+                    exclamation += 1
+                elif index == 2:
+                    caps += 1
+                else:
+                    percentages += 1
+        elif kind == 'caps':
+            caps += 1
+        elif kind == 'percentage':
+            percentages += 1
+        else:
+            exclamation += 1
+
+    return TextFeatures(exclamation, caps, percentages, tuple(url_spans))
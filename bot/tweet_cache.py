@@ -0,0 +1,80 @@
+# bot/tweet_cache.py
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+# Returned by get() for ids that are not cached, as None is a valid entry
+MISSING = object()
+
+
+class TweetTextCache:
+    """
+    LRU + TTL cache of tweet texts by tweet id
+
+    Used for conversation roots, which many mentions in a burst share. None
+    is cached too, for roots that could not be fetched (deleted, protected).
+    """
+
+    def __init__(self, capacity: int = 10000, ttl: float = 900):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        # Shared by the fetch workers of the reply pipeline
+        self._lock = threading.Lock()
+
+    def get(self, tweet_id):
+        """Cached text for tweet_id (possibly None), or MISSING"""
+        key = str(tweet_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            stored_at, text = entry
+            if time.time() - stored_at > self.ttl:
+                del self._entries[key]
+                self.expired += 1
+                self.misses += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return text
+
+    def put(self, tweet_id, text: Optional[str]):
+        key = str(tweet_id)
+        with self._lock:
+            self._entries[key] = (time.time(), text)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def missing(self, tweet_ids: Iterable) -> List[str]:
+        """The distinct ids among tweet_ids that need fetching, in order"""
+        now = time.time()
+        missing = []
+        with self._lock:
+            for key in dict.fromkeys(str(tweet_id) for tweet_id in tweet_ids):
+                entry = self._entries.get(key)
+                if entry is None or now - entry[0] > self.ttl:
+                    missing.append(key)
+        return missing
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'expired': self.expired,
+            'evictions': self.evictions,
+        }
@@ -2,15 +2,41 @@
 import tweepy
 import yaml
 import time
+import asyncio
+import json
 import logging
+import threading
+from collections import deque
 from typing import Optional, List, Dict
 import os
 import sys
 
+# The asyncio mode needs tweepy's async extras: pip install "tweepy[async]"
+try:
+    from tweepy.asynchronous import AsyncClient
+    ASYNC_AVAILABLE = True
+except (ImportError, tweepy.errors.TweepyException):
+    ASYNC_AVAILABLE = False
+
+SEARCH_ROUTE = '/2/tweets/search/recent'
+
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from bot.fact_checker import FactChecker
+from bot.leases import MentionLeases, open_lease_store
+from bot.mention_store import ProcessedMentionStore
+from bot.mention_stream import MentionStream
+from bot import metrics
+from bot.news_index import NewsIndex
+from bot.pipeline import StagePipeline
+from bot.rate_limiter import PollScheduler, RateLimiter, RateLimitedClient, redirect_session
+from bot.reply_outbox import ReplyOutbox
+from bot.scoring_rules import RulesWatcher, ScoringRules
+from bot.similarity_index import MAX_ITEMS, SimilarityIndex
+from bot.tweet_cache import MISSING, TweetTextCache
+from bot.url_expander import UrlExpander
+from bot.verdict_cache import VerdictCache
 
 # Set up Windows-compatible logging (no emojis in logs)
 logging.basicConfig(
@@ -23,6 +49,15 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Per-step timers, looked up once rather than on every mention
+GET_MENTIONS_TIME = metrics.STAGE_SECONDS.labels('get_mentions')
+RESOLVE_ROOT_TIME = metrics.STAGE_SECONDS.labels('resolve_root')
+ANALYZE_TIME = metrics.STAGE_SECONDS.labels('analyze')
+POST_TIME = metrics.STAGE_SECONDS.labels('post')
+REPLIES_POSTED = metrics.REPLIES.labels('posted')
+REPLIES_FAILED = metrics.REPLIES.labels('failed')
+REPLIES_DROPPED = metrics.REPLIES.labels('gave_up')
+
 class TwitterFactCheckBot:
     """
     Twitter bot that responds to mentions with fact-checking analysis
@@ -31,9 +66,49 @@ class TwitterFactCheckBot:
     def __init__(self, config_path: str = "config/config.yaml"):
         self.config = self._load_config(config_path)
         self.api = self._setup_twitter_api()
-        self.fact_checker = FactChecker()
-        self.processed_tweets = set()
+        self.fact_checker = self._setup_fact_checker()
+        # Answered mentions, kept on disk so a restart never replies twice;
+        # processed_file: null keeps them in memory only
+        self.processed_tweets = ProcessedMentionStore(
+            self._state_path('processed_file', 'data/processed_mentions.log'),
+            window_days=self.config['bot'].get('processed_window_days', 7)
+        )
+        # Replies are written here before they are posted
+        outbox_path = self._state_path('outbox_file', 'data/outbox.db')
+        if self.processed_tweets.path and outbox_path in (None, ':memory:'):
+            # queue_reply records the mention before the reply goes out, so
+            # a crash would lose a reply held only in memory for good
+            self.processed_tweets.close()
+            raise ValueError("outbox_file must be a file when processed mentions are kept on disk")
+        self.outbox = ReplyOutbox(outbox_path or ':memory:')
+        # Mention ownership shared with the other workers, if there are any
+        self.leases = self._setup_leases()
+        # Conversation root texts, shared by the mentions of a viral thread
+        self.root_cache = TweetTextCache(**(self.config['bot'].get('root_cache') or {}))
+        # Mentions being handled, so that neither a poll nor the stream
+        # hands them over twice
+        self.in_flight = set()
+        self._in_flight_lock = threading.Lock()
+        # Mentions delivered by the stream since the last poll, for its stats
+        self.stream: Optional[MentionStream] = None
+        self._streamed: List[Dict] = []
+        # Seconds from mention to reply, for the recent replies
+        self.reply_latencies = deque(maxlen=1000)
         self.bot_username = self.config['bot']['username']
+        # Newest mention id seen so far; each poll only asks for newer ones
+        self.cursor_path = self.config['bot'].get('cursor_file')
+        self.since_id = self._load_cursor()
+        self._saved_since_id = self.since_id
+        
+        # Short poll intervals during bursts, long ones when idle
+        check_interval = self.config['bot']['check_interval']
+        self.poll_scheduler = PollScheduler(
+            self.config['bot'].get('min_check_interval', min(10, check_interval)),
+            self.config['bot'].get('max_check_interval', check_interval * 5),
+            initial=check_interval
+        )
+        # Set by stop() to end the run loop after the current poll
+        self.stopping = threading.Event()
         
         logger.info(f"Bot initialized as @{self.bot_username}")
     
@@ -46,6 +121,86 @@ class TwitterFactCheckBot:
             logger.error(f"Failed to load config: {e}")
             raise
     
+    def _state_path(self, key: str, default: str) -> Optional[str]:
+        """Configured path of a state file, default if unset; its directory is created"""
+        path = self.config['bot'].get(key, default)
+        if path and path != ':memory:' and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+    
+    def _setup_leases(self) -> Optional[MentionLeases]:
+        """
+        Several workers may run against the same account; each mention is
+        then handled by whichever worker leases it first
+        """
+        lease_config = self.config['bot'].get('leases')
+        if not lease_config:
+            return None
+        leases = MentionLeases(
+            open_lease_store(lease_config['url']),
+            owner=lease_config.get('worker_id'),
+            ttl=lease_config.get('ttl', 60)
+        )
+        logger.info(f"Sharing mentions with other workers as {leases.owner}")
+        return leases
+    
+    def _setup_fact_checker(self) -> FactChecker:
+        """Create the fact checker with the thresholds and lists from config"""
+        factcheck_config = self.config.get('factcheck') or {}
+        cache_config = factcheck_config.get('verdict_cache')
+        verdict_cache = VerdictCache(**cache_config) if cache_config else None
+        
+        # The rules file may override the threshold; otherwise it is the default
+        confidence_threshold = factcheck_config.get('confidence_threshold', 0.7)
+        rules_file = factcheck_config.get('rules_file')
+        rules = ScoringRules.load(rules_file, verified=confidence_threshold) if rules_file else None
+        
+        fact_checker = FactChecker(
+            confidence_threshold=confidence_threshold,
+            verdict_cache=verdict_cache,
+            rules=rules
+        )
+        
+        self.rules_watcher = None
+        if rules_file:
+            self.rules_watcher = RulesWatcher(
+                rules_file, fact_checker,
+                interval=factcheck_config.get('rules_reload_interval', 5.0),
+                verified=confidence_threshold
+            )
+            self.rules_watcher.start()
+            logger.info(f"Loaded scoring rules from {rules_file}")
+        
+        expander_config = factcheck_config.get('url_expander')
+        if expander_config:
+            fact_checker.url_expander = UrlExpander(**expander_config)
+        
+        if factcheck_config.get('news_index'):
+            fact_checker.news_index = NewsIndex(factcheck_config['news_index'])
+            fact_checker.evidence_k = factcheck_config.get('evidence_k', 3)
+            logger.info(f"Loaded news index with {len(fact_checker.news_index)} articles")
+        
+        self.claim_index_path = factcheck_config.get('claim_index')
+        if self.claim_index_path:
+            fact_checker.claim_index = SimilarityIndex.load_or_create(
+                self.claim_index_path,
+                max_items=factcheck_config.get('claim_index_max_items', MAX_ITEMS)
+            )
+            fact_checker.claim_similarity = factcheck_config.get('claim_similarity', 0.8)
+        # Saving rewrites the whole index, so it happens on an interval
+        # rather than after every poll
+        self.claim_index_save_interval = factcheck_config.get('claim_index_save_interval', 300)
+        self.claim_index_saved = time.monotonic()
+        
+        if factcheck_config.get('domain_index'):
+            fact_checker.load_domain_lists(
+                factcheck_config['domain_index'],
+                factcheck_config.get('reliable_domains_files', []),
+                factcheck_config.get('suspicious_domains_files', [])
+            )
+        
+        return fact_checker
+    
     def _setup_twitter_api(self) -> tweepy.API:
         """Setup Twitter API connection with both v1.1 and v2"""
         try:
@@ -59,15 +214,22 @@ class TwitterFactCheckBot:
                 self.config['twitter']['access_token_secret']
             )
             api_v1 = tweepy.API(auth, wait_on_rate_limit=True)
+            # Another API host, such as a FakeTwitterServer for load tests
+            api_host = self.config['twitter'].get('api_host')
+            if api_host:
+                redirect_session(api_v1.session, api_host)
             
-            # V2 API (for searching mentions)
-            self.client_v2 = tweepy.Client(
+            # V2 API (for mentions, lookups and replies), budgeted per
+            # endpoint from the rate limit headers of its responses
+            self.rate_limiter = RateLimiter()
+            self.client_v2 = RateLimitedClient(
                 bearer_token=self.config['twitter']['bearer_token'],
                 consumer_key=self.config['twitter']['api_key'],
                 consumer_secret=self.config['twitter']['api_secret'],
                 access_token=self.config['twitter']['access_token'],
                 access_token_secret=self.config['twitter']['access_token_secret'],
-                wait_on_rate_limit=True
+                limiter=self.rate_limiter,
+                api_host=api_host
             )
             
             # Test the connection
@@ -80,46 +242,266 @@ class TwitterFactCheckBot:
             logger.error(f"Failed to setup Twitter API: {e}")
             raise
     
-    def get_mentions(self) -> List[tweepy.models.Status]:
-        """Get recent mentions of the bot"""
+    def get_mentions(self) -> List[Dict]:
+        """Get every mention newer than the cursor, oldest first"""
+        if self._search_deferred():
+            return []
         try:
             # Use v2 API to search for mentions
-            query = f"@{self.bot_username} -is:retweet"
-            tweets = self.client_v2.search_recent_tweets(
-                query=query,
-                max_results=10,
-                tweet_fields=['created_at', 'author_id', 'context_annotations', 'conversation_id'],
-                expansions=['author_id', 'in_reply_to_user_id'],
-                user_fields=['username']
-            )
-            
-            if not tweets.data:
-                return []
-            
-            mentions = []
-            users_dict = {user.id: user for user in tweets.includes.get('users', [])}
+            pages = []
+            next_token = None
+            with GET_MENTIONS_TIME.time():
+                while True:
+                    tweets = self.client_v2.search_recent_tweets(**self._mention_search_params(next_token))
+                    pages.append(tweets)
+                    next_token = self._next_page(tweets)
+                    if next_token is None:
+                        break
             
-            for tweet in tweets.data:
-                # Skip if already processed
-                if str(tweet.id) in self.processed_tweets:
-                    continue
-                
-                author = users_dict.get(tweet.author_id)
-                if author:
-                    mentions.append({
-                        'id': str(tweet.id),
-                        'text': tweet.text,
-                        'author_username': author.username,
-                        'conversation_id': tweet.conversation_id,
-                        'created_at': tweet.created_at
-                    })
-            
-            return mentions
+            return self._collect_mentions(pages)
             
         except Exception as e:
             logger.error(f"Error getting mentions: {e}")
             return []
     
+    def _admit(self, mentions: List[Dict]) -> List[Dict]:
+        """Mark mentions in flight; those already in flight are left out"""
+        with self._in_flight_lock:
+            admitted = [m for m in mentions if m['id'] not in self.in_flight]
+            self.in_flight.update(m['id'] for m in admitted)
+        return admitted
+    
+    def _start_stream(self, on_mentions) -> Optional[MentionStream]:
+        """
+        Connect to the filtered stream if bot.stream is set; on_mentions is
+        called on the stream's thread with each batch of new mentions
+        """
+        if not self.config['bot'].get('stream'):
+            return None
+        stream = MentionStream(
+            self.config['twitter']['bearer_token'],
+            self.bot_username,
+            lambda response: on_mentions(self._accept_streamed(response)),
+            api_host=self.config['twitter'].get('api_host')
+        )
+        try:
+            stream.start()
+        except Exception as e:
+            logger.error(f"Could not start the mention stream, polling instead: {e}")
+            return None
+        self.stream = stream
+        return stream
+    
+    def _accept_streamed(self, response) -> List[Dict]:
+        mentions = self.claim_mentions(self._admit(self._parse_mentions(response)))
+        # The cursor is left alone: the catch-up poll after a reconnect has
+        # to start before the gap, and what it finds again was either
+        # answered already or is still in flight
+        with self._in_flight_lock:
+            self._streamed.extend(mentions)
+        if mentions:
+            logger.info(f"Streamed mention from @{mentions[0]['author_username']}")
+        return mentions
+    
+    def _take_streamed(self) -> List[Dict]:
+        with self._in_flight_lock:
+            streamed, self._streamed = self._streamed, []
+        return streamed
+    
+    @staticmethod
+    def _should_poll(stream: Optional[MentionStream]) -> bool:
+        """Poll search without a stream, while it is down, and once after each (re)connect"""
+        return stream is None or not stream.connected.is_set() or stream.needs_catch_up()
+    
+    def _next_interval(self, stream: Optional[MentionStream], mentions: int) -> float:
+        if stream is not None and stream.connected.is_set():
+            # Mentions arrive on their own; the loop is only for retries and stats
+            return self.config['bot']['check_interval']
+        return self.poll_scheduler.next_interval(mentions, self.rate_limiter.delay('GET', SEARCH_ROUTE))
+    
+    def claim_mentions(self, mentions: List[Dict]) -> List[Dict]:
+        """
+        The mentions this worker should handle: those it leased before any
+        other worker, plus any whose owner died before finishing them
+        """
+        if self.leases is None:
+            return mentions
+        claimed = []
+        try:
+            claimed = self.leases.claim(mentions)
+            if len(claimed) < len(mentions):
+                logger.info(f"{len(mentions) - len(claimed)} mention(s) are handled by other workers")
+            return claimed + self._admit(self.leases.reclaim())
+        except Exception as e:
+            # Without the lease store nothing can be handled safely
+            logger.error(f"Error leasing mentions: {e}")
+            claimed = []
+            return []
+        finally:
+            # Mentions left to other workers are not in flight here, and
+            # must not hold back the saved cursor
+            left = {m['id'] for m in mentions} - {m['id'] for m in claimed}
+            with self._in_flight_lock:
+                self.in_flight.difference_update(left)
+    
+    def _hold_lease(self, mention_id: str) -> bool:
+        """Renew the mention's lease before replying, long enough to cover a rate limit wait"""
+        if self.leases is None:
+            return True
+        try:
+            wait = self.rate_limiter.delay('POST', '/2/tweets')
+            if self.leases.hold(mention_id, extra=wait):
+                return True
+            logger.info(f"Mention {mention_id} was taken over by another worker")
+        except Exception as e:
+            logger.error(f"Error renewing the lease on {mention_id}: {e}")
+        return False
+    
+    def _finish_lease(self, mention_id: str):
+        if self.leases is None:
+            return
+        try:
+            self.leases.done(mention_id)
+        except Exception as e:
+            # The lease expires and another worker checks for our reply
+            logger.error(f"Error finishing the lease on {mention_id}: {e}")
+    
+    def _search_deferred(self) -> bool:
+        """Skip a poll rather than block on an exhausted search budget"""
+        delay = self.rate_limiter.delay('GET', SEARCH_ROUTE)
+        if delay > 0:
+            logger.info(f"Search rate limit reached, next poll in {delay:.0f}s")
+            return True
+        return False
+    
+    def _mention_search_params(self, next_token: Optional[str] = None) -> Dict:
+        params = {
+            'query': f"@{self.bot_username} -is:retweet",
+            'max_results': 100,
+            'tweet_fields': ['created_at', 'author_id', 'context_annotations', 'conversation_id'],
+            # Direct replies to the conversation root bring the root along
+            'expansions': ['author_id', 'in_reply_to_user_id', 'referenced_tweets.id'],
+            'user_fields': ['username']
+        }
+        if self.since_id:
+            params['since_id'] = self.since_id
+        if next_token:
+            params['next_token'] = next_token
+        return params
+    
+    def _next_page(self, tweets) -> Optional[str]:
+        """Token of the next page to fetch, if any"""
+        # Without a cursor yet, only the newest page is wanted, not a week of history
+        if self.since_id is None:
+            return None
+        return (tweets.meta or {}).get('next_token')
+    
+    def _collect_mentions(self, pages: List) -> List[Dict]:
+        """Mentions from every page of a poll, oldest first; advances the cursor"""
+        mentions = {}
+        for tweets in pages:
+            for mention in self._parse_mentions(tweets):
+                mentions[mention['id']] = mention
+            newest_id = (tweets.meta or {}).get('newest_id')
+            # The cursor is read under this lock when it is saved
+            with self._in_flight_lock:
+                if newest_id and (self.since_id is None or int(newest_id) > int(self.since_id)):
+                    self.since_id = str(newest_id)
+        metrics.MENTIONS.inc(len(mentions))
+        return sorted(mentions.values(), key=lambda mention: int(mention['id']))
+    
+    def _load_cursor(self) -> Optional[str]:
+        if not self.cursor_path or not os.path.exists(self.cursor_path):
+            return None
+        try:
+            with open(self.cursor_path, 'r') as f:
+                return json.load(f).get('since_id')
+        except Exception as e:
+            logger.error(f"Ignoring unreadable mention cursor {self.cursor_path}: {e}")
+            return None
+    
+    def _saveable_cursor(self) -> Optional[str]:
+        """
+        The cursor short of the oldest mention still in flight, so a restart
+        fetches every mention whose handling had not finished
+        """
+        with self._in_flight_lock:
+            cursor = self.since_id
+            saved = int(self._saved_since_id or 0)
+            pending = [int(mention_id) for mention_id in self.in_flight if int(mention_id) > saved]
+        if cursor is not None and pending and min(pending) <= int(cursor):
+            cursor = str(min(pending) - 1)
+        return cursor
+    
+    def _save_cursor(self):
+        """Persist the cursor, replacing the file atomically"""
+        cursor = self._saveable_cursor()
+        if not self.cursor_path or cursor is None or cursor == self._saved_since_id:
+            return
+        tmp_path = f"{self.cursor_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'since_id': cursor}, f)
+        os.replace(tmp_path, self.cursor_path)
+        self._saved_since_id = cursor
+    
+    def _parse_mentions(self, tweets) -> List[Dict]:
+        """Turn a search response into mention dicts, skipping processed ones"""
+        if not tweets.data:
+            return []
+        
+        mentions = []
+        users_dict = {user.id: user for user in tweets.includes.get('users', [])}
+        included = {str(tweet.id): tweet.text for tweet in tweets.includes.get('tweets', [])}
+        
+        for tweet in tweets.data:
+            # Skip if already processed
+            if str(tweet.id) in self.processed_tweets:
+                continue
+            
+            author = users_dict.get(tweet.author_id)
+            if author:
+                mentions.append({
+                    'id': str(tweet.id),
+                    'text': tweet.text,
+                    'author_username': author.username,
+                    'conversation_id': tweet.conversation_id,
+                    'created_at': tweet.created_at
+                })
+                root_id = self._root_id(mentions[-1])
+                if root_id in included:
+                    self.root_cache.put(root_id, included[root_id])
+        
+        return mentions
+    
+    @staticmethod
+    def _root_id(mention: Dict) -> Optional[str]:
+        """Id of the conversation root if the mention is a reply within one"""
+        root_id = str(mention['conversation_id'])
+        return root_id if root_id != mention['id'] else None
+    
+    def _root_batches(self, mentions: List[Dict]) -> List[List[str]]:
+        """Uncached conversation roots of mentions, in get_tweets sized batches"""
+        root_ids = self.root_cache.missing(
+            root_id for root_id in map(self._root_id, mentions) if root_id
+        )
+        return [root_ids[i:i + 100] for i in range(0, len(root_ids), 100)]
+    
+    def _store_roots(self, root_ids: List[str], response):
+        found = {str(tweet.id): tweet.text for tweet in response.data or []}
+        for root_id in root_ids:
+            # Deleted or protected roots are cached as None
+            self.root_cache.put(root_id, found.get(root_id))
+    
+    def fetch_roots(self, mentions: List[Dict]):
+        """Look up the conversation roots of a poll's mentions, 100 per request"""
+        for root_ids in self._root_batches(mentions):
+            try:
+                with RESOLVE_ROOT_TIME.time():
+                    response = self.client_v2.get_tweets(ids=root_ids, tweet_fields=['text'])
+                self._store_roots(root_ids, response)
+            except Exception as e:
+                logger.error(f"Error fetching conversation roots: {e}")
+    
     def get_tweet_to_check(self, mention: Dict) -> Optional[str]:
         """
         Get the tweet that should be fact-checked.
@@ -128,64 +510,229 @@ class TwitterFactCheckBot:
         """
         try:
             # If this is part of a conversation, get the original tweet
-            if mention['conversation_id'] != mention['id']:
-                original_tweet = self.client_v2.get_tweet(
-                    mention['conversation_id'],
-                    tweet_fields=['text', 'author_id'],
-                    expansions=['author_id'],
-                    user_fields=['username']
-                )
+            root_id = self._root_id(mention)
+            if root_id:
+                root_text = self.root_cache.get(root_id)
+                if root_text is MISSING:
+                    # Not prefetched with the rest of the poll
+                    with RESOLVE_ROOT_TIME.time():
+                        original_tweet = self.client_v2.get_tweet(root_id, tweet_fields=['text'])
+                    root_text = original_tweet.data.text if original_tweet.data else None
+                    self.root_cache.put(root_id, root_text)
                 
-                if original_tweet.data:
-                    return original_tweet.data.text
-            
-            # Otherwise, check the mention itself (remove the bot mention)
-            tweet_text = mention['text']
-            # Remove the bot mention from the text
-            tweet_text = tweet_text.replace(f"@{self.bot_username}", "").strip()
+                if root_text:
+                    return root_text
             
-            return tweet_text if tweet_text else None
+            # Otherwise, check the mention itself
+            return self._strip_mention(mention)
             
         except Exception as e:
             logger.error(f"Error getting tweet to check: {e}")
             return mention['text']
     
-    def process_mention(self, mention: Dict) -> bool:
-        """Process a single mention"""
+    def _strip_mention(self, mention: Dict) -> Optional[str]:
+        """The mention's own text without the bot mention"""
+        tweet_text = mention['text'].replace(f"@{self.bot_username}", "").strip()
+        return tweet_text if tweet_text else None
+    
+    def process_mention(self, mention: Dict, text_to_check: Optional[str] = None) -> bool:
+        """Process a single mention from start to finish"""
         try:
             logger.info(f"Processing mention from @{mention['author_username']}: {mention['text'][:100]}...")
             
             # Get the text to fact-check
-            text_to_check = self.get_tweet_to_check(mention)
-            if not text_to_check or len(text_to_check) < 10:
-                logger.info("No substantial content to fact-check, skipping")
+            if text_to_check is None:
+                text_to_check = self.get_tweet_to_check(mention)
+            response = self._build_reply(mention, text_to_check)
+            if response is None:
+                self._finish_lease(mention['id'])
                 return False
             
-            # Perform fact-checking
-            analysis = self.fact_checker.analyze_tweet(text_to_check)
-            logger.info(f"Analysis result: {analysis['status']} (confidence: {analysis['confidence']:.2f})")
-            
-            # Generate response
-            response = self.fact_checker.generate_response(analysis, mention['author_username'])
-            
-            # Post reply
-            self.api.update_status(
-                status=response,
-                in_reply_to_status_id=int(mention['id']),
-                auto_populate_reply_metadata=True
-            )
-            
-            logger.info(f"Posted reply: {response}")
-            print(f"[REPLY SENT] {response}")  # Console output without logging issues
-            
-            # Mark as processed
-            self.processed_tweets.add(mention['id'])
-            
-            return True
+            self.queue_reply(mention, response)
+            return self.post_reply(mention['id'])
             
         except Exception as e:
             logger.error(f"Error processing mention {mention['id']}: {e}")
             return False
+        finally:
+            with self._in_flight_lock:
+                self.in_flight.discard(mention['id'])
+    
+    def queue_reply(self, mention: Dict, response: str):
+        """Write the reply to the outbox; from here on it will be posted even after a crash"""
+        mention_at = mention['created_at'].timestamp() if mention.get('created_at') else None
+        # A mention taken over from a dead worker may already have its reply
+        self.outbox.enqueue(mention['id'], response, mention_at, unsure=mention.get('reclaimed', False))
+        # Mark as processed
+        self.processed_tweets.add(mention['id'])
+    
+    def post_reply(self, mention_id: str) -> bool:
+        """Post the outbox reply to mention_id if it is due; failures are retried with backoff"""
+        entry = self.outbox.claim(mention_id)
+        if entry is None:
+            return False
+        if not self._hold_lease(mention_id):
+            self.outbox.discard(mention_id)
+            return False
+        try:
+            reply_id = self._existing_reply(mention_id) if entry['unsure'] else None
+            if reply_id is None:
+                with POST_TIME.time():
+                    response = self.client_v2.create_tweet(text=entry['text'], in_reply_to_tweet_id=mention_id)
+                reply_id = str(response.data['id'])
+                logger.info(f"Posted reply: {entry['text']}")
+                print(f"[REPLY SENT] {entry['text']}")  # Console output without logging issues
+            self.outbox.mark_posted(mention_id, reply_id)
+            self._finish_lease(mention_id)
+            REPLIES_POSTED.inc()
+            self._record_latency(entry['mention_at'])
+            return True
+        except Exception as e:
+            self._reply_failed(mention_id, e)
+            return False
+    
+    def _existing_reply(self, mention_id: str) -> Optional[str]:
+        """Id of our reply to mention_id if an attempt cut short by a crash went through"""
+        tweets = self.client_v2.search_recent_tweets(**self._existing_reply_params(mention_id))
+        return str(tweets.data[0].id) if tweets.data else None
+    
+    def _existing_reply_params(self, mention_id: str) -> Dict:
+        return {'query': f"from:{self.bot_username} in_reply_to_tweet_id:{mention_id}", 'max_results': 10}
+    
+    def _reply_failed(self, mention_id: str, error: Exception):
+        delay = self.outbox.mark_failed(mention_id, str(error))
+        if delay >= 0:
+            REPLIES_FAILED.inc()
+            logger.error(f"Error posting reply to {mention_id}, retrying in {delay:.0f}s: {error}")
+        else:
+            REPLIES_DROPPED.inc()
+            self._finish_lease(mention_id)
+    
+    def retry_replies(self) -> List[str]:
+        """Outbox replies due for another attempt"""
+        return self.outbox.due()
+    
+    def _build_reply(self, mention: Dict, text_to_check: Optional[str]) -> Optional[str]:
+        """Fact-check text_to_check and word the reply; None if there is nothing to check"""
+        if not text_to_check or len(text_to_check) < 10:
+            logger.info("No substantial content to fact-check, skipping")
+            return None
+        
+        # Perform fact-checking
+        with ANALYZE_TIME.time():
+            analysis = self.fact_checker.analyze_tweet(text_to_check)
+        logger.info(f"Analysis result: {analysis['status']} (confidence: {analysis['confidence']:.2f})")
+        
+        # Generate response
+        return self.fact_checker.generate_response(analysis, mention['author_username'])
+    
+    def _record_latency(self, mention_at: Optional[float]):
+        if mention_at:
+            latency = time.time() - mention_at
+            self.reply_latencies.append(latency)
+            metrics.REPLY_LATENCY.observe(latency)
+    
+    def _before_poll(self):
+        # Pick up articles indexed by the text processing pipeline
+        if self.fact_checker.news_index is not None:
+            self.fact_checker.news_index.refresh()
+    
+    def _after_poll(self, mentions: List[Dict]):
+        # Only saved up to the mentions that were handled, so a crash
+        # mid-poll fetches the rest again
+        self._save_cursor()
+        
+        if self.fact_checker.verdict_cache is not None:
+            self.fact_checker.verdict_cache.flush()
+            logger.info(f"Verdict cache: {self.fact_checker.verdict_cache.stats()}")
+        
+        if mentions:
+            logger.info(f"Scoring rules: {self.fact_checker.rules.stats()}")
+            logger.info(f"Processed mentions: {self.processed_tweets.stats()}")
+            self.outbox.prune()
+            logger.info(f"Reply outbox: {self.outbox.stats()}")
+            logger.info(f"Root cache: {self.root_cache.stats()}")
+            if self.leases is not None:
+                logger.info(f"Leases: {self.leases.stats()}")
+        
+        if mentions:
+            logger.info(f"Rate limits: {self.rate_limiter.stats()}")
+            if self.stream is not None:
+                logger.info(f"Mention stream: {self.stream.stats()}")
+        
+        if mentions and self.reply_latencies:
+            latencies = sorted(self.reply_latencies)
+            p50 = latencies[len(latencies) // 2]
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            logger.info(f"Mention-to-reply latency over the last {len(latencies)} replies: "
+                        f"p50 {p50:.1f}s, p95 {p95:.1f}s")
+        
+        self._save_claim_index()
+    
+    def _save_claim_index(self, force: bool = False):
+        """Save the claim index if it has unsaved claims and the interval has passed"""
+        claim_index = self.fact_checker.claim_index
+        if claim_index is None or not claim_index.unsaved:
+            return
+        if not force and time.monotonic() - self.claim_index_saved < self.claim_index_save_interval:
+            return
+        claim_index.save(self.claim_index_path)
+        self.claim_index_saved = time.monotonic()
+        logger.info(f"Claim index: {claim_index.stats()}")
+    
+    def _fetch_stage(self, mention: Dict):
+        logger.info(f"Processing mention from @{mention['author_username']}: {mention['text'][:100]}...")
+        text_to_check = self.get_tweet_to_check(mention)
+        if text_to_check and self.fact_checker.url_expander is not None:
+            try:
+                self.fact_checker.url_expander.expand_texts([text_to_check])
+            except Exception as e:
+                logger.error(f"Error expanding links: {e}")
+        return mention, text_to_check
+    
+    def _analyze_stage(self, item) -> Optional[str]:
+        mention, text_to_check = item
+        try:
+            response = self._build_reply(mention, text_to_check)
+            if response is None:
+                self._finish_lease(mention['id'])
+                return None
+            self.queue_reply(mention, response)
+            return mention['id']
+        finally:
+            # Processed or given up on; either way it is no longer in flight
+            with self._in_flight_lock:
+                self.in_flight.discard(mention['id'])
+    
+    def _build_pipeline(self) -> StagePipeline:
+        """
+        fetch -> analyze -> post, each stage with its own workers. Analysis
+        is CPU bound and shares the fact checker's indexes, so it has one
+        worker by default; the other stages mostly wait on the network.
+        """
+        config = self.config['bot'].get('pipeline') or {}
+        queue_size = config.get('queue_size', 100)
+        pipeline = (StagePipeline()
+                    .add_stage('fetch', self._fetch_stage, config.get('fetch_workers', 4), queue_size)
+                    .add_stage('analyze', self._analyze_stage, config.get('analyze_workers', 1), queue_size)
+                    .add_stage('post', self.post_reply, config.get('post_workers', 2), queue_size))
+        for stage in pipeline.stages:
+            metrics.QUEUE_DEPTH.labels(stage.name).set_function(stage.queue.qsize)
+        return pipeline
+    
+    def _start_metrics(self):
+        """Serve the Prometheus metrics if bot.metrics_port is set"""
+        port = self.config['bot'].get('metrics_port')
+        if port is None:
+            return None
+        metrics.QUEUE_DEPTH.labels('outbox').set_function(
+            lambda: sum(count for state, count in self.outbox.stats().items() if state in ('pending', 'unsure'))
+        )
+        try:
+            return metrics.MetricsServer(port).start()
+        except OSError as e:
+            logger.error(f"Could not serve metrics on port {port}: {e}")
+            return None
     
     def run(self):
         """Main bot loop"""
@@ -196,31 +743,62 @@ class TwitterFactCheckBot:
         
         logger.info("Fact-checking bot started")
         logger.info(f"Monitoring mentions of @{self.bot_username}")
+        metrics_server = self._start_metrics()
         
-        check_interval = self.config['bot']['check_interval']
+        if self.config['bot'].get('async'):
+            metrics.QUEUE_DEPTH.labels('in_flight').set_function(lambda: len(self.in_flight))
+            try:
+                asyncio.run(self.run_async())
+            except KeyboardInterrupt:
+                print("\n✅ Bot stopped by user")
+                logger.info("Bot stopped by user")
+            finally:
+                if metrics_server is not None:
+                    metrics_server.stop()
+            return
+        
+        pipeline = self._build_pipeline()
+        pipeline.start()
+        def submit(mentions: List[Dict]):
+            for mention in mentions:
+                pipeline.submit(mention)
         
+        # Streamed mentions go straight into the pipeline
+        stream = self._start_stream(submit)
         try:
-            while True:
-                logger.info("Checking for new mentions...")
+            while not self.stopping.is_set():
+                self._before_poll()
                 
-                mentions = self.get_mentions()
+                # Replies that failed earlier, or were queued before a restart
+                for mention_id in self.retry_replies():
+                    pipeline.submit(mention_id, stage='post')
+                
+                mentions = []
+                if self._should_poll(stream):
+                    logger.info("Checking for new mentions...")
+                    mentions = self.claim_mentions(self._admit(self.get_mentions()))
                 if mentions:
                     print(f"📬 Found {len(mentions)} new mention(s)")
                     logger.info(f"Found {len(mentions)} new mention(s)")
+                    self.fetch_roots(mentions)
                     
                     for mention in mentions:
-                        try:
-                            self.process_mention(mention)
-                            time.sleep(2)  # Rate limiting between responses
-                        except Exception as e:
-                            logger.error(f"Failed to process mention: {e}")
-                            continue
-                else:
+                        pipeline.submit(mention)
+                    # Once analyzed, every reply is in the outbox; posting
+                    # carries on while the next poll is fetched
+                    pipeline.join(until='analyze')
+                    logger.info(f"Pipeline: {pipeline.stats()}")
+                    if self.fact_checker.url_expander is not None:
+                        logger.info(f"URL expander: {self.fact_checker.url_expander.stats()}")
+                elif stream is None:
                     logger.info("No new mentions found")
                 
-                print(f"⏰ Waiting {check_interval} seconds before next check...")
-                logger.info(f"Waiting {check_interval} seconds before next check")
-                time.sleep(check_interval)
+                self._after_poll(mentions + self._take_streamed())
+                
+                interval = self._next_interval(stream, len(mentions))
+                print(f"⏰ Waiting {interval:.0f} seconds before next check...")
+                logger.info(f"Waiting {interval:.0f} seconds before next check")
+                self.stopping.wait(interval)
                 
         except KeyboardInterrupt:
             print("\n✅ Bot stopped by user")
@@ -228,4 +806,226 @@ class TwitterFactCheckBot:
         except Exception as e:
             print(f"❌ Bot error: {e}")
             logger.error(f"Bot error: {e}")
-            raise
\ No newline at end of file
+            raise
+        finally:
+            if stream is not None:
+                stream.stop()
+            pipeline.stop()
+            if metrics_server is not None:
+                metrics_server.stop()
+            self._save_claim_index(force=True)
+    
+    def stop(self):
+        """End run() once the current poll is handled; safe from other threads"""
+        self.stopping.set()
+    
+    # asyncio mode
+    
+    def _setup_async_client(self):
+        """Async v2 client; replies are posted through v2 as well in this mode"""
+        if not ASYNC_AVAILABLE:
+            raise ImportError('The asyncio mode needs tweepy\'s async extras: pip install "tweepy[async]"')
+        from bot.rate_limiter import AsyncRateLimitedClient
+        return AsyncRateLimitedClient(
+            bearer_token=self.config['twitter']['bearer_token'],
+            consumer_key=self.config['twitter']['api_key'],
+            consumer_secret=self.config['twitter']['api_secret'],
+            access_token=self.config['twitter']['access_token'],
+            access_token_secret=self.config['twitter']['access_token_secret'],
+            limiter=self.rate_limiter,
+            api_host=self.config['twitter'].get('api_host')
+        )
+    
+    async def get_mentions_async(self, client) -> List[Dict]:
+        """Same as get_mentions, without blocking the event loop"""
+        if self._search_deferred():
+            return []
+        try:
+            pages = []
+            next_token = None
+            with GET_MENTIONS_TIME.time():
+                while True:
+                    tweets = await client.search_recent_tweets(**self._mention_search_params(next_token))
+                    pages.append(tweets)
+                    next_token = self._next_page(tweets)
+                    if next_token is None:
+                        break
+            return self._collect_mentions(pages)
+        except Exception as e:
+            logger.error(f"Error getting mentions: {e}")
+            return []
+    
+    async def get_tweet_to_check_async(self, client, mention: Dict) -> Optional[str]:
+        """Same as get_tweet_to_check, without blocking the event loop"""
+        try:
+            root_id = self._root_id(mention)
+            if root_id:
+                root_text = self.root_cache.get(root_id)
+                if root_text is MISSING:
+                    with RESOLVE_ROOT_TIME.time():
+                        original_tweet = await client.get_tweet(root_id, tweet_fields=['text'])
+                    root_text = original_tweet.data.text if original_tweet.data else None
+                    self.root_cache.put(root_id, root_text)
+                
+                if root_text:
+                    return root_text
+            
+            return self._strip_mention(mention)
+            
+        except Exception as e:
+            logger.error(f"Error getting tweet to check: {e}")
+            return mention['text']
+    
+    async def fetch_roots_async(self, client, mentions: List[Dict]):
+        """Same as fetch_roots, without blocking the event loop"""
+        for root_ids in self._root_batches(mentions):
+            try:
+                with RESOLVE_ROOT_TIME.time():
+                    response = await client.get_tweets(ids=root_ids, tweet_fields=['text'])
+                self._store_roots(root_ids, response)
+            except Exception as e:
+                logger.error(f"Error fetching conversation roots: {e}")
+    
+    async def process_mention_async(self, client, mention: Dict,
+                                    lookups: asyncio.Semaphore, replies: asyncio.Semaphore,
+                                    expander_session=None) -> bool:
+        """Process a single mention; lookups and replies bound the concurrent API calls"""
+        try:
+            logger.info(f"Processing mention from @{mention['author_username']}: {mention['text'][:100]}...")
+            
+            async with lookups:
+                text_to_check = await self.get_tweet_to_check_async(client, mention)
+                if text_to_check and self.fact_checker.url_expander is not None:
+                    try:
+                        await self.fact_checker.url_expander.expand_texts_async(
+                            [text_to_check], expander_session
+                        )
+                    except Exception as e:
+                        logger.error(f"Error expanding links: {e}")
+            
+            # Analysis is pure CPU and quick, so it runs on the loop; the
+            # lease, outbox and processed store wait on SQLite locks and
+            # disk, so they run in threads like the other blocking calls
+            response = self._build_reply(mention, text_to_check)
+            if response is None:
+                await asyncio.to_thread(self._finish_lease, mention['id'])
+                return False
+            await asyncio.to_thread(self.queue_reply, mention, response)
+            
+            async with replies:
+                return await self.post_reply_async(client, mention['id'])
+            
+        except Exception as e:
+            logger.error(f"Error processing mention {mention['id']}: {e}")
+            return False
+        finally:
+            with self._in_flight_lock:
+                self.in_flight.discard(mention['id'])
+    
+    async def post_reply_async(self, client, mention_id: str) -> bool:
+        """Same as post_reply, without blocking the event loop"""
+        entry = await asyncio.to_thread(self.outbox.claim, mention_id)
+        if entry is None:
+            return False
+        if not await asyncio.to_thread(self._hold_lease, mention_id):
+            await asyncio.to_thread(self.outbox.discard, mention_id)
+            return False
+        try:
+            reply_id = None
+            if entry['unsure']:
+                tweets = await client.search_recent_tweets(**self._existing_reply_params(mention_id))
+                reply_id = str(tweets.data[0].id) if tweets.data else None
+            if reply_id is None:
+                with POST_TIME.time():
+                    response = await client.create_tweet(text=entry['text'], in_reply_to_tweet_id=mention_id)
+                reply_id = str(response.data['id'])
+                logger.info(f"Posted reply: {entry['text']}")
+                print(f"[REPLY SENT] {entry['text']}")
+            await asyncio.to_thread(self.outbox.mark_posted, mention_id, reply_id)
+            await asyncio.to_thread(self._finish_lease, mention_id)
+            REPLIES_POSTED.inc()
+            self._record_latency(entry['mention_at'])
+            return True
+        except Exception as e:
+            await asyncio.to_thread(self._reply_failed, mention_id, e)
+            return False
+    
+    async def _retry_reply_async(self, client, mention_id: str, replies: asyncio.Semaphore):
+        async with replies:
+            await self.post_reply_async(client, mention_id)
+    
+    async def run_async(self):
+        """
+        Main bot loop in asyncio mode: the mentions of a poll are handled
+        concurrently instead of one after another
+        """
+        bot_config = self.config['bot']
+        client = self._setup_async_client()
+        lookups = asyncio.Semaphore(bot_config.get('max_concurrent_lookups', 10))
+        replies = asyncio.Semaphore(bot_config.get('max_concurrent_replies', 4))
+        
+        expander = self.fact_checker.url_expander
+        expander_session = expander.create_session() if expander is not None else None
+        tasks = set()
+        
+        def spawn(mentions: List[Dict]) -> List[asyncio.Task]:
+            spawned = []
+            for mention in mentions:
+                task = asyncio.create_task(self.process_mention_async(
+                    client, mention, lookups, replies, expander_session
+                ))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                spawned.append(task)
+            return spawned
+        
+        # The stream calls from its own thread; its mentions are spawned on the loop
+        loop = asyncio.get_running_loop()
+        stream = self._start_stream(lambda mentions: loop.call_soon_threadsafe(spawn, mentions))
+        
+        logger.info("Running in asyncio mode")
+        try:
+            while not self.stopping.is_set():
+                started = time.monotonic()
+                self._before_poll()
+                
+                poll_tasks = []
+                for mention_id in await asyncio.to_thread(self.retry_replies):
+                    task = asyncio.create_task(self._retry_reply_async(client, mention_id, replies))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                
+                mentions = []
+                if self._should_poll(stream):
+                    logger.info("Checking for new mentions...")
+                    mentions = await asyncio.to_thread(
+                        self.claim_mentions, self._admit(await self.get_mentions_async(client))
+                    )
+                if mentions:
+                    print(f"📬 Found {len(mentions)} new mention(s)")
+                    logger.info(f"Found {len(mentions)} new mention(s)")
+                    await self.fetch_roots_async(client, mentions)
+                    poll_tasks = spawn(mentions)
+                elif stream is None:
+                    logger.info("No new mentions found")
+                
+                # Stats are logged once this poll's mentions are done, unless
+                # they take longer than the poll interval
+                interval = self._next_interval(stream, len(mentions))
+                if poll_tasks:
+                    await asyncio.wait(poll_tasks, timeout=interval)
+                await asyncio.to_thread(self._after_poll, mentions + self._take_streamed())
+                
+                remaining = interval - (time.monotonic() - started)
+                logger.info(f"Waiting {max(remaining, 0):.0f} seconds before next check")
+                await asyncio.sleep(max(remaining, 0))
+        finally:
+            if stream is not None:
+                stream.stop()
+            for task in tasks:
+                task.cancel()
+            if expander_session is not None:
+                await expander_session.close()
+            if client.session is not None:
+                await client.session.close()
+            self._save_claim_index(force=True)
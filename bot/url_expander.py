@@ -0,0 +1,213 @@
+# bot/url_expander.py
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urljoin, urlparse
+
+from bot.text_scanner import scan_text
+
+logger = logging.getLogger(__name__)
+
+# aiohttp is only needed when short-link expansion is enabled
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+DEFAULT_SHORTENERS = (
+    't.co', 'bit.ly', 'tinyurl.com', 'ow.ly', 'buff.ly', 'goo.gl', 'is.gd',
+    'dlvr.it', 'trib.al', 'fb.me', 'lnkd.in', 'tiny.cc', 'rebrand.ly',
+)
+_REDIRECTS = (301, 302, 303, 307, 308)
+_MEMORY_LIMIT = 100000
+
+
+class UrlExpander:
+    """
+    Follows short links (t.co, bit.ly, ...) to their final URL
+
+    All links of a batch are expanded concurrently over one pooled aiohttp
+    session, with total and per-host connection limits and a per-request timeout.
+    Resolutions are kept in SQLite so the same short link is never fetched
+    twice, even across restarts.
+    """
+
+    def __init__(self, cache_path: str = ':memory:', max_connections: int = 20,
+                 per_host: int = 4, timeout: float = 5.0, max_redirects: int = 5,
+                 shorteners: Optional[Iterable[str]] = DEFAULT_SHORTENERS):
+        if not AIOHTTP_AVAILABLE:
+            raise ImportError("URL expansion needs aiohttp: pip install aiohttp")
+
+        self.max_connections = max_connections
+        self.per_host = per_host
+        self.timeout = timeout
+        self.max_redirects = max_redirects
+        # None expands every link, not just known shorteners
+        self.shorteners = set(shorteners) if shorteners is not None else None
+
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.failures = 0
+        self.mentions = 0
+        self.expand_seconds = 0.0
+
+        self._resolved: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(cache_path, check_same_thread=False)
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS url_expansions ('
+            'short_url TEXT PRIMARY KEY, final_url TEXT NOT NULL, resolved_at REAL NOT NULL)'
+        )
+        self._db.commit()
+
+    def _needs_expansion(self, url: str) -> bool:
+        if self.shorteners is None:
+            return True
+        try:
+            host = (urlparse(url).hostname or '').lower()
+        except ValueError:
+            return False
+        return host in self.shorteners
+
+    def _cached(self, url: str) -> Optional[str]:
+        final = self._resolved.get(url)
+        if final is not None:
+            return final
+        with self._lock:
+            row = self._db.execute(
+                'SELECT final_url FROM url_expansions WHERE short_url = ?', (url,)
+            ).fetchone()
+        if row:
+            self._remember({url: row[0]})
+            return row[0]
+        return None
+
+    def _remember(self, results: Dict[str, str]):
+        # SQLite holds everything; the dict only speeds up recent links
+        if len(self._resolved) > _MEMORY_LIMIT:
+            self._resolved.clear()
+        self._resolved.update(results)
+
+    def resolved(self, url: str) -> str:
+        """Final URL for url if it has been expanded, otherwise url itself"""
+        # Most links are not short ones; they never reach the cache
+        if not self._needs_expansion(url):
+            return url
+        return self._cached(url) or url
+
+    def _store(self, results: Dict[str, str]):
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                'INSERT OR REPLACE INTO url_expansions (short_url, final_url, resolved_at) '
+                'VALUES (?, ?, ?)',
+                [(short, final, now) for short, final in results.items()]
+            )
+            self._db.commit()
+        self._remember(results)
+
+    async def _follow(self, session, url: str) -> Optional[str]:
+        """Follow redirects from url without downloading any bodies"""
+        current = url
+        for _ in range(self.max_redirects):
+            if not self._needs_expansion(current) and current != url:
+                break
+            async with session.head(current, allow_redirects=False) as response:
+                if response.status == 405:
+                    # Some shorteners refuse HEAD
+                    async with session.get(current, allow_redirects=False) as get_response:
+                        status, location = get_response.status, get_response.headers.get('Location')
+                else:
+                    status, location = response.status, response.headers.get('Location')
+            if status not in _REDIRECTS or not location:
+                break
+            current = urljoin(current, location)
+        return current
+
+    async def _expand_one(self, session, url: str) -> Optional[str]:
+        try:
+            return await self._follow(session, url)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.failures += 1
+            logger.warning(f"Could not expand {url}: {e!r}")
+            return None
+
+    async def expand_many(self, urls: Iterable[str], session=None) -> Dict[str, str]:
+        """
+        Expand every short link in urls concurrently
+        Returns {url: final_url} for all of urls; unexpandable links map to themselves
+        """
+        pending = []
+        results = {}
+        for url in dict.fromkeys(urls):
+            if not self._needs_expansion(url):
+                results[url] = url
+                continue
+            final = self._cached(url)
+            if final is not None:
+                self.cache_hits += 1
+                results[url] = final
+            else:
+                self.cache_misses += 1
+                pending.append(url)
+
+        if pending:
+            own_session = session is None
+            if own_session:
+                session = self.create_session()
+            try:
+                finals = await asyncio.gather(*(self._expand_one(session, url) for url in pending))
+            finally:
+                if own_session:
+                    await session.close()
+
+            expanded = {url: final for url, final in zip(pending, finals) if final}
+            self._store(expanded)
+            for url, final in zip(pending, finals):
+                results[url] = final or url
+
+        return results
+
+    def create_session(self):
+        """A pooled session honouring the connection limits and timeout"""
+        connector = aiohttp.TCPConnector(limit=self.max_connections, limit_per_host=self.per_host)
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout)
+        )
+
+    def expand_texts(self, texts: Iterable[str]) -> Dict[str, str]:
+        """Expand the links in a batch of mention texts, blocking until done"""
+        return asyncio.run(self.expand_texts_async(texts))
+
+    async def expand_texts_async(self, texts: Iterable[str], session=None) -> Dict[str, str]:
+        """Expand the links in a batch of mention texts from a running event loop"""
+        texts = [t for t in texts if t]
+        urls: List[str] = []
+        for text in texts:
+            urls.extend(scan_text(text).urls(text))
+
+        start = time.perf_counter()
+        results = await self.expand_many(urls, session) if urls else {}
+        self.expand_seconds += time.perf_counter() - start
+        self.mentions += len(texts)
+        return results
+
+    def stats(self) -> Dict:
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'cache_hit_rate': self.cache_hits / lookups if lookups else 0.0,
+            'failures': self.failures,
+            'added_ms_per_mention': (
+                self.expand_seconds / self.mentions * 1000 if self.mentions else 0.0
+            ),
+        }
+
+    def close(self):
+        self._db.close()
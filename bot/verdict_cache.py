@@ -0,0 +1,212 @@
+# bot/verdict_cache.py
+import copy
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_MENTION = re.compile(r'@\w+')
+
+
+def normalize_text(text: str) -> str:
+    """Strip @mentions and collapse whitespace; case is kept, the analysis scores it"""
+    return ' '.join(_MENTION.sub(' ', text).split())
+
+
+def normalize_claim(text: str) -> str:
+    """normalize_text casefolded; the claim index compares words, not case"""
+    return normalize_text(text).casefold()
+
+
+def cache_key(text: str) -> str:
+    """Hash of the normalized text, so copies of the same claim share a key"""
+    return hashlib.blake2b(normalize_text(text).encode('utf-8'), digest_size=16).hexdigest()
+
+
+class VerdictCache:
+    """
+    LRU + TTL cache of analyze_tweet results keyed on normalized tweet text
+
+    With a path, verdicts are also written to a SQLite file so a restarted bot
+    starts warm; the most recent entries are preloaded into memory and older
+    ones are read from disk on a memory miss. Writes are committed in batches
+    of batch_size or every flush_interval seconds, whichever comes first, and
+    each commit drops expired rows and the oldest beyond disk_capacity. A
+    crash loses at most the last uncommitted batch, which is only a cache.
+    """
+
+    def __init__(self, capacity: int = 10000, ttl: float = 3600,
+                 path: Optional[str] = None, disk_capacity: int = 100000,
+                 batch_size: int = 100, flush_interval: float = 5):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.path = path
+        self.disk_capacity = disk_capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.expired = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        # Verdicts written to disk with the next commit: key -> (stored_at, json)
+        self._pending: Dict[str, tuple] = {}
+        self._last_flush = time.time()
+
+        if path:
+            self._open_disk(path)
+
+    def _open_disk(self, path: str):
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS verdicts ('
+            'key TEXT PRIMARY KEY, stored_at REAL NOT NULL, verdict TEXT NOT NULL)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS verdicts_stored_at ON verdicts (stored_at)')
+        self._trim_disk()
+        self._db.commit()
+
+        rows = self._db.execute(
+            'SELECT key, stored_at, verdict FROM verdicts ORDER BY stored_at DESC LIMIT ?',
+            (self.capacity,)
+        ).fetchall()
+        for key, stored_at, verdict in reversed(rows):
+            self._entries[key] = (stored_at, json.loads(verdict))
+        logger.info(f"Loaded {len(rows)} cached verdicts from {path}")
+
+    def get(self, text: str) -> Optional[Dict]:
+        """Return a copy of the cached verdict for text, or None"""
+        key = cache_key(text)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and key in self._pending:
+                stored_at, verdict = self._pending[key]
+                entry = (stored_at, json.loads(verdict))
+                self._store(key, entry)
+            if entry is None and self._db is not None:
+                row = self._db.execute(
+                    'SELECT stored_at, verdict FROM verdicts WHERE key = ?', (key,)
+                ).fetchone()
+                if row:
+                    entry = (row[0], json.loads(row[1]))
+                    self._store(key, entry)
+                    self.disk_hits += 1
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            stored_at, verdict = entry
+            if now - stored_at > self.ttl:
+                del self._entries[key]
+                self._pending.pop(key, None)
+                if self._db is not None:
+                    self._db.execute('DELETE FROM verdicts WHERE key = ?', (key,))
+                    self._db.commit()
+                self.expired += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+        result = copy.deepcopy(verdict)
+        result['text'] = text
+        return result
+
+    def put(self, text: str, verdict: Dict):
+        """Cache the verdict for text"""
+        key = cache_key(text)
+        entry = (time.time(), copy.deepcopy(verdict))
+
+        with self._lock:
+            self._store(key, entry)
+            if self._db is not None:
+                self._pending[key] = (entry[0], json.dumps(entry[1]))
+                if (len(self._pending) >= self.batch_size
+                        or entry[0] - self._last_flush >= self.flush_interval):
+                    self._flush()
+
+    def flush(self):
+        """Commit the verdicts not yet written to disk"""
+        with self._lock:
+            if self._db is not None:
+                self._flush()
+
+    def _flush(self):
+        self._last_flush = time.time()
+        if not self._pending:
+            return
+        self._db.executemany(
+            'INSERT OR REPLACE INTO verdicts (key, stored_at, verdict) VALUES (?, ?, ?)',
+            [(key, stored_at, verdict) for key, (stored_at, verdict) in self._pending.items()]
+        )
+        self._pending.clear()
+        self._trim_disk()
+        self._db.commit()
+
+    def _trim_disk(self):
+        """Drop expired rows and the oldest beyond disk_capacity"""
+        self._db.execute('DELETE FROM verdicts WHERE stored_at < ?', (time.time() - self.ttl,))
+        self._db.execute(
+            'DELETE FROM verdicts WHERE key IN '
+            '(SELECT key FROM verdicts ORDER BY stored_at DESC LIMIT -1 OFFSET ?)',
+            (self.disk_capacity,)
+        )
+
+    def _store(self, key: str, entry: tuple):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_or_compute(self, text: str, compute: Callable[[str], Dict]) -> Dict:
+        """Return the cached verdict for text, computing and caching it on a miss"""
+        verdict = self.get(text)
+        if verdict is None:
+            verdict = compute(text)
+            self.put(text, verdict)
+        return verdict
+
+    def clear(self):
+        """Drop every cached verdict, e.g. after the scoring rules change"""
+        with self._lock:
+            self._entries.clear()
+            self._pending.clear()
+            if self._db is not None:
+                self._db.execute('DELETE FROM verdicts')
+                self._db.commit()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'disk_hits': self.disk_hits,
+            'expired': self.expired,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._flush()
+                self._db.close()
+                self._db = None
@@ -0,0 +1,3 @@
+# conftest.py
+# test_mention.py is a manual script that tweets at the live bot, not a test
+collect_ignore = ['test_mention.py']
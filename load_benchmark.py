@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Load benchmark of the whole bot against a local fake Twitter API
+
+Mentions (synthetic, or recorded as JSON lines) are fed to a FakeTwitter
+server at a chosen rate while TwitterFactCheckBot runs against it as it
+would against the real API. Reports throughput, mention-to-reply latency
+and API calls per mention; --save and --baseline compare runs to catch
+regressions.
+
+Usage:
+    python load_benchmark.py [--mentions 300] [--rate 20] [--latency 0.05] [--error-rate 0.02]
+    python load_benchmark.py --replay mentions.jsonl --speed 10
+    python load_benchmark.py --stream [--drop-stream-every 5]
+    python load_benchmark.py --save baseline.json
+    python load_benchmark.py --baseline baseline.json
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# Add current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from benchmark import SAMPLE_TWEETS
+from bot.fake_twitter import (DEFAULT_LIMITS, FakeTwitter, FakeTwitterServer, MentionReplayer, load_mentions,
+                              synthetic_mentions)
+from bot.twitter_bot import TwitterFactCheckBot
+
+# Report fields where a larger value is worse, and the rest where it is better
+WORSE_IF_HIGHER = ('latency_p50', 'latency_p95', 'latency_p99', 'api_calls_per_mention')
+WORSE_IF_LOWER = ('replies_per_second',)
+
+
+def _bot_config(args, api_host: str, data_dir: str, worker: int) -> dict:
+    bot_config = {
+        'username': args.username,
+        'check_interval': args.check_interval,
+        'min_check_interval': args.check_interval,
+        'max_check_interval': args.check_interval * 4,
+        'async': args.use_async,
+        'cursor_file': os.path.join(data_dir, f'cursor{worker}.json'),
+        'processed_file': os.path.join(data_dir, f'processed{worker}.log'),
+        'outbox_file': os.path.join(data_dir, f'outbox{worker}.db'),
+    }
+    if args.stream:
+        bot_config['stream'] = True
+    if args.metrics_port and worker == 0:
+        bot_config['metrics_port'] = args.metrics_port
+    if args.bots > 1:
+        bot_config['leases'] = {'url': os.path.join(data_dir, 'leases.db'), 'ttl': 30,
+                                'worker_id': f'worker-{worker}'}
+    twitter_config = {key: 'fake' for key in ('api_key', 'api_secret', 'access_token',
+                                              'access_token_secret', 'bearer_token')}
+    twitter_config['api_host'] = api_host
+    return {
+        'twitter': twitter_config,
+        'bot': bot_config,
+        'factcheck': {'confidence_threshold': 0.7},
+    }
+
+
+def _drop_streams(twitter: FakeTwitter, every: float, done: threading.Event):
+    while not done.wait(every):
+        twitter.drop_streams()
+
+
+def run(args) -> dict:
+    twitter = FakeTwitter(
+        bot_username=args.username, latency=args.latency, jitter=args.jitter,
+        error_rate=args.error_rate, seed=args.seed,
+        limits={endpoint: int(limit * args.limit_scale) for endpoint, limit in DEFAULT_LIMITS.items()}
+    )
+    server = FakeTwitterServer(twitter).start()
+    if args.replay:
+        mentions = load_mentions(args.replay)
+    else:
+        mentions = synthetic_mentions(args.mentions, SAMPLE_TWEETS, args.reply_fraction, seed=args.seed)
+
+    data_dir = tempfile.mkdtemp(prefix='load_benchmark_')
+    bots = []
+    for worker in range(args.bots):
+        config_path = os.path.join(data_dir, f'config{worker}.json')
+        with open(config_path, 'w') as f:
+            # JSON is valid YAML
+            json.dump(_bot_config(args, server.url, data_dir, worker), f)
+        bots.append(TwitterFactCheckBot(config_path))
+
+    quiet = contextlib.redirect_stdout(open(os.devnull, 'w')) if not args.verbose else contextlib.nullcontext()
+    with quiet:
+        threads = [threading.Thread(target=bot.run, daemon=True) for bot in bots]
+        for thread in threads:
+            thread.start()
+        replayer = MentionReplayer(twitter, mentions, rate=args.rate, speed=args.speed).start()
+        if args.drop_stream_every:
+            threading.Thread(target=_drop_streams, args=(twitter, args.drop_stream_every, replayer.done),
+                             daemon=True).start()
+
+        # Until every mention is answered, or the timeout
+        deadline = time.time() + args.timeout
+        replayer.done.wait(args.timeout)
+        while time.time() < deadline and len(twitter.replies) < replayer.published:
+            time.sleep(0.1)
+        for bot in bots:
+            bot.stop()
+        for thread in threads:
+            thread.join(timeout=args.check_interval * 4 + 5)
+
+    report = twitter.report()
+    report['outbox'] = [bot.outbox.stats() for bot in bots]
+    report['rate_limit_waits'] = [
+        {endpoint: bucket['waits'] for endpoint, bucket in bot.rate_limiter.stats()['endpoints'].items()}
+        for bot in bots
+    ]
+    if args.stream:
+        report['streams'] = [bot.stream.stats() if bot.stream else None for bot in bots]
+    server.stop()
+    return report
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    """The metrics of report that are worse than baseline by more than tolerance"""
+    regressions = []
+    for key in WORSE_IF_HIGHER + WORSE_IF_LOWER:
+        if key not in report or not baseline.get(key):
+            continue
+        change = (report[key] - baseline[key]) / baseline[key]
+        if (key in WORSE_IF_HIGHER and change > tolerance) or (key in WORSE_IF_LOWER and -change > tolerance):
+            regressions.append(f"{key}: {baseline[key]:.3f} -> {report[key]:.3f} ({change:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mentions', type=int, default=300, help='synthetic mentions to send')
+    parser.add_argument('--rate', type=float, default=20.0, help='mentions per second')
+    parser.add_argument('--reply-fraction', type=float, default=0.5,
+                        help='share of mentions replying to a shared root tweet')
+    parser.add_argument('--replay', help='recorded mentions, one JSON object per line')
+    parser.add_argument('--speed', type=float, default=1.0, help="speed-up of recorded 'at' times")
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds added to every API call')
+    parser.add_argument('--jitter', type=float, default=0.05, help='random extra latency, up to this')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of API calls failing with 503')
+    parser.add_argument('--limit-scale', type=float, default=1.0,
+                        help='multiplier of the real API rate limits (one window is 15 minutes)')
+    parser.add_argument('--bots', type=int, default=1, help='bot workers sharing mentions through leases')
+    parser.add_argument('--async', dest='use_async', action='store_true', help='run the bots in asyncio mode')
+    parser.add_argument('--stream', action='store_true', help='take mentions from the filtered stream')
+    parser.add_argument('--drop-stream-every', type=float,
+                        help='close the open streams from the server side every this many seconds')
+    parser.add_argument('--metrics-port', type=int, help="serve the first bot's metrics on this port")
+    parser.add_argument('--check-interval', type=float, default=1.0)
+    parser.add_argument('--timeout', type=float, default=120.0)
+    parser.add_argument('--username', default='factbot')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save', help='write the report to this JSON file')
+    parser.add_argument('--baseline', help='fail if worse than this saved report')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed regression against --baseline')
+    parser.add_argument('--verbose', action='store_true', help='keep the bot log and console output')
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    report = run(args)
+    print(json.dumps(report, indent=2))
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -24,7 +24,7 @@ def create_directories():
 def install_requirements():
     """Install required packages"""
     try:
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "tweepy>=4.14.0", "PyYAML>=6.0", "requests>=2.31.0"])
+        subprocess.check_call([sys.executable, "-m", "pip", "install", "tweepy>=4.14.0", "PyYAML>=6.0", "requests>=2.31.0", "numpy>=1.24", "aiohttp>=3.9"])
         print("✅ Requirements installed")
         return True
     except subprocess.CalledProcessError as e:
@@ -42,13 +42,71 @@ def create_config_template():
   access_token: "your_access_token_here"
   access_token_secret: "your_access_token_secret_here"
   bearer_token: "your_bearer_token_here"
+  # Another API server instead of api.twitter.com, e.g. a FakeTwitterServer
+  # api_host: "http://127.0.0.1:8080"
 
 bot:
   username: "your_bot_username"  # Your bot's Twitter username (without @)
   check_interval: 60  # Check for mentions every 60 seconds
+  # The interval adapts to mention volume within these bounds
+  # min_check_interval: 10
+  # max_check_interval: 300
+  # Handle the mentions of a poll concurrently (needs: pip install "tweepy[async]")
+  # async: true
+  # max_concurrent_lookups: 10
+  # max_concurrent_replies: 4
+  # Remember the newest mention seen across restarts
+  # cursor_file: "data/mentions_cursor.json"
+  # Answered mentions, so a restart never replies twice (null keeps them in memory)
+  # processed_file: "data/processed_mentions.log"
+  # processed_window_days: 7
+  # Cache of conversation root tweets
+  # root_cache: {capacity: 10000, ttl: 900}
+  # Replies are written here before posting and retried until they go out
+  # (":memory:" only together with processed_file: null)
+  # outbox_file: "data/outbox.db"
+  # Workers per stage of the fetch -> analyze -> post pipeline
+  # pipeline: {fetch_workers: 4, analyze_workers: 1, post_workers: 2, queue_size: 100}
+  # Run several workers on the account; each mention goes to the worker that
+  # leases it first. url is redis://host:6379/0 across hosts, or a SQLite file
+  # leases: {url: "sqlite:///data/leases.db", ttl: 60, worker_id: "worker-1"}
+  # Prometheus metrics (per-step latency, queue depths, API errors, rate limit
+  # waits) at http://<host>:<metrics_port>/metrics
+  # metrics_port: 9108
+  # Take mentions from the filtered stream as they are posted; search is
+  # still polled while the stream is down and after each reconnect
+  # stream: true
 
 factcheck:
   confidence_threshold: 0.7  # Minimum confidence to make a definitive claim
+  # Optional domain allowlists/blocklists, one domain per line, compiled into domain_index
+  # domain_index: "data/domains.idx"
+  # reliable_domains_files: ["data/reliable_domains.txt"]
+  # suspicious_domains_files: ["data/suspicious_domains.txt"]
+  # Optional cache of verdicts for repeated claims (path keeps it across restarts)
+  # verdict_cache:
+  #   capacity: 10000
+  #   ttl: 3600
+  #   path: "data/verdicts.sqlite"
+  #   disk_capacity: 100000
+  # Optional expansion of t.co and other short links before scoring (needs aiohttp)
+  # url_expander:
+  #   cache_path: "data/urls.sqlite"
+  #   max_connections: 20
+  #   per_host: 4
+  #   timeout: 5
+  # Optional BM25 index of news articles, written by the attempt1 text processing
+  # pipeline (NEWS_INDEX_PATH); related reliable coverage is cited as evidence
+  # news_index: "data/news_index"
+  # evidence_k: 3
+  # Optional LSH index of analyzed claims, to flag reworded repeats
+  # claim_index: "data/claims.npz"
+  # claim_similarity: 0.8
+  # claim_index_max_items: 1000000  # oldest claims are dropped past this
+  # claim_index_save_interval: 300
+  # Optional scoring rules file, reloaded when it changes
+  # rules_file: "config/scoring_rules.yaml"
+  # rules_reload_interval: 5
 '''
         
         with open(config_path, "w") as f:
@@ -0,0 +1,84 @@
+import os
+import random
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot.fact_checker import FactChecker
+from bot.similarity_index import SimilarityIndex
+from bot.url_expander import UrlExpander
+
+PIECES = [
+    'the', 'vaccine', 'BREAKING', 'Urgent', 'miracle cure', 'secret', 'studies show',
+    'experts say', '100% proven', '45%', '3%', '!!', '!!!', 'NASA', 'LEAKED', 'WHO', 'exposed',
+    "they don't want you to know", 'café', '😱', '\x00', 'https://www.reuters.com/world/a',
+    'https://edition.cnn.com/x?y=1', 'http://fakenews.com/story', 'https://clickbait.com',
+    'https://example.org/page', 'www.bbc.com/news', 'https://t.co/abc123',
+]
+
+
+def _texts(count, seed):
+    rng = random.Random(seed)
+    texts = [' '.join(rng.choices(PIECES, k=rng.randint(0, 25))) for _ in range(count)]
+    return texts + ['', '!!', 'NASA NASA NASA NASA', '\x00\x00']
+
+
+def _assert_rows_match(checker, texts):
+    batch = checker.analyze_batch(texts)
+    assert len(batch) == len(texts)
+    for text, row in zip(texts, batch):
+        assert row == checker.analyze_tweet(text), text
+
+
+def test_batch_matches_analyze_tweet():
+    _assert_rows_match(FactChecker(), _texts(1500, seed=1))
+
+
+def test_batch_matches_analyze_tweet_with_many_keywords():
+    """A keyword list long enough for the per-text automaton path"""
+    checker = FactChecker()
+    rng = random.Random(4)
+    checker.add_suspicious_keywords(
+        [''.join(rng.choices('aeinorst ', k=rng.randint(3, 8))) for _ in range(400)])
+    _assert_rows_match(checker, _texts(500, seed=5))
+
+
+def test_batch_handles_short_links_to_other_schemes():
+    checker = FactChecker()
+    checker.url_expander = UrlExpander()
+    checker.url_expander._store({
+        'https://t.co/mail': 'mailto:tips@reuters.com',
+        'https://t.co/rel': '//cdn.fakenews.com/story',
+        'https://t.co/ftp': 'ftp://files.example.org/leak.pdf',
+        'https://t.co/web': 'https://www.reuters.com/world/a',
+    })
+    texts = [f"see https://t.co/{path} now" for path in ('mail', 'rel', 'ftp', 'web')]
+    _assert_rows_match(checker, texts + [' '.join(texts)])
+    checker.url_expander.close()
+
+
+def test_reading_rows_leaves_the_claim_index_alone():
+    claim = 'scientists confirm the new vaccine alters human dna in every patient tested so far'
+    texts = [claim, claim + ' !!', 'nice weather for a walk in the park', claim,
+             'BREAKING ' + claim, '']
+    batch_checker, loop_checker = FactChecker(), FactChecker()
+    batch_checker.claim_index, loop_checker.claim_index = SimilarityIndex(), SimilarityIndex()
+
+    batch = batch_checker.analyze_batch(texts)
+    stored = len(batch_checker.claim_index)
+    backwards = [batch[i] for i in reversed(range(len(batch)))]
+    assert len(batch_checker.claim_index) == stored
+
+    expected = [loop_checker.analyze_tweet(text) for text in texts]
+    assert any(row['similar_claims'] for row in expected)
+    assert list(batch) == backwards[::-1] == expected
+
+
+def test_claims_differing_only_in_case_are_one_claim():
+    checker = FactChecker()
+    checker.claim_index = SimilarityIndex()
+    claim = 'this miracle cure reverses ageing in seven days doctors hate it'
+    assert checker.analyze_tweet(claim)['similar_claims'] == []
+    assert checker.analyze_tweet(claim.upper())['similar_claims'] == []
+    assert checker.analyze_tweet(f"@someone  {claim.title()}")['similar_claims'] == []
+    assert len(checker.claim_index) == 1
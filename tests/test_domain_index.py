@@ -0,0 +1,41 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot.domain_index import RELIABLE, SUSPICIOUS, DomainIndex
+
+
+def _write(path, domains, mtime_ns):
+    path.write_text('\n'.join(domains) + '\n')
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_index_is_rebuilt_when_its_lists_change(tmp_path):
+    index_path = str(tmp_path / 'domains.idx')
+    reliable, suspicious, extra = tmp_path / 'reliable.txt', tmp_path / 'suspicious.txt', tmp_path / 'extra.txt'
+    old = 1_600_000_000 * 10**9
+    _write(reliable, ['reuters.com'], old)
+    _write(suspicious, ['fakenews.com'], old)
+    _write(extra, ['clickbait.com'], old)
+
+    index = DomainIndex.load_or_build(index_path, [str(reliable)], [str(suspicious)])
+    assert index.lookup('www.reuters.com') == RELIABLE
+    built = os.stat(index_path).st_mtime_ns
+    assert DomainIndex.load_or_build(index_path, [str(reliable)], [str(suspicious)]).lookup(
+        'fakenews.com') == SUSPICIOUS
+    assert os.stat(index_path).st_mtime_ns == built
+
+    # A list added that is older than the index
+    index = DomainIndex.load_or_build(index_path, [str(reliable)], [str(suspicious), str(extra)])
+    assert index.lookup('clickbait.com') == SUSPICIOUS
+
+    # A list replaced by an older copy
+    _write(suspicious, ['fakenews.com', 'hoax.net'], old - 10**9)
+    index = DomainIndex.load_or_build(index_path, [str(reliable)], [str(suspicious), str(extra)])
+    assert index.lookup('hoax.net') == SUSPICIOUS
+
+    # A list dropped
+    index = DomainIndex.load_or_build(index_path, [str(reliable)], [str(suspicious)])
+    assert index.lookup('clickbait.com') is None
+    assert index.lookup('reuters.com') == RELIABLE
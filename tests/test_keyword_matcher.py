@@ -0,0 +1,51 @@
+import os
+import random
+import re
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot.fact_checker import FactChecker
+from bot.keyword_matcher import KeywordMatcher
+
+WORDS = ['the', 'vaccine', 'BREAKING', 'Urgent', 'miracle', 'cure', 'secret', 'he', 'she',
+         'hers', 'studies', 'show', 'experts', 'say', '100%', '45%', '!!', '!!!', 'NASA',
+         'LEAKED', 'exposed', "don't", 'know', 'they', 'want', 'you', 'to', 'ushers']
+
+
+def _old_patterns(keywords, text):
+    """_check_suspicious_patterns as it was before the automaton and the text scanner"""
+    flags = []
+    text_lower = text.lower()
+    for keyword in keywords:
+        if keyword in text_lower:
+            flags.append(f"suspicious_keyword: {keyword}")
+    if len(re.findall(r'[!]{2,}', text)) > 0:
+        flags.append("excessive_exclamation")
+    if len(re.findall(r'[A-Z]{4,}', text)) > 2:
+        flags.append("excessive_caps")
+    if len(re.findall(r'\d+%', text)) > 2:
+        flags.append("many_percentages")
+    return flags
+
+
+def _texts(count, seed):
+    rng = random.Random(seed)
+    return [' '.join(rng.choices(WORDS, k=rng.randint(0, 30))) for _ in range(count)]
+
+
+def test_flags_match_the_old_scan():
+    checker = FactChecker()
+    for text in _texts(2000, seed=1):
+        assert checker._check_suspicious_patterns(text) == _old_patterns(checker.suspicious_keywords, text)
+
+
+def test_automaton_matches_substring_scan():
+    """Overlapping and nested keywords, on a list long enough to use the automaton"""
+    rng = random.Random(2)
+    keywords = ['he', 'she', 'his', 'hers', 'ushers', 'miracle cure', 'cure', 'secret']
+    keywords += [''.join(rng.choices('aehrsu ', k=rng.randint(2, 6))) for _ in range(300)]
+    matcher = KeywordMatcher(keywords)
+    for text in _texts(500, seed=3):
+        text = text.lower()
+        assert matcher.find(text) == [k for k in keywords if k and k in text]
@@ -0,0 +1,76 @@
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot.fake_twitter import FakeTwitter, FakeTwitterServer
+from bot.leases import MentionLeases, SQLiteLeaseStore
+from test_mention_stream import _start_bot
+
+CLAIM = "SHOCKING truth they are hiding about the vaccine, share before it gets deleted"
+
+
+def _mention(mention_id):
+    return {'id': mention_id, 'text': 'is this true?', 'created_at': datetime.now(timezone.utc)}
+
+
+def _leased(tweet, author):
+    """A mention as a worker leases it, from a FakeTwitter tweet"""
+    return {'id': str(tweet['id']), 'text': tweet['text'], 'author_username': author,
+            'conversation_id': tweet['conversation_id'],
+            'created_at': datetime.fromtimestamp(tweet['created_at'], timezone.utc)}
+
+
+def test_expired_leases_are_taken_over_once(tmp_path):
+    path = str(tmp_path / 'leases.db')
+    dead = MentionLeases(SQLiteLeaseStore(path), owner='dead', ttl=0.2)
+    alive = MentionLeases(SQLiteLeaseStore(path), owner='alive', ttl=60)
+    mentions = [_mention('1'), _mention('2')]
+
+    assert [m['id'] for m in dead.claim(mentions)] == ['1', '2']
+    assert alive.claim(mentions) == []
+    assert alive.reclaim() == []
+
+    time.sleep(0.3)
+    taken = alive.reclaim()
+    assert sorted(m['id'] for m in taken) == ['1', '2']
+    assert all(m['reclaimed'] and isinstance(m['created_at'], datetime) for m in taken)
+    # Nobody else gets them, and the old owner finds out before replying
+    assert MentionLeases(SQLiteLeaseStore(path), owner='third').reclaim() == []
+    assert not dead.hold('1')
+    assert alive.hold('1')
+
+    alive.done('1')
+    assert not alive.hold('1')
+    assert MentionLeases(SQLiteLeaseStore(path), owner='third').claim([_mention('1')]) == []
+
+
+def test_worker_answers_a_dead_workers_mentions_once(tmp_path):
+    """Mentions leased by a crashed worker are answered after its leases expire, without repeats"""
+    twitter = FakeTwitter()
+    server = FakeTwitterServer(twitter).start()
+    unanswered = twitter.mention(CLAIM, 'alice')
+    answered = twitter.mention(CLAIM, 'bob')
+
+    path = str(tmp_path / 'leases.db')
+    dead = MentionLeases(SQLiteLeaseStore(path), owner='dead', ttl=1)
+    dead.claim([_leased(unanswered, 'alice'), _leased(answered, 'bob')])
+    # The dead worker replied to bob before it crashed
+    twitter._reply('earlier reply', str(answered['id']))
+
+    bot, thread = _start_bot(tmp_path, server, leases={'url': path, 'worker_id': 'alive', 'ttl': 5})
+    try:
+        deadline = time.time() + 20
+        while time.time() < deadline and len(twitter.replies) < 2:
+            time.sleep(0.2)
+        time.sleep(1)
+        report = twitter.report()
+        assert report['answered'] == 2
+        assert report['duplicate_replies'] == 0
+        assert bot.leases.taken_over == 2
+    finally:
+        bot.stop()
+        thread.join(timeout=10)
+        server.stop()
@@ -0,0 +1,79 @@
+import json
+import os
+import sys
+import threading
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot.fake_twitter import FakeTwitter, FakeTwitterServer
+from bot.mention_store import ProcessedMentionStore
+from bot.twitter_bot import TwitterFactCheckBot
+from test_mention_stream import _write_config
+
+
+def test_processed_mentions_survive_a_restart(tmp_path):
+    path = str(tmp_path / 'processed.log')
+    store = ProcessedMentionStore(path)
+    for tweet_id in range(1000, 6000, 5):
+        store.add(str(tweet_id))
+    store.close()
+
+    store = ProcessedMentionStore(path)
+    assert len(store) == 1000
+    assert all(str(tweet_id) in store for tweet_id in range(1000, 6000, 5))
+    assert not any(tweet_id in store for tweet_id in range(1001, 6000, 5))
+    store.close()
+
+
+def test_restart_drops_expired_and_torn_records(tmp_path):
+    path = str(tmp_path / 'processed.log')
+    store = ProcessedMentionStore(path, window_days=1)
+    store.add(1, at=0.0)
+    store.add(2)
+    store.close()
+    with open(path, 'ab') as f:
+        # A record cut short by a crash
+        f.write(b'\x03\x00\x00')
+
+    store = ProcessedMentionStore(path, window_days=1)
+    assert 2 in store and 1 not in store and 3 not in store
+    store.add(3)
+    store.close()
+    assert len(ProcessedMentionStore(path, window_days=1)) == 2
+
+
+def test_concurrent_adds_record_each_mention_once(tmp_path):
+    path = str(tmp_path / 'processed.log')
+    store = ProcessedMentionStore(path)
+
+    def add_all():
+        for tweet_id in range(20000):
+            store.add(tweet_id)
+
+    threads = [threading.Thread(target=add_all) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    store.close()
+
+    assert len(store) == 20000
+    assert os.path.getsize(path) == 20000 * 16
+
+
+def test_bot_keeps_processed_mentions_on_disk_by_default(tmp_path, monkeypatch):
+    server = FakeTwitterServer(FakeTwitter()).start()
+    try:
+        config_path = _write_config(tmp_path, server)
+        config = json.loads(open(config_path).read())
+        del config['bot']['processed_file']
+        open(config_path, 'w').write(json.dumps(config))
+        monkeypatch.chdir(tmp_path)
+
+        bot = TwitterFactCheckBot(config_path)
+        bot.processed_tweets.add('123')
+        bot.processed_tweets.close()
+        assert '123' in TwitterFactCheckBot(config_path).processed_tweets
+        assert os.path.exists(tmp_path / 'data' / 'processed_mentions.log')
+    finally:
+        server.stop()
@@ -0,0 +1,120 @@
+import json
+import os
+import sys
+import threading
+import time
+
+import tweepy
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot.fake_twitter import FakeTwitter, FakeTwitterServer, MentionReplayer, synthetic_mentions
+from bot.twitter_bot import TwitterFactCheckBot
+
+TEXTS = [
+    "Breaking: scientists confirm a miracle cure that doctors don't want you to know about",
+    "According to Reuters, the new bridge opened to traffic this morning",
+    "SHOCKING truth they are hiding about the vaccine, share before it gets deleted",
+]
+
+
+def _write_config(tmp_path, server, **bot_config) -> str:
+    config = {
+        'twitter': {key: 'fake' for key in ('api_key', 'api_secret', 'access_token',
+                                            'access_token_secret', 'bearer_token')},
+        'bot': {
+            'username': 'factbot',
+            'check_interval': 0.5,
+            'min_check_interval': 0.5,
+            'max_check_interval': 1,
+            'cursor_file': str(tmp_path / 'cursor.json'),
+            'processed_file': str(tmp_path / 'processed.log'),
+            'outbox_file': str(tmp_path / 'outbox.db'),
+            **bot_config,
+        },
+        'factcheck': {'confidence_threshold': 0.7},
+    }
+    config['twitter']['api_host'] = server.url
+    config_path = tmp_path / 'config.json'
+    # JSON is valid YAML
+    config_path.write_text(json.dumps(config))
+    return str(config_path)
+
+
+def _start_bot(tmp_path, server, **bot_config):
+    bot = TwitterFactCheckBot(_write_config(tmp_path, server, **bot_config))
+    thread = threading.Thread(target=bot.run, daemon=True)
+    thread.start()
+    return bot, thread
+
+
+def test_streamed_mention_keeps_cursor(tmp_path):
+    """The catch-up poll after a reconnect must start before the gap, not after the streamed mentions"""
+    twitter = FakeTwitter()
+    server = FakeTwitterServer(twitter).start()
+    try:
+        bot = TwitterFactCheckBot(_write_config(tmp_path, server))
+        bot.since_id = '100'
+        tweet = twitter.mention("is this true?", 'someone')
+        response = tweepy.Response(
+            [tweepy.Tweet(twitter.stream_payload(tweet, [], '')['data'])],
+            {'users': [tweepy.User(twitter.user('someone'))]}, [], {}
+        )
+        assert [m['id'] for m in bot._accept_streamed(response)] == [str(tweet['id'])]
+        assert bot.since_id == '100'
+    finally:
+        server.stop()
+
+
+def test_no_mention_lost_while_stream_reconnects(tmp_path):
+    """Every mention is answered once although the stream keeps dropping"""
+    twitter = FakeTwitter(seed=0)
+    server = FakeTwitterServer(twitter).start()
+    bot, thread = _start_bot(tmp_path, server, stream=True)
+    try:
+        replayer = MentionReplayer(twitter, synthetic_mentions(100, TEXTS, seed=0), rate=20).start()
+        while not replayer.done.wait(1):
+            twitter.drop_streams()
+
+        deadline = time.time() + 40
+        while time.time() < deadline and len(twitter.replies) < replayer.published:
+            time.sleep(0.2)
+        report = twitter.report()
+        assert report['answered'] == 100
+        assert report['duplicate_replies'] == 0
+    finally:
+        bot.stop()
+        thread.join(timeout=10)
+        server.stop()
+
+
+def test_saved_cursor_stops_before_mentions_in_flight(tmp_path):
+    """A restart must fetch again every mention whose handling had not finished"""
+    twitter = FakeTwitter()
+    server = FakeTwitterServer(twitter).start()
+    try:
+        bot = TwitterFactCheckBot(_write_config(tmp_path, server))
+        bot.since_id = '130'
+        bot._admit([{'id': '110'}, {'id': '120'}, {'id': '130'}])
+        bot.in_flight.discard('110')
+        bot._save_cursor()
+        assert TwitterFactCheckBot(_write_config(tmp_path, server)).since_id == '119'
+
+        bot.in_flight.clear()
+        bot._save_cursor()
+        assert TwitterFactCheckBot(_write_config(tmp_path, server)).since_id == '130'
+    finally:
+        server.stop()
+
+
+def test_processed_mention_leaves_in_flight(tmp_path):
+    """process_mention releases the mention, so it stops holding back the cursor"""
+    server = FakeTwitterServer(FakeTwitter()).start()
+    try:
+        bot = TwitterFactCheckBot(_write_config(tmp_path, server))
+        mention = {'id': '140', 'author_username': 'someone', 'text': '@factbot ok'}
+        bot._admit([mention])
+        assert bot.process_mention(mention, 'ok') is False
+        assert bot.in_flight == set()
+    finally:
+        server.stop()
@@ -0,0 +1,54 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot.news_index import NewsIndex
+
+
+def _segment_files(path):
+    return sorted(name for name in os.listdir(path) if name.endswith('.bm25'))
+
+
+def test_concurrent_writers_keep_each_others_segments(tmp_path):
+    first = NewsIndex(str(tmp_path))
+    second = NewsIndex(str(tmp_path))
+
+    first.add('a', 'vaccine trial results published')
+    first.flush()
+    # second never saw first's segment before flushing its own
+    second.add('b', 'bridge opened to traffic')
+    second.flush()
+
+    reader = NewsIndex(str(tmp_path))
+    assert len(reader) == 2
+    assert {r['id'] for r in reader.search('vaccine', 5) + reader.search('bridge', 5)} == {'a', 'b'}
+
+
+def test_merge_closes_and_removes_old_segments(tmp_path):
+    index = NewsIndex(str(tmp_path), max_segments=2)
+    for i in range(3):
+        index.add(f'doc{i}', f'article number {i} about elections')
+        index.flush()
+
+    assert len(index.segments) == 1
+    assert _segment_files(tmp_path) == [os.path.basename(index.segments[0].path)]
+    assert len(index) == 3
+
+
+def test_rebuilding_replaces_the_index(tmp_path):
+    index = NewsIndex(str(tmp_path))
+    index.add('old', 'stale article about elections')
+    index.flush()
+    reader = NewsIndex(str(tmp_path))
+
+    with index.rebuilding():
+        index.add('new', 'fresh article about elections')
+        index.flush()
+        # Readers keep the old index until the rebuild is swapped in
+        reader.refresh()
+        assert [r['id'] for r in reader.search('elections', 5)] == ['old']
+
+    reader.refresh()
+    assert [r['id'] for r in reader.search('elections', 5)] == ['new']
+    assert len(_segment_files(tmp_path)) == 1
@@ -0,0 +1,89 @@
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot.fake_twitter import FakeTwitter, FakeTwitterServer
+from bot.reply_outbox import ReplyOutbox
+from bot.twitter_bot import TwitterFactCheckBot
+from test_mention_stream import _start_bot, _write_config
+
+CLAIM = "Breaking: scientists confirm a miracle cure that doctors don't want you to know about"
+
+
+def test_reply_being_sent_at_a_crash_comes_back_unsure(tmp_path):
+    path = str(tmp_path / 'outbox.db')
+    outbox = ReplyOutbox(path)
+    assert outbox.enqueue('1', 'first reply')
+    assert outbox.enqueue('2', 'second reply')
+    assert outbox.claim('1')['unsure'] is False
+    # The process dies while reply 1 is being posted
+    outbox.close()
+
+    outbox = ReplyOutbox(path)
+    assert outbox.stats()['unsure'] == 1
+    assert sorted(outbox.due()) == ['1', '2']
+    assert outbox.claim('1')['unsure'] is True
+    assert outbox.claim('2')['unsure'] is False
+    # A mention analyzed again after the restart is not queued twice
+    assert not outbox.enqueue('2', 'second reply again')
+    outbox.close()
+
+
+def test_failed_replies_back_off_then_give_up(tmp_path):
+    outbox = ReplyOutbox(str(tmp_path / 'outbox.db'), max_attempts=3, backoff=0.01, max_backoff=0.02)
+    outbox.enqueue('1', 'reply')
+    for attempt in range(2):
+        outbox.claim('1')
+        assert outbox.mark_failed('1', 'HTTP 503') >= 0
+        time.sleep(0.03)
+    outbox.claim('1')
+    assert outbox.mark_failed('1', 'HTTP 503') == -1
+    assert outbox.due() == [] and outbox.stats()['failed'] == 1
+    outbox.close()
+
+
+def test_restarted_bot_posts_leftover_replies_once(tmp_path):
+    """Replies cut short by a crash are posted after a restart, unless they went out already"""
+    twitter = FakeTwitter()
+    server = FakeTwitterServer(twitter).start()
+    unsent = twitter.mention(CLAIM, 'alice')
+    sent = twitter.mention(CLAIM, 'bob')
+
+    outbox = ReplyOutbox(str(tmp_path / 'outbox.db'))
+    for mention in (unsent, sent):
+        outbox.enqueue(str(mention['id']), 'earlier reply', mention['created_at'])
+        outbox.claim(str(mention['id']))
+    # The reply to bob got through just before the crash, alice's did not
+    twitter._reply('earlier reply', str(sent['id']))
+    outbox.close()
+
+    bot, thread = _start_bot(tmp_path, server)
+    try:
+        deadline = time.time() + 20
+        while time.time() < deadline and len(twitter.replies) < 2:
+            time.sleep(0.2)
+        time.sleep(1)
+        report = twitter.report()
+        assert report['answered'] == 2
+        assert report['duplicate_replies'] == 0
+        assert bot.outbox.stats()['posted'] == 2
+    finally:
+        bot.stop()
+        thread.join(timeout=10)
+        server.stop()
+
+
+def test_durable_processed_store_needs_a_durable_outbox(tmp_path):
+    server = FakeTwitterServer(FakeTwitter()).start()
+    try:
+        with pytest.raises(ValueError):
+            TwitterFactCheckBot(_write_config(tmp_path, server, outbox_file=':memory:'))
+        bot = TwitterFactCheckBot(_write_config(tmp_path, server, outbox_file=':memory:',
+                                                processed_file=None))
+        assert bot.outbox.path == ':memory:'
+    finally:
+        server.stop()
@@ -0,0 +1,90 @@
+import os
+import sys
+import threading
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot.similarity_index import SimilarityIndex
+
+
+def test_texts_without_tokens_are_not_stored_or_matched():
+    index = SimilarityIndex()
+    index.add_many([1, 2], ['!!! 123', '?? 42'])
+    assert len(index) == 0
+    index.add(3, 'the vaccine was tested on thousands of volunteers')
+    assert index.query('... 7') == []
+
+
+def test_concurrent_inserts_queries_and_saves(tmp_path):
+    index = SimilarityIndex()
+    words = [f'word{chr(97 + i % 26)}{chr(97 + i // 26 % 26)}' for i in range(2000)]
+    rng = np.random.default_rng(5)
+    texts = [' '.join(rng.choice(words, 12)) for _ in range(12000)]
+    errors = []
+
+    def insert(offset):
+        try:
+            for i in range(offset, len(texts), 4):
+                index.add(i, texts[i])
+                index.query(texts[i], 3)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=insert, args=(offset,)) for offset in range(4)]
+    for thread in threads:
+        thread.start()
+    for _ in range(5):
+        index.save(str(tmp_path / 'claims.npz'))
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(index) == len(texts)
+    index.save(str(tmp_path / 'claims.npz'))
+    loaded = SimilarityIndex.load(str(tmp_path / 'claims.npz'))
+    assert all(loaded.query(texts[i], 1)[0][0] == i for i in range(0, len(texts), 997))
+
+
+def _texts(count, seed):
+    words = [f'word{chr(97 + i % 26)}{chr(97 + i // 26 % 26)}' for i in range(2000)]
+    rng = np.random.default_rng(seed)
+    return [' '.join(rng.choice(words, 12)) for _ in range(count)]
+
+
+def test_runs_answer_like_a_single_build():
+    texts = _texts(18000, seed=7)
+    grown, built = SimilarityIndex(), SimilarityIndex()
+    for start in range(0, len(texts), 500):
+        grown.add_many(range(start, start + 500), texts[start:start + 500])
+    built.add_many(range(len(texts)), texts)
+    built._compact()
+
+    assert grown.stats()['runs'] == 2
+    # Unindexed items are compared with every query, so only close matches
+    # are the same whatever is still in the tail
+    for text in texts[::701] + [' '.join(t.split()[1:]) for t in texts[::997]]:
+        assert grown.query(text, 5, 0.6) == built.query(text, 5, 0.6) != []
+
+
+def test_oldest_items_are_evicted(tmp_path):
+    texts = _texts(9000, seed=9)
+    index = SimilarityIndex(max_items=4000)
+    for start in range(0, len(texts), 500):
+        index.add_many(range(start, start + 500), texts[start:start + 500])
+
+    assert 4000 <= len(index) <= 5000
+    first = len(texts) - len(index)
+    kept = SimilarityIndex()
+    kept.add_many(range(first, len(texts)), texts[first:])
+    for i in range(0, len(texts), 450):
+        hits = index.query(texts[i], 3, 0.6)
+        assert hits == kept.query(texts[i], 3, 0.6)
+        assert bool(hits) == (i >= first)
+
+    assert index.unsaved == len(texts)
+    index.save(str(tmp_path / 'claims.npz'))
+    assert index.unsaved == 0
+    loaded = SimilarityIndex.load(str(tmp_path / 'claims.npz'), max_items=4000)
+    assert loaded.query(texts[-1], 1)[0][0] == len(texts) - 1
@@ -0,0 +1,82 @@
+import asyncio
+import os
+import sys
+
+from aiohttp import web
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot.url_expander import UrlExpander
+
+
+def _stub_app() -> web.Application:
+    async def hop(request):
+        raise web.HTTPMovedPermanently(location='/hop2')
+
+    async def hop2(request):
+        raise web.HTTPFound(location='/final')
+
+    async def final(request):
+        return web.Response(text='article')
+
+    async def no_head(request):
+        if request.method == 'HEAD':
+            raise web.HTTPMethodNotAllowed('HEAD', ['GET'])
+        raise web.HTTPFound(location='https://news.example.com/story')
+
+    async def slow(request):
+        await asyncio.sleep(2)
+        raise web.HTTPFound(location='/final')
+
+    app = web.Application()
+    app.router.add_route('*', '/hop', hop)
+    app.router.add_route('*', '/hop2', hop2)
+    app.router.add_route('*', '/final', final)
+    app.router.add_route('*', '/no-head', no_head)
+    app.router.add_route('*', '/slow', slow)
+    return app
+
+
+async def _expand(expander: UrlExpander, paths):
+    runner = web.AppRunner(_stub_app())
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    base = f"http://127.0.0.1:{port}"
+    try:
+        return base, await expander.expand_many([base + path for path in paths])
+    finally:
+        await runner.cleanup()
+
+
+def test_redirects_405_and_timeouts(tmp_path):
+    expander = UrlExpander(str(tmp_path / 'urls.sqlite'), timeout=0.5, shorteners=['127.0.0.1'])
+    base, results = asyncio.run(_expand(expander, ['/hop', '/no-head', '/slow']))
+
+    # A redirect chain is followed to its end
+    assert results[base + '/hop'] == base + '/final'
+    # A shortener refusing HEAD is asked with GET; the chain stops at the first
+    # link that is not a short one
+    assert results[base + '/no-head'] == 'https://news.example.com/story'
+    # A link that times out is left as it is, and not cached
+    assert results[base + '/slow'] == base + '/slow'
+    assert expander.failures == 1
+    assert expander.stats()['cache_misses'] == 3
+
+    expander.close()
+    expander = UrlExpander(str(tmp_path / 'urls.sqlite'), shorteners=['127.0.0.1'])
+    assert expander.resolved(base + '/hop') == base + '/final'
+    assert expander.resolved(base + '/slow') == base + '/slow'
+    expander.close()
+
+
+def test_resolved_skips_the_cache_for_long_links():
+    expander = UrlExpander()
+    queries = []
+    expander._db.set_trace_callback(queries.append)
+    assert expander.resolved('https://www.example.com/a/long/link') == 'https://www.example.com/a/long/link'
+    assert queries == []
+    assert expander.resolved('https://t.co/abc') == 'https://t.co/abc'
+    assert len(queries) == 1
+    expander.close()
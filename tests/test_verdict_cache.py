@@ -0,0 +1,39 @@
+import os
+import sqlite3
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot.verdict_cache import VerdictCache, cache_key
+
+
+def _disk_rows(path):
+    with sqlite3.connect(path) as db:
+        return db.execute('SELECT COUNT(*) FROM verdicts').fetchone()[0]
+
+
+def test_case_is_part_of_the_key():
+    assert cache_key("@bot  THIS IS FAKE") == cache_key("THIS IS  FAKE @someone")
+    assert cache_key("THIS IS FAKE") != cache_key("this is fake")
+
+
+def test_disk_writes_are_batched_and_capped(tmp_path):
+    path = str(tmp_path / 'verdicts.sqlite')
+    cache = VerdictCache(capacity=10, path=path, disk_capacity=50, batch_size=20, flush_interval=3600)
+    for i in range(19):
+        cache.put(f"claim {i}", {'status': 'unverified'})
+    assert _disk_rows(path) == 0
+    cache.put("claim 19", {'status': 'unverified'})
+    assert _disk_rows(path) == 20
+
+    for i in range(20, 125):
+        cache.put(f"claim {i}", {'status': 'unverified'})
+    cache.close()
+    assert _disk_rows(path) == 50
+
+    # The newest verdicts are the ones kept, and survive a restart
+    cache = VerdictCache(capacity=10, path=path, disk_capacity=50)
+    assert cache.get("claim 124")['status'] == 'unverified'
+    assert cache.get("claim 80") is not None
+    assert cache.get("claim 10") is None
+    cache.close()